@@ -1,8 +1,14 @@
 # src/api/ai.py
 
+from contextlib import closing
+
 from fastapi import APIRouter
 from pydantic import BaseModel
-from src.services.openai_client import summarize_text
+from src.services.openai_client import asummarize_text, stream_summary_text
+from src.services.llm_cache import cache_stats
+from src.services.llm_gateway import get_gateway_stats
+from src.services.model_router import get_cascade_stats
+from src.utils.sse import sse_response
 
 router = APIRouter()
 
@@ -16,8 +22,48 @@ async def ask_ai(req: PromptRequest):
     """
     General-purpose AI endpoint for testing the OpenAI connection.
     """
-    response = summarize_text(
+    response = await asummarize_text(
         prompt=req.prompt,
         content=req.content
     )
     return {"response": response}
+
+
+@router.post("/ask/stream")
+async def ask_ai_stream(req: PromptRequest):
+    """
+    /ai/ask as server-sent events: one `token` event per chunk, then `done`.
+    """
+    def events():
+        parts = []
+        with closing(stream_summary_text(prompt=req.prompt, content=req.content)) as chunks:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield "token", {"text": chunk}
+        yield "done", {"response": "".join(parts).strip()}
+
+    return sse_response(events())
+
+
+@router.get("/cache-stats")
+async def llm_cache_stats():
+    """
+    LLM response cache hit/miss counters for this worker and the shared store size.
+    """
+    return cache_stats()
+
+
+@router.get("/gateway-stats")
+async def llm_gateway_stats():
+    """
+    Per-provider LLM call counts, token usage, latency and queue depth.
+    """
+    return get_gateway_stats()
+
+
+@router.get("/cascade-stats")
+async def model_cascade_stats():
+    """
+    Extraction calls handled by the small model vs escalated to the synthesis model.
+    """
+    return get_cascade_stats()
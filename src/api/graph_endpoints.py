@@ -2,7 +2,7 @@
 
 from fastapi import APIRouter, HTTPException
 
-from src.services.ms_graph_client import get_recent_emails
+from src.services.ms_graph_client import get_recent_emails, get_throttle_stats
 
 router = APIRouter(
     prefix="/graph",
@@ -24,3 +24,11 @@ def sample_inbox(top: int = 10):
         }
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/throttle-stats")
+def throttle_stats():
+    """
+    Graph retry and throttling counters per tenant for this worker process.
+    """
+    return get_throttle_stats()
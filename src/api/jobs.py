@@ -0,0 +1,30 @@
+# src/api/jobs.py
+
+from __future__ import annotations
+
+from fastapi import APIRouter, HTTPException
+
+from src.services.job_queue import get_job
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.get("/{job_id}")
+def job_status(job_id: str):
+    """
+    Status of a background job; `result` is set once it has succeeded.
+    """
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "params": job["params"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
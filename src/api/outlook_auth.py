@@ -5,17 +5,16 @@ from __future__ import annotations
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import RedirectResponse, HTMLResponse
 import secrets
-import base64
-import json
-
-import requests
 
+from src.services.graph_transport import GRAPH_URL, graph_request
+from src.services.delegated_tokens import build_token_record
 from src.services.ms_oauth import build_authorize_url, exchange_code_for_tokens
 from src.services.user_profile_store import (
     get_user_by_email,
     save_user_profile,
 )
 from src.models.user_profile import UserProfile
+from src.utils.jwt_handler import unverified_claims
 
 router = APIRouter(prefix="/auth/outlook", tags=["Outlook OAuth"])
 
@@ -23,29 +22,8 @@ router = APIRouter(prefix="/auth/outlook", tags=["Outlook OAuth"])
 OAUTH_STATE = secrets.token_urlsafe(16)
 
 
-def _jwt_payload(token: str) -> dict:
-    """
-    Decode JWT payload without verifying signature.
-    Enough to extract tid/oid in a controlled app environment.
-    """
-    try:
-        parts = token.split(".")
-        if len(parts) < 2:
-            return {}
-        payload_b64 = parts[1]
-        pad = "=" * (-len(payload_b64) % 4)
-        payload_bytes = base64.urlsafe_b64decode(payload_b64 + pad)
-        return json.loads(payload_bytes.decode("utf-8"))
-    except Exception:
-        return {}
-
-
 def _graph_me(access_token: str) -> dict:
-    resp = requests.get(
-        "https://graph.microsoft.com/v1.0/me",
-        headers={"Authorization": f"Bearer {access_token}"},
-        timeout=20,
-    )
+    resp = graph_request("GET", f"{GRAPH_URL}/me", access_token, timeout=20)
     if resp.status_code >= 400:
         raise HTTPException(status_code=400, detail=f"Graph /me failed: {resp.text}")
     return resp.json()
@@ -68,7 +46,6 @@ def outlook_callback(code: str | None = None, state: str | None = None, error: s
 
     token_data = exchange_code_for_tokens(code)
     access_token = token_data.get("access_token")
-    refresh_token = token_data.get("refresh_token")
 
     if not access_token:
         raise HTTPException(status_code=400, detail="No access_token returned by Microsoft")
@@ -80,7 +57,7 @@ def outlook_callback(code: str | None = None, state: str | None = None, error: s
     display_name = (me.get("displayName") or email or "Connected User").strip()
     graph_user_id = (me.get("id") or "").strip()
 
-    claims = _jwt_payload(access_token)
+    claims = unverified_claims(access_token)
     tenant_id = (claims.get("tid") or "").strip()
     oid = (claims.get("oid") or "").strip()
 
@@ -103,13 +80,8 @@ def outlook_callback(code: str | None = None, state: str | None = None, error: s
         )
 
     profile.outlook_connected = True
-    profile.outlook_tokens = {
-        "access_token": access_token,
-        "refresh_token": refresh_token,
-        "scope": token_data.get("scope"),
-        "expires_in": token_data.get("expires_in"),
-        "token_type": token_data.get("token_type"),
-    }
+    # Records an absolute expires_at so the refresher can renew ahead of time
+    profile.outlook_tokens = build_token_record(token_data, previous=profile.outlook_tokens)
 
     save_user_profile(profile)
 
@@ -1,8 +1,33 @@
+import asyncio
+import dataclasses
+import logging
+from pathlib import Path
+from typing import List
+
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from src.utils.file_storage import save_file
+from src.services import document_extraction
+from src.utils.file_storage import (
+    MAX_UPLOAD_BYTES,
+    BulkResult,
+    StoredFile,
+    UploadTooLarge,
+    save_file,
+    store_upload,
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+
+def _start_extraction(stored: StoredFile) -> None:
+    # Warm the extraction cache while the rest of the upload is still landing
+    try:
+        document_extraction.start_extraction(Path(stored.path), stored.sha256)
+    except Exception:
+        logger.exception("could not start extraction for %s", stored.name)
+
+
 @router.post("/file")
 async def upload_file(file: UploadFile = File(...)):
     """
@@ -10,6 +35,54 @@ async def upload_file(file: UploadFile = File(...)):
     """
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File is larger than {MAX_UPLOAD_BYTES} bytes")
+
+    try:
+        stored = await save_file(file)
+    except UploadTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    await asyncio.to_thread(_start_extraction, stored)
+    return {
+        "status": "success",
+        "path": stored.path,
+        "sha256": stored.sha256,
+        "size": stored.size,
+        "deduplicated": stored.deduplicated,
+    }
+
+
+@router.post("/bulk")
+async def upload_bulk(files: List[UploadFile] = File(...)):
+    """
+    Upload many files, or zip/tar archives of them, in one request.
+    Archives are unpacked into local storage; files and archive members of
+    types we can't extract text from are skipped. Parts are stored in parallel and text
+    extraction starts for each file as soon as it is stored.
+    """
+    parts = [f for f in files if f.filename]
+    if not parts:
+        raise HTTPException(status_code=400, detail="No file provided")
 
-    saved_path = await save_file(file)
-    return {"status": "success", "path": saved_path}
+    results = await asyncio.gather(
+        *(
+            asyncio.to_thread(
+                store_upload,
+                part.file,
+                part.filename,
+                document_extraction.is_supported,
+                _start_extraction,
+            )
+            for part in parts
+        )
+    )
+    total = BulkResult()
+    for result in results:
+        total.merge(result)
+    return {
+        "status": "success" if not total.failed else "partial",
+        "stored": [dataclasses.asdict(s) for s in total.stored],
+        "deduplicated": sum(1 for s in total.stored if s.deduplicated),
+        "skipped": total.skipped,
+        "failed": total.failed,
+    }
@@ -2,18 +2,36 @@
 
 from __future__ import annotations
 
+import json
+
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
+from src.models.user_profile import UserProfile
 from src.services.weekly_ai_engine import (
+    ReportUserError,
     generate_weekly_ai_report,
     generate_and_email_weekly_report,
+    pick_profile,
+    stream_weekly_ai_report,
 )
+from src.services.job_queue import IN_FLIGHT, job_queue
+from src.services.report_store import list_reports
 from src.services.user_profile_store import get_all_connected_users
+from src.services.weekly_batch_runner import (
+    GRAPH_CONCURRENCY,
+    LLM_CONCURRENCY,
+    iter_weekly_reports,
+)
+from src.utils.sse import sse_response
 
 router = APIRouter(prefix="/weekly", tags=["Weekly AI Reports"])
 
+job_queue.register("weekly_report", lambda user_id: generate_weekly_ai_report(user_id=user_id))
+job_queue.register("weekly_email_report", generate_and_email_weekly_report)
+
 
 class ReportRequest(BaseModel):
     user_id: Optional[str] = None
@@ -22,6 +40,19 @@ class ReportRequest(BaseModel):
 class EmailReportRequest(BaseModel):
     to_addresses: List[str]
     user_id: Optional[str] = None
+    send_individually: bool = False
+    # Send this stored report version instead of the latest one
+    version_id: Optional[str] = None
+    # Reuse this week's latest report without re-checking mail if it is younger than this
+    max_age_seconds: Optional[int] = Field(default=None, ge=0)
+
+
+class BatchReportRequest(BaseModel):
+    # Defaults to every Outlook-connected user
+    user_ids: Optional[List[str]] = None
+    send_to_self: bool = False
+    graph_concurrency: int = Field(default=GRAPH_CONCURRENCY, ge=1, le=64)
+    llm_concurrency: int = Field(default=LLM_CONCURRENCY, ge=1, le=32)
 
 
 @router.get("/connected-users")
@@ -41,20 +72,92 @@ def connected_users():
         raise HTTPException(status_code=500, detail=str(exc))
 
 
-@router.post("/report")
-def generate_report(payload: ReportRequest):
+def _report_user(user_id: Optional[str]) -> UserProfile:
+    """
+    Resolve the report user up front, so a missing or ambiguous user is a
+    400 rather than a failed job or a broken stream.
+    """
     try:
-        return generate_weekly_ai_report(user_id=payload.user_id)
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=str(exc))
+        return pick_profile(user_id)
+    except ReportUserError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
 
-@router.post("/email-report")
-def email_report(payload: EmailReportRequest):
-    try:
-        return generate_and_email_weekly_report(
-            to_addresses=payload.to_addresses,
-            user_id=payload.user_id,
+async def _run_job(kind: str, params: dict, background: bool):
+    """
+    Queue a job on the bounded job pool. With background=True answer 202 with
+    the job id straight away; otherwise wait for it without holding a thread,
+    answering 504 with the job id if it outlasts JOB_WAIT_TIMEOUT_SECONDS.
+    """
+    job, created = job_queue.submit(kind, params)
+    if background:
+        return JSONResponse(
+            status_code=202,
+            content={"job_id": job["id"], "status": job["status"], "deduplicated": not created},
         )
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=str(exc))
+    job_id = job["id"]
+    job = await job_queue.wait(job_id)
+    if job is not None and job["status"] in IN_FLIGHT:
+        # Still running; the client can keep following it at /jobs/{id}
+        raise HTTPException(status_code=504, detail={"job_id": job_id, "status": job["status"]})
+    if job is None or job["status"] != "succeeded":
+        raise HTTPException(status_code=500, detail=(job or {}).get("error") or "Job failed")
+    return job["result"]
+
+
+@router.get("/report-versions")
+def report_versions(user_id: str, week: Optional[str] = None):
+    """
+    Stored report versions for a user (optionally one ISO week, e.g. 2026-W42), newest first.
+    """
+    try:
+        return list_reports(user_id, week)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="week must look like 2026-W42")
+
+
+@router.post("/report")
+async def generate_report(payload: ReportRequest, background: bool = False):
+    profile = _report_user(payload.user_id)
+    return await _run_job("weekly_report", {"user_id": profile.user_id}, background)
+
+
+@router.post("/report/stream")
+def stream_report(payload: ReportRequest):
+    """
+    Same report as /weekly/report, sent as server-sent events while Claude
+    writes it: status, meta, token..., then done with the saved report.
+    """
+    profile = _report_user(payload.user_id)
+    return sse_response(stream_weekly_ai_report(profile=profile))
+
+
+@router.post("/email-report")
+async def email_report(payload: EmailReportRequest, background: bool = False):
+    profile = _report_user(payload.user_id)
+    params = {
+        "to_addresses": payload.to_addresses,
+        "user_id": profile.user_id,
+        "send_individually": payload.send_individually,
+        "version_id": payload.version_id,
+        "max_age_seconds": payload.max_age_seconds,
+    }
+    return await _run_job("weekly_email_report", params, background)
+
+
+@router.post("/batch-report")
+def batch_report(payload: BatchReportRequest):
+    """
+    Run the weekly report for many users at once.
+    Streams one JSON line per user (NDJSON) as each report finishes.
+    """
+    results = iter_weekly_reports(
+        user_ids=payload.user_ids,
+        send_to_self=payload.send_to_self,
+        graph_concurrency=payload.graph_concurrency,
+        llm_concurrency=payload.llm_concurrency,
+    )
+    return StreamingResponse(
+        (json.dumps(r) + "\n" for r in results),
+        media_type="application/x-ndjson",
+    )
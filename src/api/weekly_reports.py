@@ -1,18 +1,35 @@
 # src/api/weekly_reports.py
 
-from fastapi import APIRouter
-from src.services.weekly_summary_engine import generate_weekly_report
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from src.services.upload_manifest import week_bounds
+from src.services.weekly_summary_engine import build_weekly_report
 
 router = APIRouter()
 
 
 @router.get("/weekly")
-async def weekly_report():
+async def weekly_report(week: Optional[str] = None):
     """
-    Generate a real weekly report from uploaded files.
+    Generate a real weekly report from the files uploaded in `week`
+    (ISO week such as 2026-W42; the current week by default).
     """
-    report_path = generate_weekly_report()
+    if week:
+        try:
+            week_bounds(week)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="week must look like 2026-W42")
+    # Scanning and extracting uploads blocks; keep it off the event loop
+    result = await asyncio.to_thread(build_weekly_report, week)
     return {
         "message": "Weekly report generated",
-        "path": report_path,
+        "path": result["path"],
+        "week": result["week"],
+        "files": result["files"],
+        "files_summarized": result["files_summarized"],
+        "compression": result["compression"],
+        "files_extracted": result["files_extracted"],
+        "summary_rounds": result["summary_rounds"],
     }
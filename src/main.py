@@ -1,5 +1,7 @@
 # src/main.py
 
+import os
+
 from fastapi import FastAPI
 from dotenv import load_dotenv
 
@@ -14,6 +16,11 @@ from src.api.subcontractors import router as subcontractor_router
 from src.api.weekly_reports import router as weekly_reports_router
 from src.api.weekly_ai_reports import router as weekly_ai_reports_router
 from src.api.outlook_auth import router as outlook_auth_router
+from src.api.jobs import router as jobs_router
+from src.services import document_extraction, graph_transport, llm_gateway
+from src.services.ms_graph_client import warm_app_only_token
+from src.services.delegated_tokens import token_refresher
+from src.services.job_queue import job_queue
 
 app = FastAPI(title="Boat AI Assistant API")
 
@@ -27,6 +34,30 @@ app.include_router(weekly_reports_router, prefix="/weekly", tags=["Weekly"])
 app.include_router(graph_endpoints.router)
 app.include_router(weekly_ai_reports_router)
 app.include_router(outlook_auth_router)
+app.include_router(jobs_router)
+
+
+@app.on_event("startup")
+def start_background_tasks():
+    job_queue.start()
+    if os.getenv("DELEGATED_TOKEN_REFRESHER_ENABLED", "1") == "1":
+        token_refresher.start()
+    try:
+        warm_app_only_token()
+    except Exception:
+        # Not fatal: the first fallback-mode request will fetch it instead
+        pass
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    token_refresher.stop()
+    job_queue.shutdown()
+    graph_transport.close()
+    await graph_transport.aclose()
+    llm_gateway.close()
+    await llm_gateway.aclose()
+    document_extraction.shutdown()
 
 
 @app.get("/")
@@ -0,0 +1,34 @@
+# src/migrate_profiles.py
+#
+# Import the legacy user_profiles.json into the SQLite profile store. The app
+# does this on first use; run it by hand to migrate ahead of a deploy.
+# Usage, from the repository root:
+#   python -m src.migrate_profiles [--source PATH]
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.services.user_profile_store import PROFILE_DB, USER_FILE, migrate_from_json  # noqa: E402
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import legacy JSON user profiles into the SQLite store.")
+    parser.add_argument("--source", type=Path, default=USER_FILE, help="Legacy profile file")
+    args = parser.parse_args(argv)
+
+    if not args.source.exists():
+        print(json.dumps({"ok": False, "error": f"{args.source} not found"}), flush=True)
+        return 1
+    imported = migrate_from_json(args.source)
+    print(json.dumps({"ok": True, "imported": imported, "source": str(args.source), "store": str(PROFILE_DB)}), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+# src/models/mail_message.py
+
+from __future__ import annotations
+
+import sys
+from datetime import datetime, timezone
+from operator import attrgetter
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+def parse_graph_time(raw: str | None) -> int:
+    """
+    Graph ISO timestamp -> epoch seconds (0 when missing or unparseable).
+    """
+    if not raw:
+        return 0
+    try:
+        dt = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    except ValueError:
+        return 0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def _address(entry: Dict[str, Any] | None) -> str:
+    return sys.intern(((entry or {}).get("emailAddress") or {}).get("address", "").lower())
+
+
+class MailMessage:
+    """
+    One Graph message reduced to what the weekly pipeline reads.
+    Timestamps are parsed once; addresses and conversation ids are interned
+    so a mailbox with thousands of messages shares one copy of each.
+    """
+
+    __slots__ = ("id", "conversation_id", "subject", "preview", "sender", "to", "sent_at", "collapsed_count")
+
+    def __init__(
+        self,
+        id: str,
+        conversation_id: str,
+        subject: str,
+        preview: str,
+        sender: str,
+        to: Tuple[str, ...],
+        sent_at: int,
+        collapsed_count: int = 1,
+    ):
+        self.id = id
+        self.conversation_id = conversation_id
+        self.subject = subject
+        self.preview = preview
+        self.sender = sender
+        self.to = to
+        self.sent_at = sent_at
+        self.collapsed_count = collapsed_count
+
+    @classmethod
+    def from_graph(cls, msg: Dict[str, Any]) -> "MailMessage":
+        return cls(
+            id=msg.get("id") or "",
+            conversation_id=sys.intern(msg.get("conversationId") or "no-conversation-id"),
+            subject=msg.get("subject") or "",
+            preview=msg.get("bodyPreview") or "",
+            sender=_address(msg.get("from")),
+            to=tuple(_address(r) for r in msg.get("toRecipients") or ()),
+            sent_at=parse_graph_time(msg.get("sentDateTime") or msg.get("receivedDateTime")),
+        )
+
+    def replace(self, **changes: Any) -> "MailMessage":
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return MailMessage(**values)
+
+    def __repr__(self) -> str:
+        return f"MailMessage(id={self.id!r}, sender={self.sender!r}, subject={self.subject!r}, sent_at={self.sent_at})"
+
+
+class Conversation:
+    __slots__ = ("conversation_id", "messages")
+
+    def __init__(self, conversation_id: str, messages: List[MailMessage]):
+        self.conversation_id = conversation_id
+        self.messages = messages
+
+    @property
+    def count(self) -> int:
+        return len(self.messages)
+
+    @property
+    def last_at(self) -> int:
+        return self.messages[-1].sent_at if self.messages else 0
+
+    def __repr__(self) -> str:
+        return f"Conversation(conversation_id={self.conversation_id!r}, count={self.count})"
+
+
+_by_sent_at = attrgetter("sent_at")
+
+
+def index_conversations(messages: Iterable[MailMessage]) -> List[Conversation]:
+    """
+    Group messages by conversation in one pass; each conversation is sorted
+    oldest first and the list is ordered by message count, largest first.
+    """
+    index: Dict[str, List[MailMessage]] = {}
+    for msg in messages:
+        bucket = index.get(msg.conversation_id)
+        if bucket is None:
+            index[msg.conversation_id] = [msg]
+        else:
+            bucket.append(msg)
+
+    conversations = []
+    for conv_id, msgs in index.items():
+        msgs.sort(key=_by_sent_at)
+        conversations.append(Conversation(conv_id, msgs))
+    conversations.sort(key=attrgetter("count"), reverse=True)
+    return conversations
@@ -26,6 +26,9 @@ class UserProfile:
     outlook_connected: bool = False
     outlook_tokens: Dict[str, Any] = field(default_factory=dict)
 
+    # Graph delta sync state, keyed by mail folder
+    mail_delta_links: Dict[str, str] = field(default_factory=dict)
+
     # Report behavior defaults
     follow_up_threshold_hours: int = 24
     stale_info_days: int = 7
@@ -51,6 +54,7 @@ class UserProfile:
             "org_id": self.org_id,
             "outlook_connected": self.outlook_connected,
             "outlook_tokens": self.outlook_tokens,
+            "mail_delta_links": self.mail_delta_links,
             "follow_up_threshold_hours": self.follow_up_threshold_hours,
             "stale_info_days": self.stale_info_days,
             "created_at": self.created_at,
@@ -66,6 +70,7 @@ class UserProfile:
             org_id=data.get("org_id"),
             outlook_connected=bool(data.get("outlook_connected", False)),
             outlook_tokens=data.get("outlook_tokens") or {},
+            mail_delta_links=data.get("mail_delta_links") or {},
             follow_up_threshold_hours=int(data.get("follow_up_threshold_hours", 24)),
             stale_info_days=int(data.get("stale_info_days", 7)),
             created_at=data.get("created_at") or _utc_now_iso(),
@@ -1,16 +1,45 @@
-import os
-import sys
+# src/run_agent.py
+#
+# Run the weekly AI report for every Outlook-connected user (or a chosen few).
+# Usage, from the repository root:
+#   python -m src.run_agent [--user-id ID ...] [--send] [--graph-concurrency N] [--llm-concurrency N]
 
-# Add inner src to Python path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+import argparse
+import json
+import sys
 
 from dotenv import load_dotenv
-dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
-load_dotenv(dotenv_path)
 
-# Example usage (change as needed)
-from stat_tracker import track_statistics
+load_dotenv()
+
+from src.services.weekly_batch_runner import (  # noqa: E402
+    GRAPH_CONCURRENCY,
+    LLM_CONCURRENCY,
+    iter_weekly_reports,
+)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run weekly AI reports for connected users.")
+    parser.add_argument("--user-id", action="append", dest="user_ids", help="Limit to this user (repeatable)")
+    parser.add_argument("--send", action="store_true", help="Email each report to its user")
+    parser.add_argument("--graph-concurrency", type=int, default=GRAPH_CONCURRENCY)
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for result in iter_weekly_reports(
+        user_ids=args.user_ids,
+        send_to_self=args.send,
+        graph_concurrency=args.graph_concurrency,
+        llm_concurrency=args.llm_concurrency,
+    ):
+        if not result.get("ok"):
+            failed += 1
+        print(json.dumps(result), flush=True)
+
+    return 1 if failed else 0
+
 
-if __name__ == '__main__':
-    stats = track_statistics()
-    print("Weekly stats:", stats)
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,6 @@
-import os
-import anthropic
-
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+from src.services import llm_gateway
 
 def ask_claude(prompt: str):
-    response = client.messages.create(
-        model="claude-3-haiku-20240307",
-        max_tokens=200,
-        temperature=0.7,
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.content[0].text
+    model = "claude-3-haiku-20240307"
+    messages = [{"role": "user", "content": prompt}]
+    return llm_gateway.complete("anthropic", model, messages, max_tokens=200, temperature=0.7)
@@ -0,0 +1,175 @@
+# src/services/conversation_summaries.py
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from src.models.mail_message import Conversation, MailMessage
+from src.services.prompt_packer import latest_within_budget
+from src.utils import sqlite_store
+
+STORE_PATH = Path(os.getenv("CONVERSATION_SUMMARY_DB", "src/data/conversation_summaries.sqlite3"))
+
+# Stage one (map) runs this many conversation summaries at once
+MAP_CONCURRENCY = int(os.getenv("WEEKLY_MAP_CONCURRENCY", "4"))
+
+# Stage one reads a conversation's newest messages up to this many tokens / messages
+CONVERSATION_TOKEN_BUDGET = int(os.getenv("WEEKLY_CONVERSATION_TOKEN_BUDGET", "1200"))
+MESSAGES_PER_CONVERSATION = int(os.getenv("WEEKLY_MESSAGES_PER_CONVERSATION", "15"))
+
+# Bump when the stage one prompt changes so stored summaries are rebuilt
+PROMPT_VERSION = "4"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+    user_id TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (user_id, conversation_id)
+);
+"""
+
+
+def _connect():
+    return sqlite_store.connect(STORE_PATH, _SCHEMA)
+
+
+def format_message_line(m: MailMessage) -> str:
+    subj = m.subject
+    if m.collapsed_count > 1:
+        subj = f"{subj} (x{m.collapsed_count} similar)"
+    return f"- From: {m.sender} | Subject: {subj} | Preview: {m.preview}"
+
+
+def latest_messages(conv: Conversation) -> List[MailMessage]:
+    return latest_within_budget(
+        conv.messages,
+        format_message_line,
+        CONVERSATION_TOKEN_BUDGET,
+        MESSAGES_PER_CONVERSATION,
+    )
+
+
+def conversation_fingerprint(conv: Conversation, model: str) -> str:
+    """
+    Identifies what a stored summary was built from: the conversation id and
+    the ids of the messages stage one read. A new reply changes it.
+    """
+    ids = [m.id for m in latest_messages(conv)]
+    payload = json.dumps([PROMPT_VERSION, model, conv.conversation_id, ids])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def format_message_lines(conv: Conversation) -> List[str]:
+    return [format_message_line(m) for m in latest_messages(conv)]
+
+
+def format_conversation_prompt(owner_email: str, conv: Conversation) -> str:
+    lines: List[str] = []
+    lines.append(f"Summarize this email conversation from the mailbox of {owner_email}.")
+    lines.append("Write 2-4 short plain-text bullet points covering decisions, problems,")
+    lines.append("open questions, and who is waiting on whom. No preamble.")
+    lines.append("")
+    lines.append(f"Conversation (messages={conv.count}, showing the latest):")
+    lines.extend(format_message_lines(conv))
+    return "\n".join(lines)
+
+
+def _load(user_id: str) -> Dict[str, Tuple[str, str]]:
+    rows = _connect().execute(
+        "SELECT conversation_id, fingerprint, summary FROM conversation_summaries WHERE user_id = ?",
+        (user_id,),
+    ).fetchall()
+    return {conv_id: (fp, summary) for conv_id, fp, summary in rows}
+
+
+def _save(user_id: str, conv_id: str, fingerprint: str, summary: str) -> None:
+    _connect().execute(
+        """
+        INSERT INTO conversation_summaries (user_id, conversation_id, fingerprint, summary, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, conversation_id) DO UPDATE SET
+            fingerprint = excluded.fingerprint,
+            summary = excluded.summary,
+            updated_at = excluded.updated_at
+        """,
+        (user_id, conv_id, fingerprint, summary, time.time()),
+    )
+
+
+def summarize_conversations(
+    user_id: str,
+    owner_email: str,
+    conversations: List[Conversation],
+    summarize: Callable[[str], str],
+    model: str,
+) -> Tuple[Dict[str, str], Dict[str, int]]:
+    """
+    Stage one of the weekly report: one short summary per conversation.
+
+    Conversations whose latest messages match the stored fingerprint reuse
+    their stored summary; the rest are summarized in parallel. A conversation
+    that fails to summarize is left out of the result so the caller can fall
+    back to its raw previews.
+
+    Returns ({conversation_id: summary}, counters).
+    """
+    stored = _load(user_id)
+    summaries: Dict[str, str] = {}
+    todo: List[Tuple[Conversation, str]] = []
+
+    for conv in conversations:
+        fp = conversation_fingerprint(conv, model)
+        hit = stored.get(conv.conversation_id)
+        if hit and hit[0] == fp:
+            summaries[conv.conversation_id] = hit[1]
+        else:
+            todo.append((conv, fp))
+
+    def run(item: Tuple[Conversation, str]) -> Tuple[str, str, str]:
+        conv, fp = item
+        return conv.conversation_id, fp, summarize(format_conversation_prompt(owner_email, conv)).strip()
+
+    failed = 0
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(1, min(MAP_CONCURRENCY, len(todo)))) as pool:
+            futures = [pool.submit(run, item) for item in todo]
+            for fut in futures:
+                try:
+                    conv_id, fp, summary = fut.result()
+                except Exception:
+                    failed += 1
+                    continue
+                summaries[conv_id] = summary
+                _save(user_id, conv_id, fp, summary)
+
+    counters = {
+        "reused": len(conversations) - len(todo),
+        "summarized": len(todo) - failed,
+        "failed": failed,
+    }
+    return summaries, counters
+
+
+def prune_summaries(user_id: str, keep_conversation_ids: List[str]) -> None:
+    """
+    Drop stored summaries for conversations that fell out of the weekly window.
+    """
+    conn = _connect()
+    with sqlite_store.transaction(conn):
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS _keep (conversation_id TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM _keep")
+        conn.executemany("INSERT OR IGNORE INTO _keep VALUES (?)", [(c,) for c in keep_conversation_ids])
+        conn.execute(
+            "DELETE FROM conversation_summaries WHERE user_id = ? "
+            "AND conversation_id NOT IN (SELECT conversation_id FROM _keep)",
+            (user_id,),
+        )
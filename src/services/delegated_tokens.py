@@ -0,0 +1,212 @@
+# src/services/delegated_tokens.py
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from src.models.user_profile import UserProfile
+from src.services.ms_oauth import refresh_access_token
+from src.services.user_profile_store import (
+    claim_token_refresh,
+    get_all_connected_users,
+    release_token_refresh,
+    update_user_profile,
+)
+
+logger = logging.getLogger(__name__)
+
+# Hand out a stored token only if it has at least this long left
+MIN_VALIDITY_SECONDS = int(os.getenv("DELEGATED_TOKEN_MIN_VALIDITY_SECONDS", "120"))
+
+# The background refresher renews tokens expiring within this window
+REFRESH_AHEAD_SECONDS = int(os.getenv("DELEGATED_TOKEN_REFRESH_AHEAD_SECONDS", "900"))
+REFRESH_INTERVAL_SECONDS = int(os.getenv("DELEGATED_TOKEN_REFRESH_INTERVAL_SECONDS", "120"))
+
+# After a failed refresh, the background loop leaves that user alone for a while
+FAILURE_BACKOFF_SECONDS = int(os.getenv("DELEGATED_TOKEN_FAILURE_BACKOFF_SECONDS", "900"))
+
+# A refresh claim lapses after this long, in case its holder died mid-refresh
+REFRESH_LEASE_SECONDS = int(os.getenv("DELEGATED_TOKEN_REFRESH_LEASE_SECONDS", "60"))
+# How often a caller re-reads the store while another process refreshes
+CLAIM_POLL_SECONDS = 0.25
+
+# Identifies this process's refresh claims; the thread locks below keep it
+# to one refresh per user inside the process
+_CLAIM_OWNER = uuid.uuid4().hex
+
+_user_locks: Dict[str, threading.Lock] = {}
+_user_locks_guard = threading.Lock()
+_failed_until: Dict[str, float] = {}
+
+
+def build_token_record(
+    token_data: Dict[str, Any],
+    previous: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Shape a token endpoint response for UserProfile.outlook_tokens, adding an
+    absolute expires_at so expiry can be checked without knowing when it was saved.
+    """
+    previous = previous or {}
+    expires_in = int(token_data.get("expires_in") or 3600)
+    return {
+        "access_token": token_data.get("access_token"),
+        # Microsoft may omit the refresh token on refresh; keep the old one then
+        "refresh_token": token_data.get("refresh_token") or previous.get("refresh_token"),
+        "scope": token_data.get("scope") or previous.get("scope"),
+        "expires_in": expires_in,
+        "expires_at": int(time.time()) + expires_in,
+        "token_type": token_data.get("token_type") or previous.get("token_type"),
+    }
+
+
+def _seconds_left(tokens: Dict[str, Any]) -> float:
+    expires_at = tokens.get("expires_at")
+    if not expires_at:
+        # Records saved before expires_at existed: treat as unknown, i.e. expired
+        return 0.0
+    return float(expires_at) - time.time()
+
+
+def _user_lock(user_id: str) -> threading.Lock:
+    with _user_locks_guard:
+        return _user_locks.setdefault(user_id, threading.Lock())
+
+
+def refresh_user_tokens(
+    user_id: str,
+    min_validity: float = MIN_VALIDITY_SECONDS,
+    wait: bool = True,
+) -> Optional[Dict[str, Any]]:
+    """
+    Refresh a user's delegated tokens and persist them.
+
+    Calls for the same user are deduplicated across threads and worker
+    processes: the refresh is claimed in the profile store, and callers
+    that find it claimed re-read the store and reuse the result. With
+    wait=False such a caller returns None instead of waiting.
+    """
+    def needed(p: UserProfile) -> bool:
+        tokens = p.outlook_tokens or {}
+        return not (tokens.get("access_token") and _seconds_left(tokens) > min_validity)
+
+    with _user_lock(user_id):
+        deadline = time.time() + REFRESH_LEASE_SECONDS + CLAIM_POLL_SECONDS
+        while True:
+            profile, claimed = claim_token_refresh(user_id, _CLAIM_OWNER, REFRESH_LEASE_SECONDS, needed)
+            if profile is None:
+                raise RuntimeError(f"No user profile found for user_id={user_id}")
+            tokens = profile.outlook_tokens or {}
+            if claimed:
+                break
+            if not needed(profile):
+                return tokens
+            if not wait:
+                return None
+            if time.time() > deadline:
+                raise RuntimeError(f"Token refresh for user {user_id} is still running elsewhere")
+            time.sleep(CLAIM_POLL_SECONDS)
+
+        try:
+            refresh_token = tokens.get("refresh_token")
+            if not refresh_token:
+                raise RuntimeError(f"User {user_id} has no refresh token; reconnect Outlook")
+
+            try:
+                token_data = refresh_access_token(refresh_token)
+            except Exception:
+                _failed_until[user_id] = time.time() + FAILURE_BACKOFF_SECONDS
+                raise
+            _failed_until.pop(user_id, None)
+
+            record = build_token_record(token_data, previous=tokens)
+
+            def apply(p: UserProfile) -> None:
+                p.outlook_tokens = record
+
+            update_user_profile(user_id, apply)
+            return record
+        finally:
+            release_token_refresh(user_id, _CLAIM_OWNER)
+
+
+def get_access_token(profile: UserProfile) -> Optional[str]:
+    """
+    Return a delegated access token for the profile that is valid for at least
+    MIN_VALIDITY_SECONDS. The background refresher normally keeps this a pure
+    read; a foreground refresh only happens if it fell behind.
+    """
+    tokens = profile.outlook_tokens or {}
+    if not tokens.get("access_token"):
+        return None
+    if _seconds_left(tokens) > MIN_VALIDITY_SECONDS:
+        return tokens["access_token"]
+
+    # The copy we were handed may be stale; another worker may have refreshed already
+    fresh = refresh_user_tokens(profile.user_id)
+    profile.outlook_tokens = fresh
+    return fresh.get("access_token")
+
+
+def refresh_expiring_tokens(ahead_seconds: float = REFRESH_AHEAD_SECONDS) -> int:
+    """
+    Refresh every connected user whose token expires within `ahead_seconds`.
+    Returns how many users were refreshed.
+    """
+    refreshed = 0
+    now = time.time()
+    for profile in get_all_connected_users():
+        tokens = profile.outlook_tokens or {}
+        if not tokens.get("refresh_token"):
+            continue
+        if _failed_until.get(profile.user_id, 0) > now:
+            continue
+        if _seconds_left(tokens) > ahead_seconds:
+            continue
+        try:
+            # Another worker's refresher may have this user in hand already
+            if refresh_user_tokens(profile.user_id, min_validity=ahead_seconds, wait=False) is not None:
+                refreshed += 1
+        except Exception as exc:
+            logger.warning("Token refresh failed for user %s: %s", profile.user_id, exc)
+    return refreshed
+
+
+class TokenRefresher:
+    """
+    Daemon thread that keeps connected users' tokens ahead of expiry.
+    """
+
+    def __init__(self, interval_seconds: float = REFRESH_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="token-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                refresh_expiring_tokens()
+            except Exception as exc:
+                logger.warning("Token refresh sweep failed: %s", exc)
+            self._stop.wait(self.interval_seconds)
+
+
+token_refresher = TokenRefresher()
@@ -0,0 +1,389 @@
+# src/services/document_extraction.py
+
+from __future__ import annotations
+
+import asyncio
+import codecs
+import email
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from email import policy
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+from xml.etree import ElementTree
+
+from src.utils import sqlite_store
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = Path(os.getenv("UPLOAD_TEXT_CACHE_DB", "src/data/extracted_texts.sqlite3"))
+
+# Extraction stops once a document has produced this much text
+MAX_CHARS = int(os.getenv("UPLOAD_EXTRACT_MAX_CHARS", "2000000"))
+PROCESS_WORKERS = int(os.getenv("UPLOAD_EXTRACT_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+# Bump when an extractor's output changes so cached texts are redone
+EXTRACTOR_VERSION = "1"
+
+_READ_CHUNK = 64 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS extracted_texts (
+    content_hash TEXT NOT NULL,
+    extractor TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (content_hash, extractor)
+);
+"""
+
+# An extractor yields a document's text piece by piece (pages, paragraphs,
+# decoded blocks), so large files are never held in memory whole
+Extractor = Callable[[Path], Iterator[str]]
+
+_EXTRACTORS: Dict[str, Extractor] = {}
+
+
+def register_extractor(*suffixes: str) -> Callable[[Extractor], Extractor]:
+    """
+    Register an extractor for file suffixes (".pdf"). A later registration
+    for the same suffix replaces the earlier one.
+    """
+    def decorator(fn: Extractor) -> Extractor:
+        for suffix in suffixes:
+            _EXTRACTORS[suffix.lower()] = fn
+        return fn
+    return decorator
+
+
+def supported_suffixes() -> Set[str]:
+    return set(_EXTRACTORS)
+
+
+def is_supported(path: Union[str, Path]) -> bool:
+    return Path(path).suffix.lower() in _EXTRACTORS
+
+
+def _extractor_for(path: Path) -> Extractor:
+    try:
+        return _EXTRACTORS[path.suffix.lower()]
+    except KeyError:
+        raise ValueError(f"no extractor for {path.suffix or path.name}") from None
+
+
+@register_extractor(".txt", ".md")
+def extract_plain_text(path: Path) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(_READ_CHUNK), b""):
+            yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+
+@register_extractor(".pdf")
+def extract_pdf(path: Path) -> Iterator[str]:
+    # pypdf parses page objects on access, so pages are read one at a time
+    from pypdf import PdfReader
+
+    with path.open("rb") as f:
+        for page in PdfReader(f).pages:
+            text = (page.extract_text() or "").strip()
+            if text:
+                yield text + "\n\n"
+
+
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+@register_extractor(".docx")
+def extract_docx(path: Path) -> Iterator[str]:
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as doc:
+        parts: List[str] = []
+        for _, elem in ElementTree.iterparse(doc, events=("end",)):
+            if elem.tag == _W_NS + "t":
+                parts.append(elem.text or "")
+            elif elem.tag == _W_NS + "tab":
+                parts.append(" ")
+            elif elem.tag == _W_NS + "br":
+                parts.append("\n")
+            elif elem.tag == _W_NS + "p":
+                text = "".join(parts).strip()
+                parts = []
+                if text:
+                    yield text + "\n\n"
+            elif elem.tag == _W_NS + "body":
+                break
+            if elem.tag in (_W_NS + "p", _W_NS + "tbl"):
+                elem.clear()
+
+
+class _HTMLText(HTMLParser):
+    _SKIP = {"script", "style", "head", "noscript", "template"}
+    _BLOCK = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "table", "section", "article"}
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip_depth += 1
+        elif tag in self._BLOCK:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self._BLOCK:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+    def take(self) -> str:
+        text, self.parts = "".join(self.parts), []
+        return text
+
+
+def html_to_text(html: str) -> str:
+    parser = _HTMLText()
+    parser.feed(html)
+    parser.close()
+    return parser.take()
+
+
+@register_extractor(".html", ".htm")
+def extract_html(path: Path) -> Iterator[str]:
+    parser = _HTMLText()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(_READ_CHUNK), b""):
+            parser.feed(decoder.decode(block))
+            yield parser.take()
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    yield parser.take()
+
+
+@register_extractor(".eml")
+def extract_eml(path: Path) -> Iterator[str]:
+    with path.open("rb") as f:
+        msg = email.message_from_binary_file(f, policy=policy.default)
+
+    headers = [f"{name}: {msg[name]}" for name in ("From", "To", "Date", "Subject") if msg[name]]
+    yield "\n".join(headers) + "\n\n"
+
+    # Plain text bodies; HTML only when the message has no plain part.
+    # Attachments are skipped.
+    plain, html = [], []
+    for part in msg.walk():
+        if part.is_multipart() or part.get_content_disposition() == "attachment":
+            continue
+        ctype = part.get_content_type()
+        if ctype == "text/plain":
+            plain.append(part)
+        elif ctype == "text/html":
+            html.append(part)
+    for part in plain:
+        yield str(part.get_content()) + "\n\n"
+    if not plain:
+        for part in html:
+            yield html_to_text(str(part.get_content())) + "\n\n"
+
+
+def extract_path(path: Union[str, Path], max_chars: int = MAX_CHARS) -> str:
+    """
+    Text of one file through its registered extractor, stopping after
+    max_chars. Runs in the worker processes; safe to call directly too.
+    """
+    path = Path(path)
+    pieces: List[str] = []
+    size = 0
+    for piece in _extractor_for(path)(path):
+        if not piece:
+            continue
+        pieces.append(piece)
+        size += len(piece)
+        if size >= max_chars:
+            break
+    return "".join(pieces)[:max_chars].strip()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs threads and holds SQLite
+            # connections is not safe
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, PROCESS_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _reset_pool(broken: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False)
+
+
+def _submit(path: Path) -> Tuple[ProcessPoolExecutor, "Future[str]"]:
+    pool = _get_pool()
+    try:
+        return pool, pool.submit(extract_path, str(path))
+    except BrokenProcessPool:
+        # A worker died (e.g. on a malformed file); start a fresh pool
+        _reset_pool(pool)
+        pool = _get_pool()
+        return pool, pool.submit(extract_path, str(path))
+
+
+def _result(pool: ProcessPoolExecutor, future: "Future[str]") -> str:
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        raise
+
+
+def _connect() -> sqlite3.Connection:
+    return sqlite_store.connect(CACHE_PATH, _SCHEMA)
+
+
+def _cache_key(path: Path) -> str:
+    fn = _extractor_for(path)
+    return f"{fn.__name__}:{EXTRACTOR_VERSION}"
+
+
+def get_cached_text(path: Path, content_hash: str) -> Optional[str]:
+    row = _connect().execute(
+        "SELECT text FROM extracted_texts WHERE content_hash = ? AND extractor = ?",
+        (content_hash, _cache_key(path)),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _put_cached_text(path: Path, content_hash: str, text: str) -> None:
+    _connect().execute(
+        "INSERT OR REPLACE INTO extracted_texts (content_hash, extractor, text, created_at) VALUES (?, ?, ?, ?)",
+        (content_hash, _cache_key(path), text, time.time()),
+    )
+
+
+_inflight: Dict[Tuple[str, str], Tuple[ProcessPoolExecutor, "Future[str]"]] = {}
+_inflight_lock = threading.Lock()
+
+
+def _finish(key: Tuple[str, str], path: Path, future: "Future[str]") -> None:
+    try:
+        if not future.cancelled() and future.exception() is None:
+            _put_cached_text(path, key[0], future.result())
+    except Exception:
+        logger.exception("could not cache extracted text of %s", path.name)
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _start(path: Path, content_hash: str) -> Tuple[ProcessPoolExecutor, "Future[str]"]:
+    """
+    Extraction of one file on the process pool, joining a run already in
+    flight for the same content. The text is cached when it finishes,
+    whether or not anyone waits for it.
+    """
+    key = (content_hash, _cache_key(path))
+    with _inflight_lock:
+        running = _inflight.get(key)
+        if running:
+            return running
+        pool, future = _submit(path)
+        _inflight[key] = (pool, future)
+    future.add_done_callback(lambda f: _finish(key, path, f))
+    return pool, future
+
+
+def start_extraction(path: Path, content_hash: str) -> bool:
+    """
+    Begin extracting a freshly stored file in the background so a later
+    extract_text or manifest scan finds it cached or in flight. Returns
+    False for unsupported or already cached files.
+    """
+    if not is_supported(path) or get_cached_text(path, content_hash) is not None:
+        return False
+    _start(path, content_hash)
+    return True
+
+
+def extract_texts(items: List[Tuple[Path, str]]) -> List[Union[str, Exception]]:
+    """
+    Text of each (path, content hash), in order. Cached texts are returned
+    as is; the rest are extracted in parallel on the process pool and
+    cached. A file that fails yields its exception instead of a text.
+    """
+    out: List[Union[str, Exception, None]] = [None] * len(items)
+    pending = []
+    for i, (path, content_hash) in enumerate(items):
+        try:
+            cached = get_cached_text(path, content_hash)
+        except ValueError as exc:
+            out[i] = exc
+            continue
+        if cached is not None:
+            out[i] = cached
+        else:
+            pending.append((i, *_start(path, content_hash)))
+
+    for i, pool, future in pending:
+        try:
+            out[i] = _result(pool, future)
+        except Exception as exc:
+            out[i] = exc
+    return out  # type: ignore[return-value]
+
+
+def extract_text(path: Path, content_hash: str) -> str:
+    result = extract_texts([(path, content_hash)])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+async def aextract_text(path: Path, content_hash: str) -> str:
+    """
+    extract_text for async code: the parse runs on the process pool and
+    the cache lookup off the event loop.
+    """
+    cached = await asyncio.to_thread(get_cached_text, path, content_hash)
+    if cached is not None:
+        return cached
+    pool, future = _start(path, content_hash)
+    try:
+        return await asyncio.wrap_future(future)
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        raise
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,234 @@
+# src/services/graph_throttle.py
+
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional
+
+from src.utils.event_loops import LoopWaiters, wait_woken
+from src.utils.jwt_handler import unverified_claims
+
+# Status codes Graph uses for throttling and transient overload
+RETRY_STATUSES = frozenset({429, 503, 504})
+# A 504 may hide a request that did run; only replay it for reads
+_READ_ONLY_RETRY_STATUSES = frozenset({504})
+
+MAX_RETRIES = int(os.getenv("GRAPH_MAX_RETRIES", "5"))
+BACKOFF_BASE_SECONDS = float(os.getenv("GRAPH_BACKOFF_BASE_SECONDS", "0.5"))
+BACKOFF_MAX_SECONDS = float(os.getenv("GRAPH_BACKOFF_MAX_SECONDS", "30"))
+
+# AIMD limits for in-flight Graph requests per tenant
+LIMIT_INITIAL = float(os.getenv("GRAPH_TENANT_CONCURRENCY_INITIAL", "8"))
+LIMIT_MIN = float(os.getenv("GRAPH_TENANT_CONCURRENCY_MIN", "1"))
+LIMIT_MAX = float(os.getenv("GRAPH_TENANT_CONCURRENCY_MAX", "32"))
+LIMIT_DECREASE_FACTOR = 0.5
+# Several requests in flight usually get throttled together; shrink only once per window
+DECREASE_COOLDOWN_SECONDS = 1.0
+
+
+def should_retry(method: str, status: int) -> bool:
+    if status not in RETRY_STATUSES:
+        return False
+    return status not in _READ_ONLY_RETRY_STATUSES or method.upper() == "GET"
+
+
+def retry_after_seconds(headers: Mapping[str, Any]) -> Optional[float]:
+    """
+    Parse a Retry-After header given either as seconds or as an HTTP date.
+    """
+    value = None
+    for key, v in headers.items():
+        if key.lower() == "retry-after":
+            value = v
+            break
+    if value in (None, ""):
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(str(value)).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_seconds(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Honour Retry-After when Graph sends one, otherwise use full-jitter
+    exponential backoff.
+    """
+    if retry_after is not None:
+        # A little jitter keeps a crowd of waiting workers from retrying in lockstep
+        return retry_after + random.uniform(0, BACKOFF_BASE_SECONDS)
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one tenant.
+
+    Each success grows the limit by roughly one slot per full window of
+    requests; a throttled response halves it and pauses new requests until
+    the Retry-After time has passed.
+    """
+
+    def __init__(
+        self,
+        initial: float = LIMIT_INITIAL,
+        minimum: float = LIMIT_MIN,
+        maximum: float = LIMIT_MAX,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._async_waiters = LoopWaiters()
+
+    def _take(self) -> Optional[float]:
+        """
+        Take a slot (returns 0.0) or return how long to wait; None means
+        wait for a release. Call with the condition held.
+        """
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            return pause
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return 0.0
+        return None
+
+    def acquire(self) -> float:
+        """
+        Block until a slot is free. Returns the seconds spent waiting.
+        """
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                wait = self._take()
+                if wait == 0.0:
+                    return time.monotonic() - start
+                self._cond.wait(wait)
+
+    async def acquire_async(self) -> float:
+        """
+        acquire for coroutines: sleeps on a future that release wakes. The
+        slot is taken with no await in between, so a cancelled caller never
+        holds one.
+        """
+        start = time.monotonic()
+        while True:
+            with self._cond:
+                wait = self._take()
+                if wait == 0.0:
+                    return time.monotonic() - start
+                woken = self._async_waiters.add()
+            try:
+                await wait_woken(woken, wait)
+            finally:
+                with self._cond:
+                    self._async_waiters.discard(woken)
+
+    def release(self, throttled: bool = False, retry_after: Optional[float] = None) -> None:
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            now = time.monotonic()
+            if throttled:
+                if now - self._last_decrease >= DECREASE_COOLDOWN_SECONDS:
+                    self.limit = max(self.minimum, self.limit * LIMIT_DECREASE_FACTOR)
+                    self._last_decrease = now
+                if retry_after:
+                    self.paused_until = max(self.paused_until, now + retry_after)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+            self._async_waiters.wake_all()
+
+
+@dataclass
+class ThrottleStats:
+    requests: int = 0
+    retries: int = 0
+    throttled_responses: int = 0
+    throttled_seconds: float = 0.0
+    queued_seconds: float = 0.0
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_stats: Dict[str, ThrottleStats] = {}
+_lock = threading.Lock()
+
+_tenant_cache: Dict[str, str] = {}
+_TENANT_CACHE_MAX = 1024
+
+
+def tenant_of(access_token: str) -> str:
+    """
+    Tenant id from the bearer token's tid claim, used as the limiter key.
+    """
+    tenant = _tenant_cache.get(access_token)
+    if tenant is None:
+        tenant = str(unverified_claims(access_token).get("tid") or "unknown")
+        if len(_tenant_cache) >= _TENANT_CACHE_MAX:
+            _tenant_cache.clear()
+        _tenant_cache[access_token] = tenant
+    return tenant
+
+
+def limiter_for(tenant: str) -> AdaptiveLimiter:
+    with _lock:
+        limiter = _limiters.get(tenant)
+        if limiter is None:
+            limiter = _limiters[tenant] = AdaptiveLimiter()
+        return limiter
+
+
+def record(
+    tenant: str,
+    *,
+    requests: int = 0,
+    retries: int = 0,
+    throttled: int = 0,
+    throttled_seconds: float = 0.0,
+    queued_seconds: float = 0.0,
+) -> None:
+    with _lock:
+        s = _stats.setdefault(tenant, ThrottleStats())
+        s.requests += requests
+        s.retries += retries
+        s.throttled_responses += throttled
+        s.throttled_seconds += throttled_seconds
+        s.queued_seconds += queued_seconds
+
+
+def get_throttle_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Per-tenant counters plus the limiter's current concurrency limit.
+    """
+    with _lock:
+        out: Dict[str, Dict[str, Any]] = {}
+        for tenant, s in _stats.items():
+            limiter = _limiters.get(tenant)
+            out[tenant] = {
+                "requests": s.requests,
+                "retries": s.retries,
+                "throttled_responses": s.throttled_responses,
+                "throttled_seconds": round(s.throttled_seconds, 3),
+                "queued_seconds": round(s.queued_seconds, 3),
+                "concurrency_limit": round(limiter.limit, 2) if limiter else None,
+                "in_flight": limiter.in_flight if limiter else 0,
+            }
+        return out
+
+
+def reset_throttle_stats() -> None:
+    with _lock:
+        _stats.clear()
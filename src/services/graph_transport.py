@@ -0,0 +1,249 @@
+# src/services/graph_transport.py
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, TypeVar
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.services import graph_throttle
+from src.utils.event_loops import PerLoop
+
+GRAPH_URL = os.getenv("MS_GRAPH_URL", "https://graph.microsoft.com/v1.0").rstrip("/")
+
+# Keep-alive pool sizing. One pool is shared by every Graph caller in the process.
+POOL_CONNECTIONS = int(os.getenv("GRAPH_POOL_CONNECTIONS", "10"))
+POOL_MAXSIZE = int(os.getenv("GRAPH_POOL_MAXSIZE", "32"))
+DEFAULT_TIMEOUT = float(os.getenv("GRAPH_TIMEOUT_SECONDS", "30"))
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+_async_clients: PerLoop[httpx.AsyncClient] = PerLoop()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+T = TypeVar("T")
+
+
+def get_session() -> requests.Session:
+    """
+    Process-wide requests.Session with a keep-alive connection pool.
+    Reusing it avoids a fresh TCP+TLS handshake on every Graph call.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_CONNECTIONS,
+                    pool_maxsize=POOL_MAXSIZE,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def set_session(session: Optional[requests.Session]) -> Optional[requests.Session]:
+    """
+    Replace the shared session, e.g. with one that has a local Graph
+    stand-in mounted. None goes back to a lazily built pooled session.
+    Returns the previous session.
+    """
+    global _session
+    with _session_lock:
+        previous, _session = _session, session
+    return previous
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Pooled httpx.AsyncClient for the running event loop.
+    httpx clients are bound to the loop they were first used on, so keep one per loop.
+    """
+    return _async_clients.get(
+        lambda: httpx.AsyncClient(
+            timeout=DEFAULT_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=POOL_MAXSIZE,
+                max_keepalive_connections=POOL_MAXSIZE,
+            ),
+        ),
+        valid=lambda client: not client.is_closed,
+    )
+
+
+def _executor_pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=POOL_MAXSIZE,
+                    thread_name_prefix="graph",
+                )
+    return _executor
+
+
+def _headers(access_token: str, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    headers = {"Authorization": f"Bearer {access_token}"}
+    if extra:
+        headers.update(extra)
+    return headers
+
+
+def graph_request(
+    method: str,
+    url: str,
+    access_token: str,
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    json_body: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> requests.Response:
+    """
+    Send one Graph request over the shared pool and return the raw response.
+
+    Requests pass through the tenant's adaptive concurrency limiter, and
+    429/503/504 responses are retried after Retry-After (or jittered
+    backoff). Any other status is left to the caller so each module keeps
+    its own error style.
+    """
+    tenant = graph_throttle.tenant_of(access_token)
+    limiter = graph_throttle.limiter_for(tenant)
+    attempt = 0
+    while True:
+        queued = limiter.acquire()
+        try:
+            resp = get_session().request(
+                method,
+                url,
+                headers=_headers(access_token, headers),
+                params=params,
+                json=json_body,
+                timeout=timeout,
+            )
+        except BaseException:
+            limiter.release()
+            raise
+
+        throttled = graph_throttle.should_retry(method, resp.status_code)
+        retry_after = graph_throttle.retry_after_seconds(resp.headers) if throttled else None
+        limiter.release(throttled=throttled, retry_after=retry_after)
+        graph_throttle.record(tenant, requests=1, throttled=int(throttled), queued_seconds=queued)
+
+        if not throttled or attempt >= graph_throttle.MAX_RETRIES:
+            return resp
+
+        delay = graph_throttle.backoff_seconds(attempt, retry_after)
+        graph_throttle.record(tenant, retries=1, throttled_seconds=delay)
+        time.sleep(delay)
+        attempt += 1
+
+
+async def graph_request_async(
+    method: str,
+    url: str,
+    access_token: str,
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    json_body: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> httpx.Response:
+    """
+    asyncio variant of graph_request, using the pooled httpx client.
+    """
+    tenant = graph_throttle.tenant_of(access_token)
+    limiter = graph_throttle.limiter_for(tenant)
+    attempt = 0
+    while True:
+        queued = await limiter.acquire_async()
+        try:
+            resp = await get_async_client().request(
+                method,
+                url,
+                headers=_headers(access_token, headers),
+                params=params,
+                json=json_body,
+                timeout=timeout,
+            )
+        except BaseException:
+            limiter.release()
+            raise
+
+        throttled = graph_throttle.should_retry(method, resp.status_code)
+        retry_after = graph_throttle.retry_after_seconds(resp.headers) if throttled else None
+        limiter.release(throttled=throttled, retry_after=retry_after)
+        graph_throttle.record(tenant, requests=1, throttled=int(throttled), queued_seconds=queued)
+
+        if not throttled or attempt >= graph_throttle.MAX_RETRIES:
+            return resp
+
+        delay = graph_throttle.backoff_seconds(attempt, retry_after)
+        graph_throttle.record(tenant, retries=1, throttled_seconds=delay)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def graph_get_json(url: str, access_token: str, **kwargs: Any) -> Dict[str, Any]:
+    resp = graph_request("GET", url, access_token, **kwargs)
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def graph_get_json_async(url: str, access_token: str, **kwargs: Any) -> Dict[str, Any]:
+    resp = await graph_request_async("GET", url, access_token, **kwargs)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def run_parallel(calls: Sequence[Callable[[], T]]) -> List[T]:
+    """
+    Run independent Graph operations at the same time and return results in input order.
+    Wall time is the slowest call rather than the sum of all of them.
+    """
+    if len(calls) <= 1:
+        return [call() for call in calls]
+
+    futures = [_executor_pool().submit(call) for call in calls]
+    return [f.result() for f in futures]
+
+
+def graph_get_many(urls: Sequence[str], access_token: str) -> List[Dict[str, Any]]:
+    """
+    Fetch independent Graph URLs concurrently and return their JSON bodies in input order.
+    """
+    return run_parallel([lambda u=u: graph_get_json(u, access_token) for u in urls])
+
+
+async def graph_get_many_async(urls: Sequence[str], access_token: str) -> List[Dict[str, Any]]:
+    return list(await asyncio.gather(*(graph_get_json_async(u, access_token) for u in urls)))
+
+
+def close() -> None:
+    """
+    Release pooled connections (used on application shutdown).
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+async def aclose() -> None:
+    client = _async_clients.pop_current()
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,306 @@
+# src/services/job_queue.py
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.utils import sqlite_store
+
+logger = logging.getLogger(__name__)
+
+JOB_DB_PATH = Path(os.getenv("JOB_DB_PATH", "src/data/jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Finished jobs are kept this long for GET /jobs/{id}
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(24 * 3600)))
+# A process running jobs records a heartbeat this often; its in-flight jobs
+# count as interrupted once the heartbeat is JOB_HEARTBEAT_TIMEOUT_SECONDS old
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+JOB_HEARTBEAT_TIMEOUT_SECONDS = int(os.getenv("JOB_HEARTBEAT_TIMEOUT_SECONDS", str(3 * JOB_HEARTBEAT_SECONDS)))
+
+# A caller waiting on a job gives up after this long; the job keeps running
+JOB_WAIT_TIMEOUT_SECONDS = float(os.getenv("JOB_WAIT_TIMEOUT_SECONDS", "900"))
+
+IN_FLIGHT = ("queued", "running")
+
+# The partial unique index makes "one in-flight job per dedupe key" hold
+# across worker processes, not just within this one.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    dedupe_key TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_in_flight ON jobs(dedupe_key) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS idx_jobs_finished_at ON jobs(finished_at);
+CREATE TABLE IF NOT EXISTS job_owners (
+    owner TEXT PRIMARY KEY,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+_COLUMNS = "id, kind, dedupe_key, params, status, owner, result, error, created_at, started_at, finished_at"
+
+
+def _connect() -> sqlite3.Connection:
+    return sqlite_store.connect(JOB_DB_PATH, _SCHEMA)
+
+
+# PIDs are reused (every container's worker can be PID 1), so a job's owner
+# carries a token minted at process start as well
+_BOOT_ID = uuid.uuid4().hex[:12]
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{_BOOT_ID}"
+
+
+def _beat(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO job_owners (owner, heartbeat_at) VALUES (?, ?)",
+        (_owner(), time.time()),
+    )
+
+
+def _owner_alive(owner: str, heartbeat_at: Optional[float]) -> bool:
+    """
+    Whether the process that owns a job may still be running it.
+    """
+    me = _owner()
+    if owner == me:
+        return True
+    # Same host and PID with another boot token: that process is gone, this
+    # one took its PID (a quick container restart), however fresh its heartbeat
+    if owner.rsplit(":", 1)[0] == me.rsplit(":", 1)[0]:
+        return False
+    return heartbeat_at is not None and heartbeat_at >= time.time() - JOB_HEARTBEAT_TIMEOUT_SECONDS
+
+
+def _fail_interrupted(conn: sqlite3.Connection, job_id: str) -> None:
+    conn.execute(
+        "UPDATE jobs SET status = 'failed', error = 'interrupted', finished_at = ? "
+        "WHERE id = ? AND status IN ('queued', 'running')",
+        (time.time(), job_id),
+    )
+
+
+def _row_to_job(row: Tuple[Any, ...]) -> Dict[str, Any]:
+    job = dict(zip([c.strip() for c in _COLUMNS.split(",")], row))
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+
+def dedupe_key(kind: str, params: Dict[str, Any]) -> str:
+    payload = json.dumps([kind, params], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    row = _connect().execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+
+class JobQueue:
+    """
+    Runs registered job kinds on a bounded thread pool and records their
+    state in a local SQLite file. Submitting a job identical to one already
+    queued or running returns that job instead of starting another.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self._workers = max(1, workers)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._handlers: Dict[str, Callable[..., Any]] = {}
+        self._futures: Dict[str, Future] = {}
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def register(self, kind: str, handler: Callable[..., Any]) -> None:
+        self._handlers[kind] = handler
+
+    def start(self) -> None:
+        """
+        Recover jobs left behind by dead processes and start the heartbeat,
+        which repeats that recovery, at application startup.
+        """
+        _beat(_connect())
+        self.recover_interrupted()
+        with self._pool_lock:
+            self._start_heartbeat()
+
+    def _start_heartbeat(self) -> None:
+        # Call with _pool_lock held
+        if self._heartbeat is not None and self._heartbeat.is_alive():
+            return
+        self._heartbeat_stop.clear()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="job")
+            self._start_heartbeat()
+            return self._pool
+
+    def _heartbeat_loop(self) -> None:
+        while not self._heartbeat_stop.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                _beat(_connect())
+                # Frees jobs of workers that died since this process started
+                self.recover_interrupted()
+            except Exception as exc:
+                logger.warning("Job heartbeat failed: %s", exc)
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """
+        Queue a job. Returns (job, created); created is False when an
+        identical job was already in flight and that job is returned. An
+        in-flight job whose owner has died is failed and replaced.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        key = dedupe_key(kind, params)
+        conn = _connect()
+        job_id = uuid.uuid4().hex
+        with sqlite_store.transaction(conn):
+            _beat(conn)
+            row = conn.execute(
+                f"SELECT {_COLUMNS}, "
+                "(SELECT heartbeat_at FROM job_owners WHERE job_owners.owner = jobs.owner) "
+                "FROM jobs WHERE dedupe_key = ? AND status IN ('queued', 'running')",
+                (key,),
+            ).fetchone()
+            if row:
+                job = _row_to_job(row[:-1])
+                if _owner_alive(job["owner"], row[-1]):
+                    return job, False
+                _fail_interrupted(conn, job["id"])
+            conn.execute(
+                "INSERT INTO jobs (id, kind, dedupe_key, params, status, owner, created_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, key, json.dumps(params), _owner(), time.time()),
+            )
+            conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - JOB_RETENTION_SECONDS,),
+            )
+
+        future = self._executor().submit(self._run, job_id, kind, params)
+        self._futures[job_id] = future
+        future.add_done_callback(lambda _: self._futures.pop(job_id, None))
+        return get_job(job_id), True
+
+    def _run(self, job_id: str, kind: str, params: Dict[str, Any]) -> None:
+        conn = _connect()
+        started = conn.execute(
+            "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'",
+            (time.time(), job_id),
+        )
+        if started.rowcount == 0:
+            # Failed as interrupted by shutdown before a worker picked it up
+            return
+        # Anything that escapes (SystemExit, KeyboardInterrupt) still ends the
+        # job, so its dedupe key isn't held until the next restart
+        status, result, error = "failed", None, "interrupted"
+        try:
+            result = json.dumps(self._handlers[kind](**params), default=str)
+            status, error = "succeeded", None
+        except Exception as exc:
+            error = str(exc) or exc.__class__.__name__
+        finally:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, result, error, time.time(), job_id),
+            )
+
+    async def wait(
+        self,
+        job_id: str,
+        poll_seconds: float = 0.5,
+        timeout: Optional[float] = JOB_WAIT_TIMEOUT_SECONDS,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Wait for a job without holding a thread: awaits the local future when
+        this process runs the job, otherwise polls the store. After `timeout`
+        seconds the job is returned as it stands, possibly still in flight.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        future = self._futures.get(job_id)
+        if future is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+            except asyncio.TimeoutError:
+                pass
+        while True:
+            job = get_job(job_id)
+            if job is None or job["status"] not in IN_FLIGHT:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            await asyncio.sleep(poll_seconds)
+
+    def recover_interrupted(self) -> int:
+        """
+        Fail queued/running jobs whose owning process is gone (see
+        _owner_alive), so their dedupe keys are free again. This process's
+        own jobs are never touched: its owner token is new at every start.
+        """
+        conn = _connect()
+        rows = conn.execute(
+            """
+            SELECT jobs.id, jobs.owner, job_owners.heartbeat_at FROM jobs
+            LEFT JOIN job_owners ON job_owners.owner = jobs.owner
+            WHERE jobs.status IN ('queued', 'running')
+            """
+        ).fetchall()
+        failed = 0
+        for job_id, owner, heartbeat_at in rows:
+            if _owner_alive(owner, heartbeat_at):
+                continue
+            _fail_interrupted(conn, job_id)
+            failed += 1
+        conn.execute(
+            "DELETE FROM job_owners WHERE heartbeat_at < ?",
+            (time.time() - JOB_RETENTION_SECONDS,),
+        )
+        return failed
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        self._heartbeat_stop.set()
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+        # Jobs no worker picked up would otherwise hold their dedupe keys
+        # until this process's heartbeat times out
+        _connect().execute(
+            "UPDATE jobs SET status = 'failed', error = 'interrupted', finished_at = ? "
+            "WHERE owner = ? AND status = 'queued'",
+            (time.time(), _owner()),
+        )
+
+
+job_queue = JobQueue()
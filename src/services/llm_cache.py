@@ -0,0 +1,276 @@
+# src/services/llm_cache.py
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from src.utils import sqlite_store
+
+CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", "src/data/llm_cache.sqlite3"))
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+# Sampled requests (temperature above this) are meant to vary; never replay them
+MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0"))
+
+# Evict a little below the cap, and only check the size every this many
+# writes in a process, so a put is not a full-table COUNT(*)
+_EVICT_TO_RATIO = 0.9
+EVICT_CHECK_EVERY = int(os.getenv("LLM_CACHE_EVICT_CHECK_EVERY", "100"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access);
+"""
+
+_metrics_lock = threading.Lock()
+_metrics: Dict[str, int] = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "expired": 0, "uncacheable": 0}
+_writes_since_check = 0
+
+
+def _connect() -> sqlite3.Connection:
+    return sqlite_store.connect(CACHE_PATH, _SCHEMA)
+
+
+def _bump(name: str, n: int = 1) -> None:
+    with _metrics_lock:
+        _metrics[name] += n
+
+
+def is_cacheable(params: Dict[str, Any]) -> bool:
+    """
+    Only deterministic requests are cached. A missing temperature means the
+    provider default (1.0), so it is not cacheable either.
+    """
+    return float(params.get("temperature", 1.0)) <= MAX_TEMPERATURE
+
+
+def cache_key(
+    provider: str,
+    model: str,
+    params: Dict[str, Any],
+    messages: List[Dict[str, Any]],
+) -> str:
+    """
+    Content address for a completion request.
+    """
+    payload = json.dumps(
+        {"provider": provider, "model": model, "params": params, "messages": messages},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(key: str) -> Optional[str]:
+    conn = _connect()
+    row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        _bump("misses")
+        return None
+
+    response, created_at = row
+    now = time.time()
+    if TTL_SECONDS > 0 and now - created_at > TTL_SECONDS:
+        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+        _bump("expired")
+        _bump("misses")
+        return None
+
+    conn.execute("UPDATE llm_cache SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key))
+    _bump("hits")
+    return response
+
+
+def put(key: str, provider: str, model: str, response: str) -> None:
+    conn = _connect()
+    now = time.time()
+    conn.execute(
+        """
+        INSERT INTO llm_cache (key, provider, model, response, created_at, last_access, hits)
+        VALUES (?, ?, ?, ?, ?, ?, 0)
+        ON CONFLICT(key) DO UPDATE SET
+            response = excluded.response,
+            created_at = excluded.created_at,
+            last_access = excluded.last_access
+        """,
+        (key, provider, model, response, now, now),
+    )
+    _bump("writes")
+    if _due_for_eviction_check():
+        _evict(conn)
+
+
+def _due_for_eviction_check() -> bool:
+    global _writes_since_check
+    with _metrics_lock:
+        due = _writes_since_check == 0
+        _writes_since_check = (_writes_since_check + 1) % max(1, EVICT_CHECK_EVERY)
+    return due
+
+
+def _evict(conn: sqlite3.Connection) -> None:
+    if MAX_ENTRIES <= 0:
+        return
+    (count,) = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+    if count <= MAX_ENTRIES:
+        return
+    remove = count - int(MAX_ENTRIES * _EVICT_TO_RATIO)
+    conn.execute(
+        "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+        (remove,),
+    )
+    _bump("evictions", remove)
+
+
+def cached_completion(
+    provider: str,
+    model: str,
+    params: Dict[str, Any],
+    messages: List[Dict[str, Any]],
+    call: Callable[[], str],
+) -> str:
+    """
+    Return the cached response for this exact request, or run `call` and cache it.
+    Requests above MAX_TEMPERATURE always go to the provider.
+    Cache failures never fail the request; they just fall through to the provider.
+    """
+    if not CACHE_ENABLED:
+        return call()
+    if not is_cacheable(params):
+        _bump("uncacheable")
+        return call()
+
+    key = cache_key(provider, model, params, messages)
+    try:
+        hit = get(key)
+    except sqlite3.Error:
+        hit = None
+    if hit is not None:
+        return hit
+
+    response = call()
+    try:
+        put(key, provider, model, response)
+    except sqlite3.Error:
+        pass
+    return response
+
+
+async def acached_completion(
+    provider: str,
+    model: str,
+    params: Dict[str, Any],
+    messages: List[Dict[str, Any]],
+    call: Callable[[], Awaitable[str]],
+) -> str:
+    """
+    cached_completion for async callers; store reads and writes run off the event loop.
+    """
+    if not CACHE_ENABLED:
+        return await call()
+    if not is_cacheable(params):
+        _bump("uncacheable")
+        return await call()
+
+    key = cache_key(provider, model, params, messages)
+    try:
+        hit = await asyncio.to_thread(get, key)
+    except sqlite3.Error:
+        hit = None
+    if hit is not None:
+        return hit
+
+    response = await call()
+    try:
+        await asyncio.to_thread(put, key, provider, model, response)
+    except sqlite3.Error:
+        pass
+    return response
+
+
+def cached_stream(
+    provider: str,
+    model: str,
+    params: Dict[str, Any],
+    messages: List[Dict[str, Any]],
+    stream: Callable[[], Iterator[str]],
+) -> Iterator[str]:
+    """
+    Streaming counterpart of cached_completion, sharing its keys. A hit is
+    yielded as one chunk; a miss yields provider chunks as they arrive and
+    caches the full text only once the stream finishes.
+    """
+    if not CACHE_ENABLED:
+        with closing(stream()) as chunks:
+            yield from chunks
+        return
+    if not is_cacheable(params):
+        _bump("uncacheable")
+        with closing(stream()) as chunks:
+            yield from chunks
+        return
+
+    key = cache_key(provider, model, params, messages)
+    try:
+        hit = get(key)
+    except sqlite3.Error:
+        hit = None
+    if hit is not None:
+        yield hit
+        return
+
+    parts: List[str] = []
+    # Closing this generator early (client gone) closes the provider stream too
+    with closing(stream()) as chunks:
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+    try:
+        put(key, provider, model, "".join(parts))
+    except sqlite3.Error:
+        pass
+
+
+def cache_stats() -> Dict[str, Any]:
+    """
+    Hit/miss counters for this process plus the shared store's size.
+    """
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    lookups = metrics["hits"] + metrics["misses"]
+    metrics["hit_rate"] = round(metrics["hits"] / lookups, 4) if lookups else 0.0
+    try:
+        entries, total_hits = _connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM llm_cache"
+        ).fetchone()
+        metrics["entries"] = entries
+        metrics["stored_hits"] = total_hits
+    except sqlite3.Error:
+        pass
+    metrics["max_entries"] = MAX_ENTRIES
+    metrics["max_temperature"] = MAX_TEMPERATURE
+    metrics["ttl_seconds"] = TTL_SECONDS
+    return metrics
+
+
+def clear() -> None:
+    _connect().execute("DELETE FROM llm_cache")
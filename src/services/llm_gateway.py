@@ -0,0 +1,483 @@
+# src/services/llm_gateway.py
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from src.services.llm_cache import acached_completion, cached_completion, cached_stream
+from src.services.prompt_packer import count_tokens
+from src.utils.event_loops import LoopWaiters, PerLoop, wait_woken
+
+PROVIDERS = ("openai", "anthropic")
+
+# Per-provider limits. TPM counts prompt + max_tokens up front and is
+# corrected to the provider's reported usage when the call finishes.
+CONCURRENCY = {
+    "openai": int(os.getenv("LLM_OPENAI_CONCURRENCY", "8")),
+    "anthropic": int(os.getenv("LLM_ANTHROPIC_CONCURRENCY", "4")),
+}
+TOKENS_PER_MINUTE = {
+    "openai": int(os.getenv("LLM_OPENAI_TPM", "200000")),
+    "anthropic": int(os.getenv("LLM_ANTHROPIC_TPM", "80000")),
+}
+
+TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+# Retries inside the provider SDK (429/5xx, honouring Retry-After)
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+POOL_MAXSIZE = int(os.getenv("LLM_POOL_MAXSIZE", "20"))
+
+RECENT_CALLS = 200
+
+
+def _configured_key(provider: str) -> Optional[str]:
+    if provider == "openai":
+        return os.getenv("OPENAI_API_KEY")
+    # Older code read ANTHROPIC_API_KEY, the weekly engine CLAUDE_API_KEY
+    return os.getenv("CLAUDE_API_KEY") or os.getenv("ANTHROPIC_API_KEY")
+
+
+def has_api_key(provider: str) -> bool:
+    return bool(_configured_key(provider))
+
+
+def _api_key(provider: str) -> str:
+    key = _configured_key(provider)
+    if not key:
+        name = "OPENAI_API_KEY" if provider == "openai" else "CLAUDE_API_KEY"
+        raise RuntimeError(f"{name} is not set. Add it to your .env file before running the app.")
+    return key
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=POOL_MAXSIZE, max_keepalive_connections=POOL_MAXSIZE)
+
+
+_clients: Dict[str, Any] = {}
+_async_clients: PerLoop[Dict[str, Any]] = PerLoop()
+_clients_lock = threading.Lock()
+
+
+def get_client(provider: str) -> Any:
+    """
+    Provider SDK client, created on first use over a pooled httpx.Client.
+    """
+    client = _clients.get(provider)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(provider)
+            if client is None:
+                http_client = httpx.Client(timeout=TIMEOUT_SECONDS, limits=_limits())
+                if provider == "openai":
+                    from openai import OpenAI
+
+                    client = OpenAI(api_key=_api_key(provider), max_retries=MAX_RETRIES, http_client=http_client)
+                else:
+                    import anthropic
+
+                    client = anthropic.Anthropic(
+                        api_key=_api_key(provider), max_retries=MAX_RETRIES, http_client=http_client
+                    )
+                _clients[provider] = client
+    return client
+
+
+def get_async_client(provider: str) -> Any:
+    """
+    Async SDK client for the running event loop (httpx async pools are loop-bound).
+    """
+    clients = _async_clients.get(dict)
+    client = clients.get(provider)
+    if client is None:
+        with _clients_lock:
+            client = clients.get(provider)
+            if client is None:
+                http_client = httpx.AsyncClient(timeout=TIMEOUT_SECONDS, limits=_limits())
+                if provider == "openai":
+                    from openai import AsyncOpenAI
+
+                    client = AsyncOpenAI(api_key=_api_key(provider), max_retries=MAX_RETRIES, http_client=http_client)
+                else:
+                    import anthropic
+
+                    client = anthropic.AsyncAnthropic(
+                        api_key=_api_key(provider), max_retries=MAX_RETRIES, http_client=http_client
+                    )
+                clients[provider] = client
+    return client
+
+
+class ProviderLimiter:
+    """
+    FIFO admission for one provider: a caller waits until it is at the head
+    of the queue, a concurrency slot is free and the tokens-per-minute bucket
+    holds its estimated cost.
+    """
+
+    def __init__(self, concurrency: int, tokens_per_minute: int):
+        self.concurrency = max(1, concurrency)
+        self.tokens_per_minute = tokens_per_minute
+        self.in_flight = 0
+        self.tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._queue: Deque[object] = deque()
+        self._cond = threading.Condition()
+        self._async_waiters = LoopWaiters()
+
+    def _clamp(self, cost: int) -> int:
+        return min(cost, self.tokens_per_minute) if self.tokens_per_minute > 0 else 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.tokens_per_minute > 0:
+            rate = self.tokens_per_minute / 60.0
+            self.tokens = min(float(self.tokens_per_minute), self.tokens + (now - self._updated) * rate)
+        self._updated = now
+
+    def _try_admit(self, ticket: object, cost: int) -> Optional[float]:
+        """
+        Admit the ticket (returns 0.0) or return how long to wait; None means
+        wait for a release.
+        """
+        if self._queue[0] is not ticket or self.in_flight >= self.concurrency:
+            return None
+        self._refill()
+        if cost > self.tokens:
+            return (cost - self.tokens) / (self.tokens_per_minute / 60.0)
+        self._queue.popleft()
+        self.in_flight += 1
+        self.tokens -= cost
+        self._notify()
+        return 0.0
+
+    def _notify(self) -> None:
+        # Call with the condition held; wakes thread and coroutine waiters alike
+        self._cond.notify_all()
+        self._async_waiters.wake_all()
+
+    def _abandon(self, ticket: object) -> None:
+        with self._cond:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+            self._notify()
+
+    def acquire(self, cost: int) -> float:
+        """
+        Block until admitted. Returns the seconds spent queued.
+        """
+        cost = self._clamp(cost)
+        start = time.monotonic()
+        ticket = object()
+        try:
+            with self._cond:
+                self._queue.append(ticket)
+                while True:
+                    wait = self._try_admit(ticket, cost)
+                    if wait == 0.0:
+                        return time.monotonic() - start
+                    self._cond.wait(wait)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    async def acquire_async(self, cost: int) -> float:
+        """
+        acquire for coroutines: sleeps on a future that release (or the token
+        refill time) wakes, so the event loop is never blocked or polled.
+        """
+        cost = self._clamp(cost)
+        start = time.monotonic()
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_admit(ticket, cost)
+                    if wait == 0.0:
+                        return time.monotonic() - start
+                    woken = self._async_waiters.add()
+                try:
+                    await wait_woken(woken, wait)
+                finally:
+                    with self._cond:
+                        self._async_waiters.discard(woken)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    def release(self, reserved: int, used: Optional[int] = None) -> None:
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            if used is not None and self.tokens_per_minute > 0:
+                self._refill()
+                refund = self._clamp(reserved) - used
+                self.tokens = min(float(self.tokens_per_minute), self.tokens + refund)
+            self._notify()
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+
+@dataclass
+class ProviderStats:
+    calls: int = 0
+    errors: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    queued_seconds: float = 0.0
+    latency_seconds: float = 0.0
+    recent: Deque[Dict[str, Any]] = field(default_factory=lambda: deque(maxlen=RECENT_CALLS))
+
+
+_limiters: Dict[str, ProviderLimiter] = {
+    p: ProviderLimiter(CONCURRENCY[p], TOKENS_PER_MINUTE[p]) for p in PROVIDERS
+}
+_stats: Dict[str, ProviderStats] = {p: ProviderStats() for p in PROVIDERS}
+_stats_lock = threading.Lock()
+
+
+def _check_provider(provider: str) -> None:
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+def _estimate_cost(messages: List[Dict[str, Any]], params: Dict[str, Any]) -> int:
+    prompt = sum(count_tokens(str(m.get("content", ""))) for m in messages)
+    return prompt + int(params.get("max_tokens", 0))
+
+
+def _record(
+    provider: str,
+    model: str,
+    queued: float,
+    latency: float,
+    usage: Optional[Tuple[int, int]],
+    ok: bool,
+) -> None:
+    with _stats_lock:
+        s = _stats[provider]
+        s.calls += 1
+        s.errors += 0 if ok else 1
+        s.queued_seconds += queued
+        s.latency_seconds += latency
+        if usage:
+            s.input_tokens += usage[0]
+            s.output_tokens += usage[1]
+        s.recent.append(
+            {
+                "model": model,
+                "ok": ok,
+                "queued_seconds": round(queued, 3),
+                "latency_seconds": round(latency, 3),
+                "input_tokens": usage[0] if usage else None,
+                "output_tokens": usage[1] if usage else None,
+                "at": time.time(),
+            }
+        )
+
+
+# Provider request shapes. Messages use OpenAI's chat format; for Anthropic,
+# system messages become the top-level `system` parameter.
+
+def _anthropic_kwargs(model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> Dict[str, Any]:
+    system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+    kwargs: Dict[str, Any] = {
+        "model": model,
+        "messages": [m for m in messages if m["role"] != "system"],
+        **params,
+    }
+    if system:
+        kwargs["system"] = system
+    return kwargs
+
+
+def _parse_response(provider: str, resp: Any) -> Tuple[str, Optional[Tuple[int, int]]]:
+    if provider == "openai":
+        usage = resp.usage
+        text = resp.choices[0].message.content or ""
+        return text, (usage.prompt_tokens, usage.completion_tokens) if usage else None
+    usage = resp.usage
+    return resp.content[0].text, (usage.input_tokens, usage.output_tokens) if usage else None
+
+
+def _create(provider: str, model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> Any:
+    client = get_client(provider)
+    if provider == "openai":
+        return client.chat.completions.create(model=model, messages=messages, **params)
+    return client.messages.create(**_anthropic_kwargs(model, messages, params))
+
+
+async def _acreate(provider: str, model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> Any:
+    client = get_async_client(provider)
+    if provider == "openai":
+        return await client.chat.completions.create(model=model, messages=messages, **params)
+    return await client.messages.create(**_anthropic_kwargs(model, messages, params))
+
+
+def _invoke(provider: str, model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    limiter = _limiters[provider]
+    cost = _estimate_cost(messages, params)
+    queued = limiter.acquire(cost)
+    start = time.monotonic()
+    usage: Optional[Tuple[int, int]] = None
+    ok = False
+    try:
+        text, usage = _parse_response(provider, _create(provider, model, messages, params))
+        ok = True
+        return text
+    finally:
+        limiter.release(cost, sum(usage) if usage else None)
+        _record(provider, model, queued, time.monotonic() - start, usage, ok)
+
+
+async def _ainvoke(provider: str, model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    limiter = _limiters[provider]
+    cost = _estimate_cost(messages, params)
+    queued = await limiter.acquire_async(cost)
+    start = time.monotonic()
+    usage: Optional[Tuple[int, int]] = None
+    ok = False
+    try:
+        text, usage = _parse_response(provider, await _acreate(provider, model, messages, params))
+        ok = True
+        return text
+    finally:
+        limiter.release(cost, sum(usage) if usage else None)
+        _record(provider, model, queued, time.monotonic() - start, usage, ok)
+
+
+def _stream(provider: str, model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> Iterator[str]:
+    limiter = _limiters[provider]
+    cost = _estimate_cost(messages, params)
+    queued = limiter.acquire(cost)
+    start = time.monotonic()
+    usage: Optional[Tuple[int, int]] = None
+    ok = False
+    try:
+        client = get_client(provider)
+        if provider == "openai":
+            chunks = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **params,
+            )
+            for chunk in chunks:
+                if chunk.usage:
+                    usage = (chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        else:
+            with client.messages.stream(**_anthropic_kwargs(model, messages, params)) as resp:
+                yield from resp.text_stream
+                final = resp.get_final_message()
+                usage = (final.usage.input_tokens, final.usage.output_tokens)
+        ok = True
+    finally:
+        limiter.release(cost, sum(usage) if usage else None)
+        _record(provider, model, queued, time.monotonic() - start, usage, ok)
+
+
+def complete(
+    provider: str,
+    model: str,
+    messages: List[Dict[str, Any]],
+    *,
+    max_tokens: int,
+    temperature: float,
+    cache: bool = True,
+) -> str:
+    """
+    One completion through the provider's queue, served from the LLM cache when possible.
+    """
+    _check_provider(provider)
+    params = {"max_tokens": max_tokens, "temperature": temperature}
+    if not cache:
+        return _invoke(provider, model, messages, params)
+    return cached_completion(provider, model, params, messages, lambda: _invoke(provider, model, messages, params))
+
+
+async def acomplete(
+    provider: str,
+    model: str,
+    messages: List[Dict[str, Any]],
+    *,
+    max_tokens: int,
+    temperature: float,
+    cache: bool = True,
+) -> str:
+    """
+    complete() for async callers; waits in the same queue without holding a thread.
+    """
+    _check_provider(provider)
+    params = {"max_tokens": max_tokens, "temperature": temperature}
+    if not cache:
+        return await _ainvoke(provider, model, messages, params)
+    return await acached_completion(
+        provider, model, params, messages, lambda: _ainvoke(provider, model, messages, params)
+    )
+
+
+def stream(
+    provider: str,
+    model: str,
+    messages: List[Dict[str, Any]],
+    *,
+    max_tokens: int,
+    temperature: float,
+) -> Iterator[str]:
+    """
+    Streaming completion. Holds a concurrency slot until the stream ends;
+    shares cache entries with complete().
+    """
+    _check_provider(provider)
+    params = {"max_tokens": max_tokens, "temperature": temperature}
+    return cached_stream(provider, model, params, messages, lambda: _stream(provider, model, messages, params))
+
+
+def get_gateway_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Per-provider call counts, token usage, latency and queue state, plus the
+    most recent calls.
+    """
+    with _stats_lock:
+        out: Dict[str, Dict[str, Any]] = {}
+        for provider, s in _stats.items():
+            limiter = _limiters[provider]
+            out[provider] = {
+                "calls": s.calls,
+                "errors": s.errors,
+                "input_tokens": s.input_tokens,
+                "output_tokens": s.output_tokens,
+                "avg_latency_seconds": round(s.latency_seconds / s.calls, 3) if s.calls else 0.0,
+                "queued_seconds": round(s.queued_seconds, 3),
+                "in_flight": limiter.in_flight,
+                "queued": limiter.queued,
+                "concurrency": limiter.concurrency,
+                "tokens_per_minute": limiter.tokens_per_minute,
+                "recent_calls": list(s.recent)[-20:],
+            }
+        return out
+
+
+def close() -> None:
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+async def aclose() -> None:
+    clients = _async_clients.pop_current() or {}
+    for client in clients.values():
+        await client.close()
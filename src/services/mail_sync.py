@@ -0,0 +1,241 @@
+# src/services/mail_sync.py
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from src.models.user_profile import UserProfile
+from src.services.graph_transport import run_parallel
+from src.services.ms_graph_client import (
+    APP_ONLY_USER_ID,
+    PAGE_SIZE,
+    SELECT_PROJECTIONS,
+    BatchResponse,
+    GraphBatch,
+    _mailbox_base,
+    folder_delta_url,
+    iter_delta_pages,
+)
+from src.services.user_profile_store import update_user_profile
+
+CACHE_DIR = Path(os.getenv("MAIL_CACHE_DIR", "src/data/mail_cache"))
+
+SYNC_FOLDERS = ("Inbox", "SentItems")
+
+# How far back the first (full) sync reaches. Later rounds only fetch changes.
+INITIAL_SYNC_DAYS = int(os.getenv("MAIL_SYNC_INITIAL_DAYS", "7"))
+
+# Cached messages older than this are dropped when the cache is written
+CACHE_RETENTION_DAYS = int(os.getenv("MAIL_CACHE_RETENTION_DAYS", "14"))
+
+_CACHED_FIELDS = SELECT_PROJECTIONS["weekly"]
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _mailbox_lock(key: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _cache_key(profile: Optional[UserProfile]) -> str:
+    if profile is not None:
+        return profile.user_id
+    if not APP_ONLY_USER_ID:
+        raise RuntimeError("MS_GRAPH_USER_ID not set and no user profile provided")
+    return f"app-{APP_ONLY_USER_ID}"
+
+
+def _cache_path(key: str) -> Path:
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in key)
+    return CACHE_DIR / f"{safe}.json"
+
+
+def _load_cache(key: str) -> Dict[str, Any]:
+    path = _cache_path(key)
+    if not path.exists():
+        return {"folders": {}, "delta_links": {}}
+    raw = path.read_text(encoding="utf-8").strip()
+    if not raw:
+        return {"folders": {}, "delta_links": {}}
+    data = json.loads(raw)
+    data.setdefault("folders", {})
+    data.setdefault("delta_links", {})
+    return data
+
+
+def _save_cache(key: str, data: Dict[str, Any]) -> None:
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _cache_path(key)
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _save_delta_links(profile: UserProfile) -> None:
+    links = dict(profile.mail_delta_links)
+
+    def apply(p: UserProfile) -> None:
+        p.mail_delta_links = links
+
+    update_user_profile(profile.user_id, apply)
+
+
+def _message_time(msg: Dict[str, Any]) -> str:
+    return msg.get("receivedDateTime") or msg.get("sentDateTime") or ""
+
+
+def _prune(messages: Dict[str, Dict[str, Any]], cutoff_iso: str) -> None:
+    stale = [mid for mid, m in messages.items() if _message_time(m) < cutoff_iso]
+    for mid in stale:
+        del messages[mid]
+
+
+def _apply_page(messages: Dict[str, Dict[str, Any]], page: Dict[str, Any]) -> None:
+    for item in page.get("value", []):
+        msg_id = item.get("id")
+        if not msg_id:
+            continue
+        if "@removed" in item:
+            messages.pop(msg_id, None)
+            continue
+        record = messages.setdefault(msg_id, {})
+        record.update({k: item[k] for k in _CACHED_FIELDS if k in item})
+
+
+def _drain_delta(
+    first_page: Dict[str, Any],
+    token: str,
+    messages: Dict[str, Dict[str, Any]],
+) -> str:
+    """
+    Apply a delta round starting from an already fetched first page, following
+    nextLinks until Graph hands back the deltaLink for the next round.
+    """
+    _apply_page(messages, first_page)
+    delta_link = first_page.get("@odata.deltaLink", "")
+    next_link = first_page.get("@odata.nextLink")
+    if next_link:
+        for page in iter_delta_pages(next_link, token):
+            _apply_page(messages, page)
+            delta_link = page.get("@odata.deltaLink") or delta_link
+    if not delta_link:
+        raise RuntimeError("Graph delta query ended without a deltaLink")
+    return delta_link
+
+
+def _sync_folder(
+    base: str,
+    token: str,
+    folder: str,
+    first: BatchResponse,
+    full_sync: bool,
+    messages: Dict[str, Dict[str, Any]],
+) -> str:
+    """
+    Finish one folder's delta round, mutating `messages` in place.
+    Returns the deltaLink for the next round.
+    """
+    if first.status == 410 and not full_sync:
+        # The stored sync state expired; start over with a full sync
+        messages.clear()
+        since = datetime.now(timezone.utc) - timedelta(days=INITIAL_SYNC_DAYS)
+        first_page = next(iter_delta_pages(folder_delta_url(base, folder, since), token))
+        return _drain_delta(first_page, token, messages)
+
+    first.raise_for_status()
+    return _drain_delta(first.json(), token, messages)
+
+
+def sync_mailbox(
+    access_token: Optional[str],
+    profile: Optional[UserProfile] = None,
+) -> Dict[str, int]:
+    """
+    Bring the local message cache for a mailbox up to date with Graph delta queries.
+
+    The first page of every folder is requested in one $batch call; folders
+    with more pages continue concurrently. Delegated users keep their
+    deltaLinks on the profile (mail_delta_links); the app-only fallback
+    mailbox keeps them in its cache file.
+    Returns the number of cached messages per folder.
+    """
+    key = _cache_key(profile)
+    base, token = _mailbox_base(access_token)
+
+    with _mailbox_lock(key):
+        cache = _load_cache(key)
+        links: Dict[str, str] = profile.mail_delta_links if profile is not None else cache["delta_links"]
+        folders: Dict[str, Dict[str, Dict[str, Any]]] = cache["folders"]
+
+        since = datetime.now(timezone.utc) - timedelta(days=INITIAL_SYNC_DAYS)
+        batch = GraphBatch(token)
+        full_sync: Dict[str, bool] = {}
+        for folder in SYNC_FOLDERS:
+            # A deltaLink is only usable together with the cache it was built from
+            link = links.get(folder) if folder in folders else None
+            full_sync[folder] = link is None
+            folders.setdefault(folder, {})
+            batch.add(
+                "GET",
+                link or folder_delta_url(base, folder, since),
+                headers={"Prefer": f"odata.maxpagesize={PAGE_SIZE}"},
+                request_id=folder,
+            )
+        first_pages = batch.execute()
+
+        new_links = run_parallel(
+            [
+                lambda f=folder: _sync_folder(base, token, f, first_pages[f], full_sync[f], folders[f])
+                for folder in SYNC_FOLDERS
+            ]
+        )
+
+        cutoff_iso = (datetime.now(timezone.utc) - timedelta(days=CACHE_RETENTION_DAYS)).strftime(
+            "%Y-%m-%dT%H:%M:%SZ"
+        )
+        for folder in SYNC_FOLDERS:
+            _prune(folders[folder], cutoff_iso)
+
+        links.update(dict(zip(SYNC_FOLDERS, new_links)))
+        _save_cache(key, cache)
+        if profile is not None:
+            _save_delta_links(profile)
+
+        return {folder: len(folders[folder]) for folder in SYNC_FOLDERS}
+
+
+def iter_cached_messages(
+    since: datetime,
+    profile: Optional[UserProfile] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield cached Inbox and SentItems messages newer than `since`.
+    """
+    cutoff_iso = since.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    cache = _load_cache(_cache_key(profile))
+    for folder in SYNC_FOLDERS:
+        for msg in cache["folders"].get(folder, {}).values():
+            if _message_time(msg) >= cutoff_iso:
+                yield msg
+
+
+def clear_cache(profile: Optional[UserProfile] = None) -> None:
+    """
+    Drop a mailbox's cache and sync state so the next sync is a full one.
+    """
+    key = _cache_key(profile)
+    with _mailbox_lock(key):
+        path = _cache_path(key)
+        if path.exists():
+            path.unlink()
+        if profile is not None and profile.mail_delta_links:
+            profile.mail_delta_links = {}
+            _save_delta_links(profile)
+
@@ -0,0 +1,121 @@
+# src/services/model_router.py
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from src.services import llm_gateway
+
+# Routes are "provider:model"; a bare model name means Anthropic
+EXTRACT_ROUTE = os.getenv("WEEKLY_EXTRACT_MODEL", "anthropic:claude-3-haiku-20240307")
+SYNTHESIS_ROUTE = os.getenv(
+    "WEEKLY_SYNTHESIS_MODEL",
+    "anthropic:" + os.getenv("CLAUDE_MODEL", "claude-3-5-sonnet-latest"),
+)
+# Used for a tier whose provider has no API key configured, so a deployment
+# with only OPENAI_API_KEY doesn't make failing Anthropic calls on every report
+FALLBACK_ROUTE = os.getenv("WEEKLY_FALLBACK_MODEL", "openai:gpt-4.1-mini")
+# With the cascade off, extraction goes straight to the synthesis model
+CASCADE_ENABLED = os.getenv("WEEKLY_MODEL_CASCADE", "1") == "1"
+
+_BULLET_RE = re.compile(r"^\s*([-*•]|\d+[.)])\s+\S")
+_REFUSAL_RE = re.compile(r"^\s*(i'm sorry|i am sorry|i cannot|i can't|as an ai)", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    provider: str
+    model: str
+
+    @classmethod
+    def parse(cls, route: str) -> "ModelRoute":
+        provider, sep, model = route.partition(":")
+        if not sep:
+            return cls("anthropic", route)
+        return cls(provider, model)
+
+    def __str__(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+
+def route_for(tier: str) -> ModelRoute:
+    route = ModelRoute.parse(EXTRACT_ROUTE if tier == "extract" and CASCADE_ENABLED else SYNTHESIS_ROUTE)
+    if not llm_gateway.has_api_key(route.provider):
+        return ModelRoute.parse(FALLBACK_ROUTE)
+    return route
+
+
+def is_bullet_summary(text: str, max_items: int = 12) -> bool:
+    """
+    Structural check for extraction output: a non-empty bullet list, mostly
+    bullets, not a refusal and not runaway length.
+    """
+    lines = [line for line in (text or "").splitlines() if line.strip()]
+    if not lines or _REFUSAL_RE.match(lines[0]):
+        return False
+    bullets = sum(1 for line in lines if _BULLET_RE.match(line))
+    return 1 <= bullets <= max_items and bullets * 2 >= len(lines)
+
+
+@dataclass
+class Extraction:
+    text: str
+    route: str
+    escalated: bool
+
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {"extractions": 0, "escalated_check": 0, "escalated_error": 0}
+
+
+def _bump(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def complete(tier: str, messages: List[Dict[str, Any]], *, max_tokens: int, temperature: float = 0.0) -> str:
+    route = route_for(tier)
+    return llm_gateway.complete(
+        route.provider, route.model, messages, max_tokens=max_tokens, temperature=temperature
+    )
+
+
+def extract(
+    messages: List[Dict[str, Any]],
+    *,
+    max_tokens: int,
+    check: Callable[[str], bool] = is_bullet_summary,
+    temperature: float = 0.0,
+) -> Extraction:
+    """
+    Run an extraction on the small model; escalate to the synthesis model
+    when the call fails or its output doesn't pass `check`.
+    """
+    _bump("extractions")
+    small, large = route_for("extract"), route_for("synthesize")
+    text: Optional[str] = None
+    try:
+        text = complete("extract", messages, max_tokens=max_tokens, temperature=temperature)
+    except Exception:
+        if small == large:
+            raise
+        _bump("escalated_error")
+    else:
+        if check(text) or small == large:
+            return Extraction(text, str(small), False)
+        _bump("escalated_check")
+
+    text = complete("synthesize", messages, max_tokens=max_tokens, temperature=temperature)
+    return Extraction(text, str(large), True)
+
+
+def get_cascade_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats: Dict[str, Any] = dict(_stats)
+    stats["extract_route"] = str(route_for("extract"))
+    stats["synthesis_route"] = str(route_for("synthesize"))
+    return stats
@@ -3,10 +3,15 @@
 from __future__ import annotations
 
 import os
-from typing import List, Dict, Any, Optional
+import time
+import urllib.parse
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Tuple, Union
 
-import msal
-import requests
+from src.services.token_provider import app_token_provider
+from src.services import graph_throttle
+from src.services.graph_transport import GRAPH_URL, graph_request, run_parallel
 
 TENANT_ID = os.getenv("MS_TENANT_ID")
 CLIENT_ID = os.getenv("MS_CLIENT_ID")
@@ -15,9 +20,34 @@ CLIENT_SECRET = os.getenv("MS_CLIENT_SECRET")
 # App-only fallback user (your older single-mailbox setup)
 APP_ONLY_USER_ID = os.getenv("MS_GRAPH_USER_ID")
 
-AUTHORITY = f"https://login.microsoftonline.com/{TENANT_ID}" if TENANT_ID else ""
 SCOPE = ["https://graph.microsoft.com/.default"]
-GRAPH_URL = "https://graph.microsoft.com/v1.0"
+
+# $select projections per use case. Only ask Graph for the fields a caller reads.
+SELECT_PROJECTIONS: Dict[str, Tuple[str, ...]] = {
+    "weekly": (
+        "id",
+        "conversationId",
+        "subject",
+        "bodyPreview",
+        "from",
+        "toRecipients",
+        "ccRecipients",
+        "receivedDateTime",
+        "sentDateTime",
+    ),
+    "sample": ("id", "subject", "bodyPreview", "from", "receivedDateTime"),
+}
+
+# The date field each folder is filtered and ordered on
+FOLDER_DATE_FIELDS: Dict[str, str] = {
+    "Inbox": "receivedDateTime",
+    "SentItems": "sentDateTime",
+}
+
+PAGE_SIZE = int(os.getenv("GRAPH_PAGE_SIZE", "50"))
+
+# Graph rejects JSON batches with more than 20 sub-requests
+BATCH_LIMIT = 20
 
 
 def _get_app_only_access_token() -> str:
@@ -27,36 +57,394 @@ def _get_app_only_access_token() -> str:
     if not all([TENANT_ID, CLIENT_ID, CLIENT_SECRET]):
         raise RuntimeError("Missing one or more MS_* environment variables for app-only token")
 
-    app = msal.ConfidentialClientApplication(
-        CLIENT_ID,
-        authority=AUTHORITY,
-        client_credential=CLIENT_SECRET,
-    )
-    result = app.acquire_token_for_client(scopes=SCOPE)
-    if "access_token" not in result:
-        raise RuntimeError(f"Failed to acquire app token: {result}")
-    return result["access_token"]
+    # Cached process-wide and refreshed ahead of expiry, so this is usually free
+    return app_token_provider.get_token(TENANT_ID, CLIENT_ID, CLIENT_SECRET, SCOPE)
+
+
+def warm_app_only_token() -> None:
+    """
+    Fetch the app-only token up front when the fallback mailbox is configured,
+    so the first fallback-mode request doesn't pay for it.
+    """
+    if APP_ONLY_USER_ID and all([TENANT_ID, CLIENT_ID, CLIENT_SECRET]):
+        _get_app_only_access_token()
 
 
-def _graph_get(url: str, access_token: str) -> Dict[str, Any]:
-    headers = {"Authorization": f"Bearer {access_token}"}
-    resp = requests.get(url, headers=headers, timeout=30)
+def _graph_get(
+    url: str,
+    access_token: str,
+    headers: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    resp = graph_request("GET", url, access_token, headers=headers)
     resp.raise_for_status()
     return resp.json()
 
 
 def _graph_post(url: str, access_token: str, json_body: Dict[str, Any]) -> Dict[str, Any]:
-    headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
-    resp = requests.post(url, headers=headers, json=json_body, timeout=30)
+    resp = graph_request("POST", url, access_token, json_body=json_body)
     if resp.status_code >= 400:
         raise RuntimeError(f"Graph POST failed ({resp.status_code}): {resp.text}")
     return resp.json() if resp.text else {"ok": True}
 
 
+class GraphBatchError(RuntimeError):
+    pass
+
+
+@dataclass
+class BatchResponse:
+    id: str
+    status: int
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: Any = None
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def json(self) -> Dict[str, Any]:
+        return self.body if isinstance(self.body, dict) else {}
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise GraphBatchError(f"Graph batch request {self.id} failed ({self.status}): {self.body}")
+
+
+class GraphBatch:
+    """
+    Collects Graph sub-requests and sends them as JSON $batch calls.
+
+    Requests linked with depends_on are kept in the same batch (Graph requires
+    that) and run in order; independent groups are packed up to BATCH_LIMIT per
+    call and the calls run concurrently. execute() maps every sub-response back
+    to the id returned by add().
+    """
+
+    def __init__(self, access_token: str):
+        self.access_token = access_token
+        self._requests: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def add(
+        self,
+        method: str,
+        url: str,
+        body: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        depends_on: Optional[Sequence[str]] = None,
+        request_id: Optional[str] = None,
+    ) -> str:
+        req_id = request_id or str(len(self._requests) + 1)
+        if req_id in self._requests:
+            raise ValueError(f"Duplicate batch request id: {req_id}")
+
+        req: Dict[str, Any] = {"id": req_id, "method": method.upper(), "url": _batch_url(url)}
+        req_headers = dict(headers or {})
+        if body is not None:
+            req["body"] = body
+            req_headers.setdefault("Content-Type", "application/json")
+        if req_headers:
+            req["headers"] = req_headers
+        if depends_on:
+            missing = [d for d in depends_on if d not in self._requests]
+            if missing:
+                raise ValueError(f"Batch request {req_id} depends on unknown ids: {missing}")
+            req["dependsOn"] = list(depends_on)
+
+        self._requests[req_id] = req
+        return req_id
+
+    @staticmethod
+    def _chunks(requests: Dict[str, Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        # Group requests connected through dependsOn, preserving insertion order
+        group_of: Dict[str, int] = {}
+        groups: List[List[Dict[str, Any]]] = []
+        for req_id, req in requests.items():
+            linked = sorted({group_of[d] for d in req.get("dependsOn", [])})
+            if not linked:
+                group_of[req_id] = len(groups)
+                groups.append([req])
+                continue
+            target = linked[0]
+            for other in linked[1:]:
+                for moved in groups[other]:
+                    group_of[moved["id"]] = target
+                groups[target].extend(groups[other])
+                groups[other] = []
+            group_of[req_id] = target
+            groups[target].append(req)
+
+        chunks: List[List[Dict[str, Any]]] = []
+        for group in groups:
+            if not group:
+                continue
+            if len(group) > BATCH_LIMIT:
+                raise ValueError(
+                    f"A dependsOn chain of {len(group)} requests exceeds the batch limit of {BATCH_LIMIT}"
+                )
+            if chunks and len(chunks[-1]) + len(group) <= BATCH_LIMIT:
+                chunks[-1].extend(group)
+            else:
+                chunks.append(list(group))
+        return chunks
+
+    def _send(self, chunk: List[Dict[str, Any]]) -> List[BatchResponse]:
+        payload = _graph_post(f"{GRAPH_URL}/$batch", self.access_token, {"requests": chunk})
+        return [
+            BatchResponse(
+                id=str(r.get("id")),
+                status=int(r.get("status", 0)),
+                headers=r.get("headers") or {},
+                body=r.get("body"),
+            )
+            for r in payload.get("responses", [])
+        ]
+
+    @staticmethod
+    def _to_retry(
+        requests: Dict[str, Dict[str, Any]],
+        results: Dict[str, BatchResponse],
+    ) -> List[str]:
+        """
+        Throttled sub-requests, plus anything that failed only because one of
+        them was a dependency.
+        """
+        retry: List[str] = []
+        for req_id, req in requests.items():
+            status = results[req_id].status if req_id in results else 0
+            if graph_throttle.should_retry(req["method"], status):
+                retry.append(req_id)
+            elif status == 424 and any(d in retry for d in req.get("dependsOn", [])):
+                retry.append(req_id)
+        return retry
+
+    def execute(self) -> Dict[str, BatchResponse]:
+        """
+        Send all queued requests and return {request id: BatchResponse}.
+
+        Sub-request failures are returned, not raised; a failed dependency
+        shows up as 424 on the requests that depended on it. Throttled
+        sub-requests are resent after their Retry-After.
+        """
+        results: Dict[str, BatchResponse] = {}
+        pending = dict(self._requests)
+        attempt = 0
+        while pending:
+            chunks = self._chunks(pending)
+            for responses in run_parallel([lambda c=c: self._send(c) for c in chunks]):
+                for r in responses:
+                    results[r.id] = r
+
+            retry = self._to_retry(pending, results)
+            if not retry or attempt >= graph_throttle.MAX_RETRIES:
+                break
+
+            delay = max(
+                graph_throttle.backoff_seconds(attempt, graph_throttle.retry_after_seconds(results[i].headers))
+                for i in retry
+            )
+            graph_throttle.record(
+                graph_throttle.tenant_of(self.access_token),
+                retries=len(retry),
+                throttled=len(retry),
+                throttled_seconds=delay,
+            )
+            time.sleep(delay)
+
+            # Dependencies that already succeeded are not resent, so drop them from dependsOn
+            resend: Dict[str, Dict[str, Any]] = {}
+            for req_id in retry:
+                req = dict(pending[req_id])
+                deps = [d for d in req.pop("dependsOn", []) if d in retry]
+                if deps:
+                    req["dependsOn"] = deps
+                resend[req_id] = req
+            pending = resend
+            attempt += 1
+
+        for req_id in self._requests:
+            if req_id not in results:
+                results[req_id] = BatchResponse(id=req_id, status=0, body={"error": "missing from batch response"})
+        self._requests = {}
+        return results
+
+
+def _batch_url(url: str) -> str:
+    """
+    Batch sub-request urls are relative to the Graph version root.
+    """
+    if url.startswith(GRAPH_URL):
+        url = url[len(GRAPH_URL):]
+    elif url.startswith("http"):
+        parsed = urllib.parse.urlsplit(url)
+        path = parsed.path
+        for version in ("/v1.0", "/beta"):
+            if path.startswith(version):
+                path = path[len(version):]
+                break
+        url = path + (f"?{parsed.query}" if parsed.query else "")
+    return url if url.startswith("/") else f"/{url}"
+
+
+def graph_get_batch(urls: Sequence[str], access_token: str) -> List[Dict[str, Any]]:
+    """
+    GET several Graph urls in one $batch round trip and return bodies in input order.
+    Raises GraphBatchError if any of them failed.
+    """
+    if len(urls) == 1:
+        return [_graph_get(urls[0], access_token)]
+    batch = GraphBatch(access_token)
+    ids = [batch.add("GET", u) for u in urls]
+    results = batch.execute()
+    pages: List[Dict[str, Any]] = []
+    for req_id in ids:
+        results[req_id].raise_for_status()
+        pages.append(results[req_id].json())
+    return pages
+
+
+def get_throttle_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Per-tenant Graph retry/throttling counters (retries, time spent throttled,
+    current adaptive concurrency limit).
+    """
+    return graph_throttle.get_throttle_stats()
+
+
 def get_me(access_token: str) -> Dict[str, Any]:
     return _graph_get(f"{GRAPH_URL}/me", access_token)
 
 
+def _mailbox_base(access_token: Optional[str]) -> Tuple[str, str]:
+    """
+    Resolve (mailbox base url, bearer token) for delegated or app-only mode.
+    """
+    if access_token:
+        return f"{GRAPH_URL}/me", access_token
+    if not APP_ONLY_USER_ID:
+        raise RuntimeError("MS_GRAPH_USER_ID not set and no delegated access_token provided")
+    return f"{GRAPH_URL}/users/{APP_ONLY_USER_ID}", _get_app_only_access_token()
+
+
+def _select_fields(select: Union[str, Sequence[str]]) -> str:
+    if isinstance(select, str):
+        fields = SELECT_PROJECTIONS.get(select)
+        if fields is None:
+            raise ValueError(f"Unknown $select projection: {select}")
+        return ",".join(fields)
+    return ",".join(select)
+
+
+def _graph_datetime(dt: datetime) -> str:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _folder_messages_url(
+    base: str,
+    folder: str,
+    since: Optional[datetime],
+    select: Union[str, Sequence[str]],
+    page_size: int,
+) -> str:
+    date_field = FOLDER_DATE_FIELDS.get(folder, "receivedDateTime")
+    params = {
+        "$top": str(page_size),
+        "$orderby": f"{date_field} desc",
+        "$select": _select_fields(select),
+    }
+    if since is not None:
+        # Graph requires the $filter property to lead the $orderby clause
+        params["$filter"] = f"{date_field} ge {_graph_datetime(since)}"
+    query = urllib.parse.urlencode(params, quote_via=urllib.parse.quote, safe="$,:")
+    return f"{base}/mailFolders/{folder}/messages?{query}"
+
+
+def _iter_pages(first_page: Dict[str, Any], access_token: str) -> Iterator[Dict[str, Any]]:
+    """
+    Yield messages from a Graph collection page, following @odata.nextLink lazily.
+    Only one page is held in memory at a time.
+    """
+    page: Optional[Dict[str, Any]] = first_page
+    while page is not None:
+        yield from page.get("value", [])
+        next_link = page.get("@odata.nextLink")
+        page = _graph_get(next_link, access_token) if next_link else None
+
+
+def iter_folder_messages(
+    folder: str,
+    since: Optional[datetime] = None,
+    access_token: Optional[str] = None,
+    select: Union[str, Sequence[str]] = "weekly",
+    page_size: int = PAGE_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream messages from one mail folder, newest first.
+    The date cutoff is applied server-side with $filter.
+    """
+    base, token = _mailbox_base(access_token)
+    url = _folder_messages_url(base, folder, since, select, page_size)
+    yield from _iter_pages(_graph_get(url, token), token)
+
+
+def iter_inbox_and_sent_since(
+    since: datetime,
+    access_token: Optional[str] = None,
+    select: Union[str, Sequence[str]] = "weekly",
+    page_size: int = PAGE_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream Inbox then SentItems messages newer than `since`.
+    The first page of each folder comes back in a single $batch call; later
+    pages are requested only as the caller consumes the generator.
+    """
+    base, token = _mailbox_base(access_token)
+    urls = [
+        _folder_messages_url(base, folder, since, select, page_size)
+        for folder in ("Inbox", "SentItems")
+    ]
+    for first_page in graph_get_batch(urls, token):
+        yield from _iter_pages(first_page, token)
+
+
+def folder_delta_url(
+    base: str,
+    folder: str,
+    since: Optional[datetime],
+    select: Union[str, Sequence[str]] = "weekly",
+) -> str:
+    """
+    Initial delta query for a mail folder. Graph only supports a
+    receivedDateTime lower bound as a delta $filter.
+    """
+    params = {"$select": _select_fields(select)}
+    if since is not None:
+        params["$filter"] = f"receivedDateTime ge {_graph_datetime(since)}"
+    query = urllib.parse.urlencode(params, quote_via=urllib.parse.quote, safe="$,:")
+    return f"{base}/mailFolders/{folder}/messages/delta?{query}"
+
+
+def iter_delta_pages(
+    url: str,
+    access_token: str,
+    page_size: int = PAGE_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield raw delta pages starting at `url` (an initial delta query or a stored
+    deltaLink). The last page carries @odata.deltaLink for the next round.
+    """
+    headers = {"Prefer": f"odata.maxpagesize={page_size}"}
+    next_url: Optional[str] = url
+    while next_url:
+        page = _graph_get(next_url, access_token, headers=headers)
+        yield page
+        next_url = page.get("@odata.nextLink")
+
+
 def get_recent_inbox_and_sent_emails(
     top: int = 200,
     access_token: Optional[str] = None,
@@ -65,30 +453,26 @@ def get_recent_inbox_and_sent_emails(
     If access_token is provided, uses delegated /me access (multi-user SaaS).
     Otherwise falls back to app-only mode using /users/{APP_ONLY_USER_ID}.
     """
-    if access_token:
-        base = f"{GRAPH_URL}/me"
-        token = access_token
-    else:
-        if not APP_ONLY_USER_ID:
-            raise RuntimeError("MS_GRAPH_USER_ID not set and no delegated access_token provided")
-        base = f"{GRAPH_URL}/users/{APP_ONLY_USER_ID}"
-        token = _get_app_only_access_token()
+    base, token = _mailbox_base(access_token)
 
     # Pull from Inbox and SentItems
-    inbox_url = (
-        f"{base}/mailFolders/Inbox/messages"
-        f"?$top={top}&$orderby=receivedDateTime desc"
-        f"&$select=subject,bodyPreview,from,toRecipients,ccRecipients,receivedDateTime,sentDateTime,conversationId,id"
-    )
-    sent_url = (
-        f"{base}/mailFolders/SentItems/messages"
-        f"?$top={top}&$orderby=sentDateTime desc"
-        f"&$select=subject,bodyPreview,from,toRecipients,ccRecipients,receivedDateTime,sentDateTime,conversationId,id"
-    )
-
-    inbox = _graph_get(inbox_url, token).get("value", [])
-    sent = _graph_get(sent_url, token).get("value", [])
-    return inbox + sent
+    inbox_url = _folder_messages_url(base, "Inbox", None, "weekly", top)
+    sent_url = _folder_messages_url(base, "SentItems", None, "weekly", top)
+
+    # Both folders in one $batch round trip
+    inbox_page, sent_page = graph_get_batch([inbox_url, sent_url], token)
+    return inbox_page.get("value", []) + sent_page.get("value", [])
+
+
+def _mail_payload(subject: str, body_text: str, to_addresses: List[str]) -> Dict[str, Any]:
+    return {
+        "message": {
+            "subject": subject,
+            "body": {"contentType": "Text", "content": body_text},
+            "toRecipients": [{"emailAddress": {"address": a}} for a in to_addresses],
+        },
+        "saveToSentItems": True,
+    }
 
 
 def send_email(
@@ -96,29 +480,29 @@ def send_email(
     body_text: str,
     to_addresses: List[str],
     access_token: Optional[str] = None,
+    individually: bool = False,
 ) -> Dict[str, Any]:
     """
     If access_token is provided, sends from /me (multi-user).
     Otherwise sends from the app-only user mailbox (older mode).
+
+    With individually=True every recipient gets their own copy; the sends are
+    packed into $batch calls instead of one round trip per recipient.
     """
-    if access_token:
-        url = f"{GRAPH_URL}/me/sendMail"
-        token = access_token
-    else:
-        if not APP_ONLY_USER_ID:
-            raise RuntimeError("MS_GRAPH_USER_ID not set and no delegated access_token provided")
-        url = f"{GRAPH_URL}/users/{APP_ONLY_USER_ID}/sendMail"
-        token = _get_app_only_access_token()
-
-    payload = {
-        "message": {
-            "subject": subject,
-            "body": {"contentType": "Text", "content": body_text},
-            "toRecipients": [{"emailAddress": {"address": a}} for a in to_addresses],
-        },
-        "saveToSentItems": True,
-    }
-    return _graph_post(url, token, payload)
+    base, token = _mailbox_base(access_token)
+    url = f"{base}/sendMail"
+
+    if not individually or len(to_addresses) <= 1:
+        return _graph_post(url, token, _mail_payload(subject, body_text, to_addresses))
+
+    batch = GraphBatch(token)
+    ids = {batch.add("POST", url, body=_mail_payload(subject, body_text, [a])): a for a in to_addresses}
+    results = batch.execute()
+    failed = {ids[i]: r.status for i, r in results.items() if not r.ok}
+    if failed:
+        raise RuntimeError(f"Graph sendMail failed for some recipients: {failed}")
+    return {"ok": True, "sent": len(ids)}
+
 
 def get_recent_emails(top: int = 200):
     """
@@ -6,7 +6,7 @@ import os
 import urllib.parse
 from typing import Dict, Any
 
-import requests
+from src.services.graph_transport import get_session
 
 MS_CLIENT_ID = os.getenv("MS_CLIENT_ID", "")
 MS_TENANT_ID = os.getenv("MS_TENANT_ID", "common")
@@ -41,7 +41,7 @@ def exchange_code_for_tokens(code: str) -> Dict[str, Any]:
         "redirect_uri": MS_REDIRECT_URI,
         "scope": MS_SCOPES,
     }
-    resp = requests.post(token_url, data=data, timeout=30)
+    resp = get_session().post(token_url, data=data, timeout=30)
     resp.raise_for_status()
     return resp.json()
 
@@ -56,6 +56,6 @@ def refresh_access_token(refresh_token: str) -> Dict[str, Any]:
         "redirect_uri": MS_REDIRECT_URI,
         "scope": MS_SCOPES,
     }
-    resp = requests.post(token_url, data=data, timeout=30)
+    resp = get_session().post(token_url, data=data, timeout=30)
     resp.raise_for_status()
     return resp.json()
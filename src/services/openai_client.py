@@ -1,17 +1,17 @@
 # src/services/openai_client.py
 
-import os
-from typing import Optional
+from typing import Iterator
 
-from openai import OpenAI
+from src.services import llm_gateway
 
-_api_key = os.getenv("OPENAI_API_KEY")
-if not _api_key:
-    raise RuntimeError(
-        "OPENAI_API_KEY is not set. Add it to your .env file before running the app."
-    )
+_SUMMARY_PARAMS = {"temperature": 0.0, "max_tokens": 800}
 
-_client = OpenAI(api_key=_api_key)
+
+def _summary_messages(prompt: str, content: str) -> list:
+    return [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": content},
+    ]
 
 
 def summarize_text(*, prompt: str, content: str, model: str = "gpt-4.1-mini") -> str:
@@ -21,16 +21,21 @@ def summarize_text(*, prompt: str, content: str, model: str = "gpt-4.1-mini") ->
     prompt - system style instructions
     content - the combined raw text you want summarized
     """
-    messages = [
-        {"role": "system", "content": prompt},
-        {"role": "user", "content": content},
-    ]
+    messages = _summary_messages(prompt, content)
+    return llm_gateway.complete("openai", model, messages, **_SUMMARY_PARAMS).strip()
 
-    response = _client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=0.2,
-        max_tokens=800,
-    )
 
-    return response.choices[0].message.content.strip()
+async def asummarize_text(*, prompt: str, content: str, model: str = "gpt-4.1-mini") -> str:
+    """
+    summarize_text for async endpoints.
+    """
+    messages = _summary_messages(prompt, content)
+    return (await llm_gateway.acomplete("openai", model, messages, **_SUMMARY_PARAMS)).strip()
+
+
+def stream_summary_text(*, prompt: str, content: str, model: str = "gpt-4.1-mini") -> Iterator[str]:
+    """
+    Same request as summarize_text, yielding text chunks as OpenAI produces them.
+    """
+    messages = _summary_messages(prompt, content)
+    return llm_gateway.stream("openai", model, messages, **_SUMMARY_PARAMS)
@@ -0,0 +1,265 @@
+# src/services/prompt_packer.py
+
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+from src.models.mail_message import Conversation, MailMessage
+
+T = TypeVar("T")
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# Relevance weights for weekly-report conversations
+WEIGHTS: Dict[str, float] = {
+    "unanswered": 3.0,      # last message is someone else's; the user may owe a reply
+    "sent_by_user": 2.0,    # the user took part, so it matters to them
+    "external": 1.5,        # outside the user's own domain (clients, subs, vendors)
+    "recency": 2.0,         # scaled by how recent the last message is
+    "volume": 0.5,          # scaled by log(message count)
+    "bulk": -4.0,           # newsletters, notifications, no-reply senders
+}
+
+# Recency weight halves every this many hours
+RECENCY_HALF_LIFE_HOURS = 48.0
+
+_BULK_LOCALPART_RE = re.compile(
+    r"^(no-?reply|do-?not-?reply|notifications?|newsletter|news|mailer-daemon|alerts?|updates?|marketing|info)\b",
+    re.IGNORECASE,
+)
+_BULK_SUBJECT_RE = re.compile(r"\b(unsubscribe|newsletter|digest|webinar|% off|promotion)\b", re.IGNORECASE)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Local token estimate, no tokenizer download or API call.
+    Takes the larger of a word/punctuation count and chars/4, which tracks
+    BPE tokenizers closely enough for budgeting.
+    """
+    if not text:
+        return 0
+    return max(len(_WORD_RE.findall(text)), math.ceil(len(text) / 4))
+
+
+def _domain(address: str) -> str:
+    return address.rsplit("@", 1)[-1] if "@" in address else ""
+
+
+def is_bulk_message(msg: MailMessage) -> bool:
+    """
+    Newsletters, notifications and no-reply senders.
+    """
+    return bool(
+        _BULK_LOCALPART_RE.match(msg.sender.split("@", 1)[0])
+        or _BULK_SUBJECT_RE.search(msg.subject)
+    )
+
+
+@dataclass
+class ConversationSignals:
+    sent_by_user: bool = False
+    unanswered: bool = False
+    external: bool = False
+    bulk: bool = False
+    hours_since_last: float = 0.0
+    message_count: int = 0
+
+    def tags(self) -> List[str]:
+        tags: List[str] = []
+        if self.unanswered:
+            tags.append("awaiting reply")
+        if self.external:
+            tags.append("external")
+        if self.bulk:
+            tags.append("automated")
+        return tags
+
+
+def conversation_signals(
+    owner_email: str,
+    conv: Conversation,
+    now: Optional[float] = None,
+) -> ConversationSignals:
+    owner = (owner_email or "").lower()
+    owner_domain = _domain(owner)
+    msgs = conv.messages
+    now = time.time() if now is None else now
+
+    last = msgs[-1] if msgs else None
+    last_sender = last.sender if last else ""
+
+    bulk = bool(msgs) and all(is_bulk_message(m) for m in msgs)
+    return ConversationSignals(
+        sent_by_user=any(m.sender == owner for m in msgs),
+        unanswered=bool(last_sender) and last_sender != owner and not bulk,
+        external=any(m.sender and _domain(m.sender) != owner_domain for m in msgs),
+        bulk=bulk,
+        hours_since_last=max(0.0, (now - last.sent_at) / 3600) if last and last.sent_at else 24 * 7,
+        message_count=len(msgs),
+    )
+
+
+def score_conversation(signals: ConversationSignals) -> float:
+    score = 0.0
+    if signals.unanswered:
+        score += WEIGHTS["unanswered"]
+    if signals.sent_by_user:
+        score += WEIGHTS["sent_by_user"]
+    if signals.external:
+        score += WEIGHTS["external"]
+    if signals.bulk:
+        score += WEIGHTS["bulk"]
+    score += WEIGHTS["recency"] * 0.5 ** (signals.hours_since_last / RECENCY_HALF_LIFE_HOURS)
+    score += WEIGHTS["volume"] * math.log1p(signals.message_count)
+    return score
+
+
+def rank_conversations(
+    owner_email: str,
+    conversations: Sequence[Conversation],
+) -> List[Tuple[Conversation, ConversationSignals]]:
+    """
+    Conversations with their signals, most useful first.
+    """
+    now = time.time()
+    scored = []
+    for conv in conversations:
+        signals = conversation_signals(owner_email, conv, now)
+        scored.append((score_conversation(signals), conv, signals))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [(conv, signals) for _, conv, signals in scored]
+
+
+def pack(
+    items: Iterable[T],
+    render: Callable[[T], str],
+    budget_tokens: int,
+) -> Tuple[List[Tuple[T, str]], int]:
+    """
+    Greedily keep items (in the given priority order) whose rendered text fits
+    the remaining budget. An item that doesn't fit is skipped, not truncated,
+    so a smaller one further down can still use the space.
+    Returns ([(item, text)], tokens used).
+    """
+    packed: List[Tuple[T, str]] = []
+    used = 0
+    for item in items:
+        if used >= budget_tokens:
+            break
+        text = render(item)
+        cost = count_tokens(text)
+        if used + cost <= budget_tokens:
+            packed.append((item, text))
+            used += cost
+    return packed, used
+
+
+def latest_within_budget(
+    items: Sequence[T],
+    render: Callable[[T], str],
+    budget_tokens: int,
+    max_items: int,
+) -> List[T]:
+    """
+    The newest items (from the end of a chronological list) that fit the
+    budget, returned in chronological order. Always keeps at least the newest one.
+    """
+    chosen: List[T] = []
+    used = 0
+    for item in reversed(items):
+        if len(chosen) >= max_items:
+            break
+        cost = count_tokens(render(item))
+        if chosen and used + cost > budget_tokens:
+            break
+        chosen.append(item)
+        used += cost
+    chosen.reverse()
+    return chosen
+
+
+def _check_budget(budget_tokens: int) -> None:
+    # Splitting toward a budget below one token would never finish
+    if budget_tokens < 1:
+        raise ValueError(f"budget_tokens must be at least 1, got {budget_tokens}")
+
+
+def _split_oversized(text: str, budget_tokens: int) -> List[str]:
+    """
+    Hard split of a single paragraph that is over budget, at whitespace.
+    """
+    _check_budget(budget_tokens)
+    pieces: List[str] = []
+    rest = text.strip()
+    while rest:
+        if count_tokens(rest) <= budget_tokens:
+            pieces.append(rest)
+            break
+        cut = budget_tokens * 4
+        while cut > 1 and count_tokens(rest[:cut]) > budget_tokens:
+            cut //= 2
+        space = rest.rfind(" ", 0, cut)
+        if space > cut // 2:
+            cut = space
+        pieces.append(rest[:cut].strip())
+        rest = rest[cut:].strip()
+    return pieces
+
+
+def truncate_to_budget(text: str, budget_tokens: int) -> str:
+    """
+    Leading part of `text` that fits `budget_tokens`, cut at whitespace.
+    """
+    pieces = _split_oversized(text, budget_tokens)
+    return pieces[0] if pieces else ""
+
+
+def _split_document(text: str, budget_tokens: int) -> List[str]:
+    """
+    Pieces of one document, each within budget: the whole document if it
+    fits, otherwise runs of whole paragraphs.
+    """
+    if count_tokens(text) <= budget_tokens:
+        return [text]
+    paragraphs: List[str] = []
+    for para in re.split(r"\n\s*\n", text):
+        if not para.strip():
+            continue
+        if count_tokens(para) > budget_tokens:
+            paragraphs.extend(_split_oversized(para, budget_tokens))
+        else:
+            paragraphs.append(para)
+    return chunk_documents(paragraphs, budget_tokens, separator="\n\n")
+
+
+def chunk_documents(
+    documents: Sequence[str],
+    budget_tokens: int,
+    separator: str = "\n\n\n---\n\n\n",
+) -> List[str]:
+    """
+    Pack documents, in order, into as few chunks as fit `budget_tokens`
+    each. Chunks break between documents where possible; a document that is
+    over budget on its own is split between paragraphs (and a paragraph
+    over budget between words). Raises ValueError for a budget below 1.
+    """
+    _check_budget(budget_tokens)
+    sep_cost = count_tokens(separator)
+    chunks: List[str] = []
+    current: List[str] = []
+    used = 0
+    for doc in documents:
+        for piece in _split_document(doc, budget_tokens):
+            cost = count_tokens(piece)
+            if current and used + sep_cost + cost > budget_tokens:
+                chunks.append(separator.join(current))
+                current, used = [], 0
+            used += cost + (sep_cost if current else 0)
+            current.append(piece)
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
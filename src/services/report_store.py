@@ -0,0 +1,138 @@
+# src/services/report_store.py
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+REPORT_STORE_DIR = Path(os.getenv("WEEKLY_REPORT_STORE_DIR", "src/data/reports/weekly_ai"))
+
+# An artifact younger than this is sent as is by /weekly/email-report
+REPORT_FRESH_SECONDS = int(os.getenv("WEEKLY_REPORT_FRESH_SECONDS", "900"))
+
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_.-]")
+_VERSION_RE = re.compile(r"^(\d{4}-W\d{2})\.[A-Za-z0-9_.-]+$")
+_WEEK_RE = re.compile(r"^\d{4}-W\d{2}$")
+
+
+def _user_dir(user_id: str) -> Path:
+    return REPORT_STORE_DIR / _UNSAFE_RE.sub("_", user_id or "unknown")
+
+
+def _check_week(week: str) -> str:
+    # Weeks become path segments; anything else could walk out of the user's folder
+    if not _WEEK_RE.match(week):
+        raise ValueError(f"week must look like 2026-W42, got {week!r}")
+    return week
+
+
+def _write_json(path: Path, data: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A temp file per write: concurrent saves of the same latest.json each
+    # replace it whole instead of sharing one temp file
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps(data, indent=2))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _read_json(path: Path) -> Optional[Dict[str, Any]]:
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def week_of(generated_at: str) -> str:
+    """
+    ISO week key ("2026-W42") for a report timestamp.
+    """
+    year, week, _ = datetime.fromisoformat(generated_at).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def new_version_id(generated_at: str, fingerprint: str) -> str:
+    stamp = _UNSAFE_RE.sub("", generated_at.replace(":", "").replace("-", ""))
+    return f"{week_of(generated_at)}.{stamp}.{fingerprint[:8]}"
+
+
+def report_age_seconds(report: Dict[str, Any]) -> float:
+    generated = datetime.fromisoformat(report["generated_at"])
+    return (datetime.utcnow() - generated).total_seconds()
+
+
+def save_report(report: Dict[str, Any]) -> str:
+    """
+    Persist a finished weekly AI report as an immutable version under its
+    user and week, and mark it latest for both. `report` must carry
+    generated_at; version_id and week are filled in when missing.
+    Returns the artifact's path.
+    """
+    report.setdefault("week", week_of(report["generated_at"]))
+    report.setdefault("version_id", new_version_id(report["generated_at"], report.get("input_fingerprint", "")))
+
+    user_dir = _user_dir(report.get("user_id", ""))
+    path = user_dir / report["week"] / f"{report['version_id']}.json"
+    report["report_path"] = str(path)
+    _write_json(path, report)
+    _write_json(user_dir / report["week"] / "latest.json", report)
+    _write_json(user_dir / "latest.json", report)
+    return str(path)
+
+
+def load_report(user_id: str, version_id: str) -> Optional[Dict[str, Any]]:
+    m = _VERSION_RE.match(version_id or "")
+    if not m:
+        return None
+    return _read_json(_user_dir(user_id) / m.group(1) / f"{version_id}.json")
+
+
+def load_latest_report(user_id: str, week: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    The user's newest report, or the newest one for `week`. Raises
+    ValueError for a malformed week.
+    """
+    user_dir = _user_dir(user_id)
+    return _read_json(user_dir / _check_week(week) / "latest.json" if week else user_dir / "latest.json")
+
+
+def list_reports(user_id: str, week: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Version metadata (no report text), newest first. Raises ValueError for
+    a malformed week.
+    """
+    user_dir = _user_dir(user_id)
+    if week:
+        weeks = [user_dir / _check_week(week)]
+    else:
+        weeks = [p for p in user_dir.glob("*-W*") if p.is_dir() and _WEEK_RE.match(p.name)]
+    out: List[Dict[str, Any]] = []
+    for week_dir in weeks:
+        for path in week_dir.glob("*.json"):
+            if path.name == "latest.json":
+                continue
+            report = _read_json(path)
+            if report:
+                out.append(
+                    {
+                        "version_id": report.get("version_id"),
+                        "week": report.get("week"),
+                        "generated_at": report.get("generated_at"),
+                        "input_fingerprint": report.get("input_fingerprint"),
+                        "conversation_count": report.get("conversation_count"),
+                    }
+                )
+    out.sort(key=lambda r: r.get("generated_at") or "", reverse=True)
+    return out
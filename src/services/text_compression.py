@@ -0,0 +1,265 @@
+# src/services/text_compression.py
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+from src.models.mail_message import MailMessage
+from src.services.prompt_packer import count_tokens, is_bulk_message
+
+# Graph's bodyPreview is the first ~255 characters flattened onto one line,
+# so these markers are matched inline; everything from one onwards is dropped
+_QUOTE_START_RES = [
+    re.compile(r"(?:^|(?<=\s))On\s[^\n]{0,200}?\d[^\n]{0,200}?\swrote:", re.MULTILINE),
+    re.compile(r"-{2,}\s*Original Message\s*-{2,}", re.IGNORECASE),
+    re.compile(r"-{2,}\s*Forwarded message\s*-{2,}", re.IGNORECASE),
+    re.compile(r"_{10,}"),
+    re.compile(r"(?:^|(?<=\s))From:\s[^\n]{1,300}?\s(?:Sent|Date):\s", re.MULTILINE),
+]
+# Outlook puts the header block on separate lines
+_HEADER_FROM_RE = re.compile(r"^\s*From:\s", re.IGNORECASE)
+_HEADER_NEXT_RE = re.compile(r"^\s*(Sent|Date):\s", re.IGNORECASE)
+
+_SIGNATURE_START_RES = [
+    re.compile(r"^-- ?$", re.MULTILINE),
+    re.compile(r"\bSent from my \w+", re.IGNORECASE),
+    re.compile(r"\bGet Outlook for \w+", re.IGNORECASE),
+]
+_SIGN_OFF_WORDS = r"(thanks|thank you|best regards|kind regards|warm regards|regards|best|cheers|sincerely)"
+_SIGN_OFF_RE = re.compile(rf"^\s*{_SIGN_OFF_WORDS}[,!.]?\s*$", re.IGNORECASE)
+# A sign-off this close to the end starts the signature block
+_SIGN_OFF_TAIL_LINES = 6
+# On one line: a sign-off opening a sentence, followed by at most this much
+# name/title/phone/URL text, is where the signature starts
+_INLINE_SIGN_OFF_RE = re.compile(rf"(?:^|(?<=[.!?])\s+){_SIGN_OFF_WORDS}(?:[,!.]|\s*$)", re.IGNORECASE)
+_SIGN_OFF_TAIL_CHARS = 100
+_SIGNATURE_FIELD_SPLIT_RE = re.compile(r"\s*(?:[|,;\n\u2022]|\s-\s)\s*")
+_SIGNATURE_TOKEN_RES = [
+    re.compile(r"[A-Z][\w'&.-]*"),  # name, title, company
+    re.compile(r"(?:of|and|at|the|for|de|van|von|&)"),
+    re.compile(r"[A-Za-z]{1,6}:"),  # Tel:, m:
+    re.compile(r"[+(]?[\d()./-]+"),  # phone
+    re.compile(r"\S+@\S+|(?:https?://|www\.)\S+|[\w-]+\.(?:com|org|net|io|co|uk|es)\S*", re.IGNORECASE),
+]
+# Capitalised words that open a sentence rather than a name or title
+_SENTENCE_OPENER_RE = re.compile(
+    r"(?:call|ring|text|email|send|see|let|please|will|can|could|would|should|i|we|you|talk|speak|meet|reply)\b",
+    re.IGNORECASE,
+)
+
+# Legal notices start at a label or a sentence with a telltale phrase and
+# run on for as long as the following sentences are still notice wording
+_NOTICE_LABEL_RE = re.compile(r"\b(confidentiality notice|disclaimer)\s*:", re.IGNORECASE)
+_DISCLAIMER_RE = re.compile(
+    r"(this (e-?mail|message) and any attachments|intended solely for"
+    r"|received this (e-?mail|message) in error|please consider the environment before printing)",
+    re.IGNORECASE,
+)
+_NOTICE_WORDING_RE = re.compile(
+    r"(confidential|privileged|intended recipient|addressee|notify the sender|delete (it|this|the)"
+    r"|unauthori[sz]ed|prohibited|disclos|copying|distribution|viruses)",
+    re.IGNORECASE,
+)
+# External-sender banners sit at the top of a message; only they are dropped
+_BANNER_TAG_RE = re.compile(r"\[\s*external(?: e-?mail| sender)?\s*\]:?", re.IGNORECASE)
+_BANNER_RE = re.compile(
+    r"(caution: this (e-?mail|message) originated|external email|do not click (on )?links"
+    r"|unless you recogni[sz]e the sender)",
+    re.IGNORECASE,
+)
+_SENTENCE_RE = re.compile(r"[^\n.!?]*(?:[.!?]+|\n|$)")
+
+_BLANK_RUN_RE = re.compile(r"\n{3,}")
+_SPACE_RUN_RE = re.compile(r"[ \t]{2,}")
+_VOLATILE_RE = re.compile(r"\d+|#[\w-]+|[0-9a-f]{8,}", re.IGNORECASE)
+
+# Paragraphs shorter than this are never treated as repeated boilerplate
+MIN_DEDUPE_PARAGRAPH_CHARS = 80
+
+
+@dataclass
+class CompressionStats:
+    bytes_before: int = 0
+    bytes_after: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+    messages_collapsed: int = 0
+
+    def add(self, before: str, after: str) -> None:
+        self.bytes_before += len(before.encode("utf-8"))
+        self.bytes_after += len(after.encode("utf-8"))
+        self.tokens_before += count_tokens(before)
+        self.tokens_after += count_tokens(after)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "bytes_saved": self.bytes_before - self.bytes_after,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": self.tokens_before - self.tokens_after,
+            "messages_collapsed": self.messages_collapsed,
+        }
+
+
+def _first_match(patterns: Iterable[re.Pattern], text: str) -> int:
+    starts = [m.start() for m in (r.search(text) for r in patterns) if m]
+    return min(starts, default=len(text))
+
+
+def strip_quoted_history(text: str) -> str:
+    lines = text[:_first_match(_QUOTE_START_RES, text)].splitlines()
+    for i, line in enumerate(lines):
+        if _HEADER_FROM_RE.match(line) and i + 1 < len(lines) and _HEADER_NEXT_RE.match(lines[i + 1]):
+            return "\n".join(lines[:i])
+    # Inline '>' quoting without a header line
+    return "\n".join(line for line in lines if not line.lstrip().startswith(">"))
+
+
+def strip_signature(text: str) -> str:
+    text = text[:_first_match(_SIGNATURE_START_RES, text)]
+    lines = text.splitlines()
+    tail_start = max(0, len(lines) - _SIGN_OFF_TAIL_LINES)
+    for i in range(tail_start, len(lines)):
+        if _SIGN_OFF_RE.match(lines[i]):
+            return "\n".join(lines[:i])
+    for m in _INLINE_SIGN_OFF_RE.finditer(text):
+        rest = text[m.end():]
+        # "Thanks, John Smith | Ops" is a signature; "Thanks! Call me 555-1234" is not
+        if len(rest.strip()) <= _SIGN_OFF_TAIL_CHARS and _looks_like_signature(rest):
+            return text[:m.start()]
+    return text
+
+
+def _looks_like_signature(text: str) -> bool:
+    """
+    True when text is only name, title, company, phone and URL fields.
+    """
+    for field in _SIGNATURE_FIELD_SPLIT_RE.split(text.strip()):
+        if not field:
+            continue
+        if _SENTENCE_OPENER_RE.match(field):
+            return False
+        for token in field.rstrip(".").split():
+            if not any(r.fullmatch(token) for r in _SIGNATURE_TOKEN_RES):
+                return False
+    return True
+
+
+def strip_disclaimers(text: str) -> str:
+    paragraphs = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        kept = []
+        in_notice = False
+        for sentence in _SENTENCE_RE.findall(_BANNER_TAG_RE.sub("", paragraph)):
+            label = _NOTICE_LABEL_RE.search(sentence)
+            if label:
+                kept.append(sentence[:label.start()])
+                in_notice = True
+            elif _DISCLAIMER_RE.search(sentence):
+                in_notice = True
+            elif in_notice and (_NOTICE_WORDING_RE.search(sentence) or not sentence.strip()):
+                continue
+            elif not _BANNER_RE.search(sentence):
+                in_notice = False
+                kept.append(sentence)
+        paragraph = "".join(kept).strip()
+        if paragraph:
+            paragraphs.append(paragraph)
+    return "\n\n".join(paragraphs)
+
+
+def normalize_whitespace(text: str) -> str:
+    text = _SPACE_RUN_RE.sub(" ", text.replace("\r\n", "\n").replace("\r", "\n"))
+    return _BLANK_RUN_RE.sub("\n\n", text).strip()
+
+
+def compress_text(text: str) -> str:
+    """
+    Remove quoted history, signatures and disclaimers from one email or note.
+    """
+    if not text:
+        return text
+    out = strip_quoted_history(text)
+    out = strip_disclaimers(out)
+    out = strip_signature(out)
+    out = normalize_whitespace(out)
+    # Never reduce a message to nothing; a bare reply still says "someone replied"
+    return out or normalize_whitespace(text)[:200]
+
+
+def _automated_key(msg: MailMessage) -> Tuple[str, str]:
+    return msg.sender, _VOLATILE_RE.sub("#", msg.subject.lower()).strip()
+
+
+def compress_messages(messages: Iterable[MailMessage]) -> Tuple[List[MailMessage], CompressionStats]:
+    """
+    Email pipeline normalisation.
+
+    - previews lose quoted replies, signatures and disclaimers
+    - automated messages from the same sender whose subjects differ only in
+      numbers/ids collapse into the newest one, with collapsed_count set
+
+    Input records are not modified.
+    """
+    stats = CompressionStats()
+    kept: List[MailMessage] = []
+    automated: Dict[Tuple[str, str], int] = {}
+
+    for msg in messages:
+        bulk = is_bulk_message(msg)
+        key = _automated_key(msg) if bulk else None
+        pos = automated.get(key) if bulk else None
+        if pos is not None:
+            existing = kept[pos]
+            stats.add(msg.preview, "")
+            stats.messages_collapsed += 1
+            count = existing.collapsed_count + 1
+            if msg.sent_at > existing.sent_at:
+                kept[pos] = msg.replace(preview=compress_text(msg.preview), collapsed_count=count)
+            else:
+                existing.collapsed_count = count
+            continue
+
+        compressed = compress_text(msg.preview)
+        stats.add(msg.preview, compressed)
+        if bulk:
+            automated[key] = len(kept)
+        kept.append(msg.replace(preview=compressed))
+
+    return kept, stats
+
+
+def dedupe_paragraphs(texts: List[str]) -> List[str]:
+    """
+    Drop paragraphs already seen in an earlier text (forwarded chains and
+    boilerplate pasted into several notes).
+    """
+    seen: set = set()
+    out: List[str] = []
+    for text in texts:
+        kept_paragraphs: List[str] = []
+        for para in re.split(r"\n\s*\n", text):
+            norm = " ".join(para.split()).lower()
+            if len(norm) >= MIN_DEDUPE_PARAGRAPH_CHARS:
+                if norm in seen:
+                    continue
+                seen.add(norm)
+            kept_paragraphs.append(para)
+        out.append("\n\n".join(kept_paragraphs))
+    return out
+
+
+def compress_documents(texts: List[str]) -> Tuple[List[str], CompressionStats]:
+    """
+    Upload pipeline normalisation: per-document compress_text, then
+    dedupe_paragraphs across documents.
+    """
+    stats = CompressionStats()
+    out = dedupe_paragraphs([compress_text(text) for text in texts])
+    for text, compressed in zip(texts, out):
+        stats.add(text, compressed)
+    return out, stats
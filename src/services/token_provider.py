@@ -0,0 +1,133 @@
+# src/services/token_provider.py
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+import msal
+
+DEFAULT_SCOPES = ("https://graph.microsoft.com/.default",)
+
+# Tokens closer than this to expiry are refreshed before being handed out
+HARD_REFRESH_SECONDS = int(os.getenv("APP_TOKEN_HARD_REFRESH_SECONDS", "60"))
+# Inside this window a cached token is still returned, but a background refresh starts
+SOFT_REFRESH_SECONDS = int(os.getenv("APP_TOKEN_SOFT_REFRESH_SECONDS", "600"))
+
+_TokenKey = Tuple[str, str, Tuple[str, ...]]
+
+
+class AppTokenProvider:
+    """
+    Process-wide cache for client-credentials (app-only) tokens.
+
+    - One msal.ConfidentialClientApplication per (tenant, client id)
+    - Tokens are reused until shortly before they expire
+    - Concurrent callers for the same key share a single token fetch
+    - Tokens nearing expiry are refreshed in the background so callers
+      keep getting a valid cached token with no added latency
+    """
+
+    def __init__(
+        self,
+        hard_refresh_seconds: int = HARD_REFRESH_SECONDS,
+        soft_refresh_seconds: int = SOFT_REFRESH_SECONDS,
+    ):
+        self.hard_refresh_seconds = hard_refresh_seconds
+        self.soft_refresh_seconds = max(soft_refresh_seconds, hard_refresh_seconds)
+        self._apps: Dict[Tuple[str, str], msal.ConfidentialClientApplication] = {}
+        self._tokens: Dict[_TokenKey, Tuple[str, float]] = {}
+        self._key_locks: Dict[_TokenKey, threading.Lock] = {}
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+
+    def _app(self, tenant_id: str, client_id: str, client_secret: str) -> msal.ConfidentialClientApplication:
+        with self._lock:
+            app = self._apps.get((tenant_id, client_id))
+            if app is None:
+                app = msal.ConfidentialClientApplication(
+                    client_id,
+                    authority=f"https://login.microsoftonline.com/{tenant_id}",
+                    client_credential=client_secret,
+                )
+                self._apps[(tenant_id, client_id)] = app
+            return app
+
+    def _key_lock(self, key: _TokenKey) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _fetch(self, key: _TokenKey, client_secret: str) -> str:
+        tenant_id, client_id, scopes = key
+        result = self._app(tenant_id, client_id, client_secret).acquire_token_for_client(scopes=list(scopes))
+        if "access_token" not in result:
+            raise RuntimeError(f"Failed to acquire app token: {result}")
+        expires_at = time.time() + int(result.get("expires_in", 3600))
+        with self._lock:
+            self._tokens[key] = (result["access_token"], expires_at)
+        return result["access_token"]
+
+    def _refresh_in_background(self, key: _TokenKey, client_secret: str) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run() -> None:
+            try:
+                with self._key_lock(key):
+                    self._fetch(key, client_secret)
+            except Exception:
+                # The next caller past the hard margin will retry in the foreground
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name="app-token-refresh", daemon=True).start()
+
+    def get_token(
+        self,
+        tenant_id: str,
+        client_id: str,
+        client_secret: str,
+        scopes: Sequence[str] = DEFAULT_SCOPES,
+    ) -> str:
+        key: _TokenKey = (tenant_id, client_id, tuple(scopes))
+
+        cached = self._tokens.get(key)
+        if cached is not None:
+            token, expires_at = cached
+            remaining = expires_at - time.time()
+            if remaining > self.soft_refresh_seconds:
+                return token
+            if remaining > self.hard_refresh_seconds:
+                self._refresh_in_background(key, client_secret)
+                return token
+
+        # Single flight: whoever holds the lock fetches, everyone else reuses its result
+        with self._key_lock(key):
+            cached = self._tokens.get(key)
+            if cached is not None and cached[1] - time.time() > self.hard_refresh_seconds:
+                return cached[0]
+            return self._fetch(key, client_secret)
+
+    def invalidate(self, tenant_id: Optional[str] = None) -> None:
+        with self._lock:
+            for key in list(self._tokens):
+                if tenant_id is None or key[0] == tenant_id:
+                    del self._tokens[key]
+
+
+app_token_provider = AppTokenProvider()
+
+
+def get_app_token(
+    tenant_id: str,
+    client_id: str,
+    client_secret: str,
+    scopes: Sequence[str] = DEFAULT_SCOPES,
+) -> str:
+    return app_token_provider.get_token(tenant_id, client_id, client_secret, scopes)
@@ -0,0 +1,208 @@
+# src/services/upload_manifest.py
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.services import document_extraction
+from src.utils import sqlite_store
+
+MANIFEST_PATH = Path(os.getenv("UPLOAD_MANIFEST_DB", "src/data/upload_manifest.sqlite3"))
+
+_HASH_CHUNK = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS upload_files (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    text TEXT NOT NULL,
+    uploaded_at REAL NOT NULL,
+    summary TEXT,
+    summary_key TEXT,
+    stats TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_upload_files_uploaded_at ON upload_files(uploaded_at);
+"""
+
+
+@dataclass
+class ManifestEntry:
+    name: str
+    content_hash: str
+    text: str
+    uploaded_at: float
+    summary: Optional[str] = None
+    summary_key: Optional[str] = None
+    stats: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class ScanResult:
+    added: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    failed: int = 0
+
+
+def _connect() -> sqlite3.Connection:
+    return sqlite_store.connect(MANIFEST_PATH, _SCHEMA)
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def week_bounds(week: Optional[str] = None) -> Tuple[float, float]:
+    """
+    [start, end) epoch seconds of an ISO week ("2026-W42"); the current week by default.
+    """
+    if week:
+        year, num = week.split("-W")
+        start_day = date.fromisocalendar(int(year), int(num), 1)
+    else:
+        today = datetime.now(timezone.utc).date()
+        start_day = today - timedelta(days=today.weekday())
+    start = datetime(start_day.year, start_day.month, start_day.day, tzinfo=timezone.utc)
+    return start.timestamp(), (start + timedelta(days=7)).timestamp()
+
+
+def scan(upload_dir: Path) -> ScanResult:
+    """
+    Bring the manifest in line with the upload folder. Files whose size and
+    mtime match the manifest are not opened; others are hashed, and only a
+    new hash extracts the text (in parallel, through the extraction cache)
+    and clears the stored summary.
+
+    uploaded_at is the ingest time: set when a file is first seen and
+    refreshed when it is uploaded again (its mtime moves, as the upload
+    store touches re-uploaded content). The file's own mtime is not used,
+    since checkouts, deploys and archive members carry old ones.
+    """
+    result = ScanResult()
+    conn = _connect()
+    known = {
+        name: (size, mtime_ns, content_hash)
+        for name, size, mtime_ns, content_hash in conn.execute(
+            "SELECT name, size, mtime_ns, content_hash FROM upload_files"
+        )
+    }
+    present = set()
+    pending: List[Tuple[Path, os.stat_result, str]] = []
+
+    paths = sorted(upload_dir.iterdir()) if upload_dir.exists() else []
+    for path in paths:
+        if not path.is_file() or not document_extraction.is_supported(path):
+            continue
+        present.add(path.name)
+        try:
+            st = path.stat()
+            prev = known.get(path.name)
+            if prev and prev[0] == st.st_size and prev[1] == st.st_mtime_ns:
+                result.unchanged += 1
+                continue
+
+            digest = file_hash(path)
+        except OSError:
+            result.failed += 1
+            continue
+
+        if prev and prev[2] == digest:
+            # Re-uploaded but identical: keep text and summary, count it as uploaded now
+            now = time.time()
+            conn.execute(
+                "UPDATE upload_files SET size = ?, mtime_ns = ?, uploaded_at = ?, updated_at = ? WHERE name = ?",
+                (st.st_size, st.st_mtime_ns, now, now, path.name),
+            )
+            result.unchanged += 1
+            continue
+        pending.append((path, st, digest))
+
+    texts = document_extraction.extract_texts([(path, digest) for path, _, digest in pending])
+    now = time.time()
+    for (path, st, digest), text in zip(pending, texts):
+        if isinstance(text, Exception):
+            # Skip unreadable files; they are retried on the next scan
+            result.failed += 1
+            continue
+        conn.execute(
+            """
+            INSERT INTO upload_files (name, size, mtime_ns, content_hash, text, uploaded_at,
+                                      summary, summary_key, stats, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, NULL, NULL, NULL, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                size = excluded.size,
+                mtime_ns = excluded.mtime_ns,
+                content_hash = excluded.content_hash,
+                text = excluded.text,
+                uploaded_at = excluded.uploaded_at,
+                summary = NULL,
+                summary_key = NULL,
+                stats = NULL,
+                updated_at = excluded.updated_at
+            """,
+            (path.name, st.st_size, st.st_mtime_ns, digest, text, now, now),
+        )
+        if path.name in known:
+            result.changed += 1
+        else:
+            result.added += 1
+
+    gone = [name for name in known if name not in present]
+    if gone:
+        conn.executemany("DELETE FROM upload_files WHERE name = ?", [(n,) for n in gone])
+        result.removed = len(gone)
+    return result
+
+
+def entries_between(start: float, end: float) -> List[ManifestEntry]:
+    rows = _connect().execute(
+        "SELECT name, content_hash, text, uploaded_at, summary, summary_key, stats "
+        "FROM upload_files WHERE uploaded_at >= ? AND uploaded_at < ? ORDER BY uploaded_at, name",
+        (start, end),
+    ).fetchall()
+    return [
+        ManifestEntry(
+            name=name,
+            content_hash=content_hash,
+            text=text,
+            uploaded_at=uploaded_at,
+            summary=summary,
+            summary_key=summary_key,
+            stats=json.loads(stats) if stats else {},
+        )
+        for name, content_hash, text, uploaded_at, summary, summary_key, stats in rows
+    ]
+
+
+def set_summary(
+    name: str,
+    content_hash: str,
+    summary: str,
+    summary_key: Optional[str],
+    stats: Dict[str, int],
+) -> None:
+    """
+    Store a file's summary, unless the file changed while it was being made.
+    A None key stores a fallback that is retried on the next report.
+    """
+    _connect().execute(
+        "UPDATE upload_files SET summary = ?, summary_key = ?, stats = ?, updated_at = ? "
+        "WHERE name = ? AND content_hash = ?",
+        (summary, summary_key, json.dumps(stats), time.time(), name, content_hash),
+    )
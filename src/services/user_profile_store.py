@@ -2,42 +2,300 @@
 
 from __future__ import annotations
 
+import dataclasses
 import json
 import os
+import sqlite3
+import threading
+import time
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Callable, Optional, Dict, List, Tuple
 
 from src.models.user_profile import UserProfile
+from src.utils import sqlite_store
 
 DATA_DIR = Path("src/data")
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+PROFILE_DB = Path(os.getenv("USER_PROFILE_DB", str(DATA_DIR / "user_profiles.sqlite3")))
+
+# Legacy JSON store; imported once into PROFILE_DB on first use
 USER_FILE = DATA_DIR / "user_profiles.json"
 
+# Serve reads from an in-process copy, refreshed when the store version changes
+CACHE_ENABLED = os.getenv("USER_PROFILE_CACHE", "1") == "1"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_profiles (
+    user_id TEXT PRIMARY KEY,
+    email_norm TEXT NOT NULL,
+    outlook_connected INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_user_profiles_email ON user_profiles(email_norm);
+CREATE INDEX IF NOT EXISTS idx_user_profiles_connected ON user_profiles(outlook_connected);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('version', '0');
+CREATE TABLE IF NOT EXISTS token_refresh_claims (
+    user_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+_migration_checked = False
+
+
+def _norm_email(email: Optional[str]) -> str:
+    return (email or "").strip().lower()
+
+
+def _connect() -> sqlite3.Connection:
+    global _migration_checked
+    conn = sqlite_store.connect(PROFILE_DB, _SCHEMA)
+    if not _migration_checked:
+        _migration_checked = True
+        _add_version_column(conn)
+        migrate_from_json(USER_FILE)
+    return conn
+
+
+def _add_version_column(conn: sqlite3.Connection) -> None:
+    # Databases created before the cache existed lack the per-row version
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(user_profiles)")}
+    if "version" not in columns:
+        conn.execute("ALTER TABLE user_profiles ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_profiles_version ON user_profiles(version)")
+
+
+def _store_version(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def _bump_version(conn: sqlite3.Connection) -> int:
+    """
+    Call inside a write transaction; every committed write gets a new version.
+    """
+    version = _store_version(conn) + 1
+    conn.execute("UPDATE store_meta SET value = ? WHERE key = 'version'", (str(version),))
+    return version
+
+
+def _row_values(profile: UserProfile, version: int) -> tuple:
+    return (
+        profile.user_id,
+        _norm_email(profile.email),
+        1 if profile.outlook_connected else 0,
+        json.dumps(profile.to_dict(), sort_keys=True),
+        time.time(),
+        version,
+    )
+
+
+def _write(conn: sqlite3.Connection, profile: UserProfile) -> None:
+    """
+    Upsert one profile. Call inside a write transaction.
+    """
+    conn.execute(
+        """
+        INSERT INTO user_profiles (user_id, email_norm, outlook_connected, data, updated_at, version)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            email_norm = excluded.email_norm,
+            outlook_connected = excluded.outlook_connected,
+            data = excluded.data,
+            updated_at = excluded.updated_at,
+            version = excluded.version
+        """,
+        _row_values(profile, _bump_version(conn)),
+    )
 
-def _load_all() -> Dict[str, dict]:
-    if not USER_FILE.exists():
-        return {}
-    raw = USER_FILE.read_text(encoding="utf-8").strip()
-    if not raw:
-        return {}
-    return json.loads(raw)
 
+def _detached(profile: UserProfile) -> UserProfile:
+    # Callers mutate the profiles they get back; never hand out the cached instance
+    return dataclasses.replace(
+        profile,
+        outlook_tokens=dict(profile.outlook_tokens),
+        mail_delta_links=dict(profile.mail_delta_links),
+    )
 
-def _save_all(data: Dict[str, dict]) -> None:
-    USER_FILE.write_text(json.dumps(data, indent=2, sort_keys=True), encoding="utf-8")
+
+class _ProfileCache:
+    """
+    In-process copy of the profile table with user_id and email indexes and a
+    materialised connected-users list. Each read checks the store version
+    (one primary-key lookup) and pulls only rows written since the last
+    refresh, so writes from other workers are visible on the next read.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._version = -1
+        self._rows: Dict[str, Tuple[int, UserProfile]] = {}
+        self._by_email: Dict[str, UserProfile] = {}
+        self._connected: List[UserProfile] = []
+
+    def _refresh(self) -> None:
+        conn = _connect()
+        version = _store_version(conn)
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            rows = conn.execute(
+                "SELECT rowid, data FROM user_profiles WHERE version > ?",
+                (self._version,),
+            ).fetchall()
+            for rowid, data in rows:
+                profile = UserProfile.from_dict(json.loads(data))
+                self._rows[profile.user_id] = (rowid, profile)
+            ordered = [p for _, p in sorted(self._rows.values(), key=lambda item: item[0])]
+            by_email: Dict[str, UserProfile] = {}
+            for p in ordered:
+                by_email.setdefault(_norm_email(p.email), p)
+            self._by_email = by_email
+            self._connected = [p for p in ordered if p.outlook_connected]
+            self._version = version
+
+    def get(self, user_id: str) -> Optional[UserProfile]:
+        self._refresh()
+        item = self._rows.get(user_id)
+        return _detached(item[1]) if item else None
+
+    def by_email(self, email_norm: str) -> Optional[UserProfile]:
+        self._refresh()
+        p = self._by_email.get(email_norm)
+        return _detached(p) if p else None
+
+    def connected(self) -> List[UserProfile]:
+        self._refresh()
+        return [_detached(p) for p in self._connected]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._version = -1
+            self._rows = {}
+            self._by_email = {}
+            self._connected = []
+
+
+_cache = _ProfileCache()
+
+
+def migrate_from_json(path: Path = USER_FILE) -> int:
+    """
+    One-shot import of the legacy JSON profile file. Runs once per database
+    (recorded in store_meta); existing rows are never overwritten.
+    Returns the number of profiles imported.
+    """
+    conn = sqlite_store.connect(PROFILE_DB, _SCHEMA)
+    if not path.exists():
+        return 0
+    with sqlite_store.transaction(conn):
+        done = conn.execute("SELECT 1 FROM store_meta WHERE key = 'json_migrated'").fetchone()
+        if done:
+            return 0
+        raw = path.read_text(encoding="utf-8").strip()
+        data: Dict[str, dict] = json.loads(raw) if raw else {}
+        imported = 0
+        version = _bump_version(conn)
+        for user_id, p in data.items():
+            profile = UserProfile.from_dict(dict(p, user_id=p.get("user_id") or user_id))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO user_profiles (user_id, email_norm, outlook_connected, data, updated_at, version) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                _row_values(profile, version),
+            )
+            imported += cur.rowcount
+        conn.execute(
+            "INSERT INTO store_meta (key, value) VALUES ('json_migrated', ?)",
+            (json.dumps({"source": str(path), "profiles": imported, "at": time.time()}),),
+        )
+    return imported
 
 
 def save_user_profile(profile: UserProfile) -> None:
-    data = _load_all()
-    data[profile.user_id] = profile.to_dict()
-    _save_all(data)
+    conn = _connect()
+    with sqlite_store.transaction(conn):
+        _write(conn, profile)
+
+
+def update_user_profile(
+    user_id: str,
+    apply: Callable[[UserProfile], None],
+) -> Optional[UserProfile]:
+    """
+    Re-read a profile, apply a change to it and save it.
+    Use this instead of save_user_profile when only some fields change, so a
+    stale in-memory copy can't overwrite what another caller saved meanwhile.
+    The read and write share one write-locked transaction, so this holds
+    across worker processes too.
+    """
+    conn = _connect()
+    with sqlite_store.transaction(conn):
+        row = conn.execute("SELECT data FROM user_profiles WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return None
+        profile = UserProfile.from_dict(json.loads(row[0]))
+        apply(profile)
+        _write(conn, profile)
+        return profile
+
+
+def claim_token_refresh(
+    user_id: str,
+    owner: str,
+    lease_seconds: float,
+    needed: Callable[[UserProfile], bool],
+) -> Tuple[Optional[UserProfile], bool]:
+    """
+    Read a profile and, if `needed(profile)` and no other owner holds an
+    unexpired claim, claim its token refresh for lease_seconds. Returns
+    (profile, claimed). The check and the claim share one write-locked
+    transaction, so across worker processes only one refreshes a user's
+    tokens at a time, and nobody refreshes tokens another just renewed.
+    """
+    conn = _connect()
+    with sqlite_store.transaction(conn):
+        row = conn.execute("SELECT data FROM user_profiles WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return None, False
+        profile = UserProfile.from_dict(json.loads(row[0]))
+        if not needed(profile):
+            return profile, False
+        now = time.time()
+        holder = conn.execute(
+            "SELECT owner FROM token_refresh_claims WHERE user_id = ? AND expires_at > ?",
+            (user_id, now),
+        ).fetchone()
+        if holder and holder[0] != owner:
+            return profile, False
+        conn.execute(
+            "INSERT OR REPLACE INTO token_refresh_claims (user_id, owner, expires_at) VALUES (?, ?, ?)",
+            (user_id, owner, now + lease_seconds),
+        )
+        return profile, True
+
+
+def release_token_refresh(user_id: str, owner: str) -> None:
+    _connect().execute(
+        "DELETE FROM token_refresh_claims WHERE user_id = ? AND owner = ?",
+        (user_id, owner),
+    )
 
 
 def get_user_profile(user_id: str) -> Optional[UserProfile]:
-    data = _load_all()
-    p = data.get(user_id)
-    return UserProfile.from_dict(p) if p else None
+    if CACHE_ENABLED:
+        return _cache.get(user_id)
+    row = _connect().execute("SELECT data FROM user_profiles WHERE user_id = ?", (user_id,)).fetchone()
+    return UserProfile.from_dict(json.loads(row[0])) if row else None
 
 
 # Backward compatible alias (some files import this name)
@@ -46,24 +304,26 @@ def get_user_profile_by_id(user_id: str) -> Optional[UserProfile]:
 
 
 def get_user_by_email(email: str) -> Optional[UserProfile]:
-    email_norm = (email or "").strip().lower()
+    email_norm = _norm_email(email)
     if not email_norm:
         return None
+    if CACHE_ENABLED:
+        return _cache.by_email(email_norm)
 
-    data = _load_all()
-    for p in data.values():
-        if (p.get("email") or "").strip().lower() == email_norm:
-            return UserProfile.from_dict(p)
-    return None
+    row = _connect().execute(
+        "SELECT data FROM user_profiles WHERE email_norm = ? ORDER BY rowid LIMIT 1",
+        (email_norm,),
+    ).fetchone()
+    return UserProfile.from_dict(json.loads(row[0])) if row else None
 
 
 def get_all_connected_users() -> List[UserProfile]:
-    data = _load_all()
-    users: List[UserProfile] = []
-    for p in data.values():
-        if p.get("outlook_connected"):
-            users.append(UserProfile.from_dict(p))
-    return users
+    if CACHE_ENABLED:
+        return _cache.connected()
+    rows = _connect().execute(
+        "SELECT data FROM user_profiles WHERE outlook_connected = 1 ORDER BY rowid"
+    ).fetchall()
+    return [UserProfile.from_dict(json.loads(data)) for (data,) in rows]
 
 
 def upsert_user_by_email(profile: UserProfile) -> UserProfile:
@@ -71,11 +331,16 @@ def upsert_user_by_email(profile: UserProfile) -> UserProfile:
     If a user with this email exists, overwrite that record with the new profile
     but keep the existing user_id if the new one is empty.
     """
-    existing = get_user_by_email(profile.email)
-    if existing:
+    conn = _connect()
+    with sqlite_store.transaction(conn):
         if not profile.user_id:
-            profile.user_id = existing.user_id
-    save_user_profile(profile)
+            row = conn.execute(
+                "SELECT user_id FROM user_profiles WHERE email_norm = ? ORDER BY rowid LIMIT 1",
+                (_norm_email(profile.email),),
+            ).fetchone()
+            if row:
+                profile.user_id = row[0]
+        _write(conn, profile)
     return profile
 
 
@@ -96,3 +361,4 @@ def get_default_user_profile() -> Optional[UserProfile]:
 
     users = get_all_connected_users()
     return users[0] if users else None
+
@@ -2,179 +2,431 @@
 
 from __future__ import annotations
 
-from datetime import datetime, timedelta
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
 import os
-from typing import List, Dict, Any, Optional
-
-from openai import OpenAI
-import anthropic
+import threading
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 
+from src.models.mail_message import Conversation, MailMessage, index_conversations
 from src.models.user_profile import UserProfile
 from src.services.user_profile_store import (
     get_all_connected_users,
+    get_user_by_email,
     get_user_profile_by_id,
 )
 from src.services.ms_graph_client import (
-    get_recent_inbox_and_sent_emails,
+    iter_inbox_and_sent_since,
     send_email,
 )
+from src.services.mail_sync import iter_cached_messages, sync_mailbox
+from src.services.delegated_tokens import get_access_token
+from src.services import llm_gateway, model_router
+from src.services.report_store import (
+    REPORT_FRESH_SECONDS,
+    load_latest_report,
+    load_report,
+    report_age_seconds,
+    save_report,
+    week_of,
+)
+from src.services.conversation_summaries import (
+    PROMPT_VERSION as SUMMARY_PROMPT_VERSION,
+    format_message_lines,
+    prune_summaries,
+    summarize_conversations,
+)
+from src.services.prompt_packer import (
+    ConversationSignals,
+    count_tokens,
+    pack,
+    rank_conversations,
+)
+from src.services.text_compression import compress_messages
+
+# Token budget for the conversation section of the final report prompt
+REPORT_TOKEN_BUDGET = int(os.getenv("WEEKLY_PROMPT_TOKEN_BUDGET", "6000"))
+# Upper bound on conversations sent through the per-conversation summary stage
+MAX_CONVERSATIONS = int(os.getenv("WEEKLY_MAX_CONVERSATIONS", "60"))
+CONVERSATION_SUMMARY_MAX_TOKENS = 300
+# Typical stage one summary size, used to pick how many conversations to summarize
+ESTIMATED_SUMMARY_TOKENS = 120
+
+# Read the weekly window from the delta-synced local cache instead of re-downloading it
+MAIL_SYNC_ENABLED = os.getenv("MAIL_SYNC_ENABLED", "1") == "1"
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY")
 
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
-claude_client = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
+class ReportUserError(ValueError):
+    """
+    The request doesn't name a report user this server can run; the API
+    answers 400 before queueing a job or opening a stream.
+    """
 
 
-def _pick_profile(user_id: Optional[str]) -> UserProfile:
+def pick_profile(user_id: Optional[str]) -> UserProfile:
     if user_id:
         p = get_user_profile_by_id(user_id)
         if not p:
-            raise RuntimeError(f"No user profile found for user_id={user_id}")
+            raise ReportUserError(f"No user profile found for user_id={user_id}")
         if not p.outlook_connected:
-            raise RuntimeError(f"User {user_id} exists but is not Outlook-connected")
+            raise ReportUserError(f"User {user_id} exists but is not Outlook-connected")
         return p
 
     users = get_all_connected_users()
     if not users:
-        raise RuntimeError("No Outlook-connected users found. Connect an account first.")
-    return users[0]
+        raise ReportUserError("No Outlook-connected users found. Connect an account first.")
+    if len(users) == 1:
+        return users[0]
+
+    env_email = (os.getenv("REPORT_USER_EMAIL") or "").strip()
+    if env_email:
+        p = get_user_by_email(env_email)
+        if p and p.outlook_connected:
+            return p
+    raise ReportUserError(
+        f"{len(users)} Outlook-connected users found; pass user_id, "
+        "or use /weekly/batch-report to run every user"
+    )
 
 
 def _get_delegated_access_token(profile: UserProfile) -> Optional[str]:
-    tokens = profile.outlook_tokens or {}
-    return tokens.get("access_token")
-
-
-def fetch_emails_last_7_days(access_token: Optional[str]) -> List[Dict[str, Any]]:
-    now_utc = datetime.utcnow()
-    cutoff = now_utc - timedelta(days=7)
+    # Refreshed ahead of expiry by the background refresher
+    return get_access_token(profile)
+
+
+def iter_emails_last_7_days(
+    access_token: Optional[str],
+    profile: Optional[UserProfile] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream Inbox and SentItems messages from the last 7 days.
+
+    With mail sync enabled the mailbox cache is brought up to date with a
+    delta query first and messages are read locally. A delegated token with no
+    profile has nowhere to keep sync state, so it streams from Graph: the
+    cutoff is pushed into $filter and every page is already in window.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=7)
+    if MAIL_SYNC_ENABLED and (profile is not None or not access_token):
+        sync_mailbox(access_token, profile=profile)
+        return iter_cached_messages(cutoff, profile=profile)
+    return iter_inbox_and_sent_since(cutoff, access_token=access_token, select="weekly")
+
+
+def fetch_emails_last_7_days(
+    access_token: Optional[str],
+    profile: Optional[UserProfile] = None,
+) -> List[Dict[str, Any]]:
+    return list(iter_emails_last_7_days(access_token, profile=profile))
+
+
+def group_emails_into_conversations(emails: Iterable[Dict[str, Any]]) -> List[Conversation]:
+    """
+    Graph messages -> compact records, indexed by conversation in one pass.
+    """
+    return index_conversations(MailMessage.from_graph(msg) for msg in emails)
+
+
+def compress_conversations(
+    conversations: List[Conversation],
+) -> Tuple[List[Conversation], Dict[str, int]]:
+    """
+    Strip quoted history and boilerplate from previews and fold repeated
+    automated notifications into one message, then regroup.
+    """
+    messages, stats = compress_messages(m for conv in conversations for m in conv.messages)
+    return index_conversations(messages), stats.to_dict()
+
+
+def _format_prompt(
+    profile: UserProfile,
+    conversations: List[Conversation],
+    ranked: List[Tuple[Conversation, ConversationSignals]],
+    summaries: Dict[str, str],
+) -> str:
+    """
+    Stage two (reduce): combine per-conversation summaries into the report.
+
+    Conversations are added in relevance order until REPORT_TOKEN_BUDGET is
+    used up. Conversations without a summary fall back to their raw previews.
+    """
+    header: List[str] = []
+    header.append(f"Generate a weekly executive summary for: {profile.display_name} ({profile.email})")
+    header.append("Use plain text, short sections, and be direct.")
+    header.append("")
+    header.append(f"Total conversations: {len(conversations)}")
+    header.append("")
+
+    footer: List[str] = []
+    footer.append("Output sections:")
+    footer.append("1) Key Wins")
+    footer.append("2) Risks and Blind Spots")
+    footer.append("3) Follow Ups Needed")
+    footer.append("4) Suggested Next Actions")
+
+    def render(item: Tuple[Conversation, ConversationSignals]) -> str:
+        conv, signals = item
+        tags = "".join(f" [{t}]" for t in signals.tags())
+        body = summaries.get(conv.conversation_id) or "\n".join(format_message_lines(conv))
+        return f"Conversation (messages={conv.count}){tags}:\n{body}\n"
+
+    packed, _ = pack(ranked, render, REPORT_TOKEN_BUDGET)
+
+    lines = list(header)
+    for i, (_, text) in enumerate(packed, start=1):
+        lines.append(text.replace("Conversation (", f"Conversation {i} (", 1))
+    # ranked may already be cut down to the summarized few; count against everything
+    omitted = len(conversations) - len(packed)
+    if omitted > 0:
+        lines.append(f"({omitted} lower-priority conversations omitted)")
+        lines.append("")
+    lines.extend(footer)
+    return "\n".join(lines)
 
-    raw_emails = get_recent_inbox_and_sent_emails(top=200, access_token=access_token)
-    filtered: List[Dict[str, Any]] = []
 
-    for msg in raw_emails:
-        dt_str = msg.get("receivedDateTime") or msg.get("sentDateTime")
-        if not dt_str:
-            continue
+def _select_for_summary(
+    ranked: List[Tuple[Conversation, ConversationSignals]],
+) -> List[Tuple[Conversation, ConversationSignals]]:
+    """
+    The top-ranked conversations whose summaries are expected to fit the report budget.
+    """
+    limit = max(1, REPORT_TOKEN_BUDGET // ESTIMATED_SUMMARY_TOKENS)
+    return ranked[: min(limit, MAX_CONVERSATIONS)]
 
-        cleaned = dt_str.replace("Z", "")
-        try:
-            msg_dt = datetime.fromisoformat(cleaned)
-        except Exception:
-            continue
 
-        if msg_dt >= cutoff:
-            filtered.append(msg)
+def _call_claude(prompt: str, max_tokens: int = 1400) -> str:
+    """
+    Final synthesis, on the large model.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    return model_router.complete("synthesize", messages, max_tokens=max_tokens)
 
-    return filtered
 
+def _stream_claude(prompt: str, max_tokens: int = 1400) -> Iterator[str]:
+    """
+    _call_claude, yielding text as it is generated. Shares its cache entries.
+    """
+    route = model_router.route_for("synthesize")
+    messages = [{"role": "user", "content": prompt}]
+    return llm_gateway.stream(route.provider, route.model, messages, max_tokens=max_tokens, temperature=0.0)
 
-def group_emails_into_conversations(emails: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    conv_map: Dict[str, List[Dict[str, Any]]] = {}
-    for msg in emails:
-        conv_id = msg.get("conversationId") or "no-conversation-id"
-        conv_map.setdefault(conv_id, []).append(msg)
 
-    conversations: List[Dict[str, Any]] = []
+class _ExtractionCounter:
+    """
+    Stage one summarize callable that counts escalations for the report.
+    """
 
-    for conv_id, msgs in conv_map.items():
-        def sort_key(m: Dict[str, Any]) -> str:
-            return m.get("sentDateTime") or m.get("receivedDateTime") or ""
+    def __init__(self) -> None:
+        self.escalated = 0
+        self._lock = threading.Lock()
 
-        msgs_sorted = sorted(msgs, key=sort_key)
-        conversations.append(
-            {
-                "conversation_id": conv_id,
-                "messages": msgs_sorted,
-                "count": len(msgs_sorted),
-            }
+    def __call__(self, prompt: str) -> str:
+        result = model_router.extract(
+            [{"role": "user", "content": prompt}],
+            max_tokens=CONVERSATION_SUMMARY_MAX_TOKENS,
         )
+        if result.escalated:
+            with self._lock:
+                self.escalated += 1
+        return result.text
 
-    conversations.sort(key=lambda c: c["count"], reverse=True)
-    return conversations
-
-
-def _format_prompt(profile: UserProfile, conversations: List[Dict[str, Any]]) -> str:
-    # Keep it simple and deterministic. You can expand later.
-    lines: List[str] = []
-    lines.append(f"Generate a weekly executive summary for: {profile.display_name} ({profile.email})")
-    lines.append("Use plain text, short sections, and be direct.")
-    lines.append("")
-    lines.append(f"Total conversations: {len(conversations)}")
-    lines.append("")
-
-    for i, conv in enumerate(conversations[:25], start=1):
-        lines.append(f"Conversation {i} (messages={conv['count']}):")
-        for m in conv["messages"][-5:]:
-            subj = m.get("subject", "")
-            prev = m.get("bodyPreview", "")
-            frm = (m.get("from") or {}).get("emailAddress", {}).get("address", "")
-            lines.append(f"- From: {frm} | Subject: {subj} | Preview: {prev}")
-        lines.append("")
-
-    lines.append("Output sections:")
-    lines.append("1) Key Wins")
-    lines.append("2) Risks and Blind Spots")
-    lines.append("3) Follow Ups Needed")
-    lines.append("4) Suggested Next Actions")
-    return "\n".join(lines)
-
-
-def _call_claude(prompt: str) -> str:
-    if not CLAUDE_API_KEY:
-        raise RuntimeError("Missing CLAUDE_API_KEY")
 
-    resp = claude_client.messages.create(
-        model=os.getenv("CLAUDE_MODEL", "claude-3-5-sonnet-latest"),
-        max_tokens=1400,
-        temperature=0.2,
-        messages=[{"role": "user", "content": prompt}],
-    )
-    return resp.content[0].text
-
-
-def generate_weekly_ai_report(user_id: str | None = None) -> Dict[str, Any]:
-    profile = _pick_profile(user_id)
+def collect_weekly_conversations(profile: UserProfile) -> List[Conversation]:
+    """
+    Graph phase of a weekly report: the last 7 days of mail, grouped by conversation.
+    """
     access_token = _get_delegated_access_token(profile)
+    emails = iter_emails_last_7_days(access_token=access_token, profile=profile)
+    return group_emails_into_conversations(emails)
+
+
+def report_fingerprint(conversations: List[Conversation]) -> str:
+    """
+    Identifies the input a weekly report is built from: every message's id,
+    time and content, plus the prompt/model settings that shape the output.
+    """
+    h = hashlib.sha256()
+    h.update(
+        json.dumps(
+            [
+                SUMMARY_PROMPT_VERSION,
+                str(model_router.route_for("extract")),
+                str(model_router.route_for("synthesize")),
+                REPORT_TOKEN_BUDGET,
+                MAX_CONVERSATIONS,
+            ]
+        ).encode("utf-8")
+    )
+    for conv in sorted(conversations, key=lambda c: c.conversation_id):
+        h.update(conv.conversation_id.encode("utf-8"))
+        for m in conv.messages:
+            h.update(f"\0{m.id}\0{m.sent_at}\0{m.subject}\0{m.preview}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _prepare_report(profile: UserProfile, conversations: List[Conversation]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Everything before the final synthesis call: compress, rank, summarize
+    each conversation on the extraction model (map, reusing stored
+    summaries) and build the reduce prompt.
+    Returns (prompt, report fields other than the text).
+    """
+    fingerprint = report_fingerprint(conversations)
+    conversations, compression = compress_conversations(conversations)
+    ranked = rank_conversations(profile.email, conversations)
+    selected = _select_for_summary(ranked)
+    extractor = _ExtractionCounter()
+    summaries, map_counts = summarize_conversations(
+        profile.user_id,
+        profile.email,
+        [conv for conv, _ in selected],
+        summarize=extractor,
+        model=str(model_router.route_for("extract")),
+    )
+    prune_summaries(profile.user_id, [c.conversation_id for c in conversations])
 
-    emails = fetch_emails_last_7_days(access_token=access_token)
-    conversations = group_emails_into_conversations(emails)
-
-    prompt = _format_prompt(profile, conversations)
-    report_text = _call_claude(prompt)
-
-    return {
+    prompt = _format_prompt(profile, conversations, selected, summaries)
+    meta = {
         "user_id": profile.user_id,
         "email": profile.email,
         "display_name": profile.display_name,
-        "generated_at": datetime.utcnow().isoformat(),
         "conversation_count": len(conversations),
-        "report_text": report_text,
+        "conversations_summarized": map_counts["summarized"],
+        "conversations_reused": map_counts["reused"],
+        "models": {
+            "extract": str(model_router.route_for("extract")),
+            "synthesize": str(model_router.route_for("synthesize")),
+            "escalated": extractor.escalated,
+        },
+        "prompt_tokens_estimate": count_tokens(prompt),
+        "compression": compression,
+        "input_fingerprint": fingerprint,
     }
+    return prompt, meta
 
 
-def generate_and_email_weekly_report(
-    to_addresses: List[str],
+def _finish_report(meta: Dict[str, Any], report_text: str) -> Dict[str, Any]:
+    report = dict(meta)
+    report["generated_at"] = datetime.utcnow().isoformat()
+    report["report_text"] = report_text
+    report["report_path"] = save_report(report)
+    return report
+
+
+def build_weekly_report(profile: UserProfile, conversations: List[Conversation]) -> Dict[str, Any]:
+    """
+    LLM phase of a weekly report: summarize each conversation (map), reusing
+    stored summaries for unchanged ones, then write the report from those (reduce).
+    """
+    prompt, meta = _prepare_report(profile, conversations)
+    return _finish_report(meta, _call_claude(prompt))
+
+
+def stream_weekly_ai_report(
     user_id: str | None = None,
+    profile: UserProfile | None = None,
+) -> Iterator[Tuple[str, Any]]:
+    """
+    generate_weekly_ai_report as (event, data) pairs for server-sent events:
+    `status` as each phase starts, `meta` once the prompt is ready, `token`
+    per chunk of report text, then `done` with the saved report.
+    """
+    profile = profile or pick_profile(user_id)
+    yield "status", {"stage": "collecting"}
+    conversations = collect_weekly_conversations(profile)
+    yield "status", {"stage": "summarizing", "conversations": len(conversations)}
+    prompt, meta = _prepare_report(profile, conversations)
+    yield "meta", meta
+
+    parts: List[str] = []
+    with closing(_stream_claude(prompt)) as chunks:
+        for chunk in chunks:
+            parts.append(chunk)
+            yield "token", {"text": chunk}
+    yield "done", _finish_report(meta, "".join(parts))
+
+
+def generate_weekly_ai_report(
+    user_id: str | None = None,
+    profile: UserProfile | None = None,
 ) -> Dict[str, Any]:
-    profile = _pick_profile(user_id)
-    access_token = _get_delegated_access_token(profile)
+    profile = profile or pick_profile(user_id)
+    conversations = collect_weekly_conversations(profile)
+    return build_weekly_report(profile, conversations)
 
-    report = generate_weekly_ai_report(user_id=profile.user_id)
-
-    subject = f"Weekly AI Report - {profile.display_name}"
-    body = report["report_text"]
 
+def email_weekly_report(
+    profile: UserProfile,
+    report: Dict[str, Any],
+    to_addresses: List[str],
+    send_individually: bool = False,
+) -> None:
     send_email(
-        subject=subject,
-        body_text=body,
+        subject=f"Weekly AI Report - {profile.display_name}",
+        body_text=report["report_text"],
         to_addresses=to_addresses,
-        access_token=access_token,
+        access_token=_get_delegated_access_token(profile),
+        individually=send_individually,
     )
 
+
+def find_reusable_report(
+    profile: UserProfile,
+    max_age_seconds: Optional[int] = None,
+) -> Tuple[Optional[Dict[str, Any]], Optional[List[Conversation]]]:
+    """
+    This week's latest report if it can be sent as is: either it is younger
+    than max_age_seconds (no Graph or LLM calls), or the mailbox still hashes
+    to the fingerprint it was built from (one delta sync, no LLM calls).
+    Returns (report or None, conversations collected for the check, if any)
+    so a caller that has to regenerate doesn't fetch mail twice.
+    """
+    max_age = REPORT_FRESH_SECONDS if max_age_seconds is None else max_age_seconds
+    latest = load_latest_report(profile.user_id, week_of(datetime.utcnow().isoformat()))
+    if latest is None:
+        return None, None
+    if report_age_seconds(latest) <= max_age:
+        return latest, None
+
+    conversations = collect_weekly_conversations(profile)
+    if latest.get("input_fingerprint") == report_fingerprint(conversations):
+        return latest, conversations
+    return None, conversations
+
+
+def generate_and_email_weekly_report(
+    to_addresses: List[str],
+    user_id: str | None = None,
+    send_individually: bool = False,
+    version_id: str | None = None,
+    max_age_seconds: int | None = None,
+) -> Dict[str, Any]:
+    """
+    Email a weekly report: the given version, else a reusable artifact from
+    this week, else a freshly generated one.
+    """
+    profile = pick_profile(user_id)
+    if version_id:
+        report = load_report(profile.user_id, version_id)
+        if report is None:
+            raise RuntimeError(f"No report version {version_id} for user_id={profile.user_id}")
+        reused = "version"
+    else:
+        report, conversations = find_reusable_report(profile, max_age_seconds)
+        reused = "artifact" if report else None
+        if report is None:
+            if conversations is None:
+                conversations = collect_weekly_conversations(profile)
+            report = build_weekly_report(profile, conversations)
+
+    email_weekly_report(profile, report, to_addresses, send_individually=send_individually)
+
     return {
         "ok": True,
         "sent_to": to_addresses,
         "report_user": {"user_id": profile.user_id, "email": profile.email},
+        "version_id": report.get("version_id"),
+        "reused": reused,
     }
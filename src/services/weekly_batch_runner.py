@@ -0,0 +1,119 @@
+# src/services/weekly_batch_runner.py
+
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.models.user_profile import UserProfile
+from src.services.user_profile_store import get_all_connected_users, get_user_profile_by_id
+from src.services.weekly_ai_engine import (
+    build_weekly_report,
+    collect_weekly_conversations,
+    email_weekly_report,
+)
+
+# Graph (mail sync, sendMail) and LLM calls have very different limits, so each gets its own pool
+GRAPH_CONCURRENCY = int(os.getenv("WEEKLY_BATCH_GRAPH_CONCURRENCY", "8"))
+LLM_CONCURRENCY = int(os.getenv("WEEKLY_BATCH_LLM_CONCURRENCY", "4"))
+
+
+def _resolve_users(user_ids: Optional[Sequence[str]]) -> Tuple[List[UserProfile], List[Dict[str, Any]]]:
+    if not user_ids:
+        return get_all_connected_users(), []
+
+    profiles: List[UserProfile] = []
+    missing: List[Dict[str, Any]] = []
+    for uid in user_ids:
+        p = get_user_profile_by_id(uid)
+        if p is None:
+            missing.append({"user_id": uid, "ok": False, "stage": "lookup", "error": "No user profile found"})
+        elif not p.outlook_connected:
+            missing.append({"user_id": uid, "ok": False, "stage": "lookup", "error": "User is not Outlook-connected"})
+        else:
+            profiles.append(p)
+    return profiles, missing
+
+
+def _failure(profile: UserProfile, stage: str, exc: BaseException, started: float) -> Dict[str, Any]:
+    return {
+        "user_id": profile.user_id,
+        "email": profile.email,
+        "ok": False,
+        "stage": stage,
+        "error": str(exc) or exc.__class__.__name__,
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+    }
+
+
+def iter_weekly_reports(
+    user_ids: Optional[Sequence[str]] = None,
+    send_to_self: bool = False,
+    graph_concurrency: int = GRAPH_CONCURRENCY,
+    llm_concurrency: int = LLM_CONCURRENCY,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Run the weekly report for many users and yield each result as soon as it finishes.
+
+    Each user goes through graph (mail sync + grouping) -> llm (summary) ->
+    optional send (report emailed to the user's own address). Graph and send
+    steps share the Graph pool, summaries run on the LLM pool, so a slow model
+    call never holds up mailbox syncs for other users. A failure only ends
+    that user's pipeline; it is yielded as {"ok": False, "stage", "error"}.
+    """
+    profiles, lookup_failures = _resolve_users(user_ids)
+    yield from lookup_failures
+    if not profiles:
+        return
+
+    started = time.monotonic()
+    graph_pool = ThreadPoolExecutor(max_workers=max(1, graph_concurrency), thread_name_prefix="batch-graph")
+    llm_pool = ThreadPoolExecutor(max_workers=max(1, llm_concurrency), thread_name_prefix="batch-llm")
+    pending: Dict[Future, Tuple[str, UserProfile, Dict[str, Any]]] = {}
+    try:
+        for p in profiles:
+            pending[graph_pool.submit(collect_weekly_conversations, p)] = ("graph", p, {})
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                stage, profile, report = pending.pop(fut)
+                try:
+                    value = fut.result()
+                except Exception as exc:
+                    yield _failure(profile, stage, exc, started)
+                    continue
+
+                if stage == "graph":
+                    pending[llm_pool.submit(build_weekly_report, profile, value)] = ("llm", profile, {})
+                elif stage == "llm" and send_to_self:
+                    send = graph_pool.submit(email_weekly_report, profile, value, [profile.email])
+                    pending[send] = ("send", profile, value)
+                else:
+                    result = report if stage == "send" else value
+                    yield {
+                        **result,
+                        "ok": True,
+                        "emailed": stage == "send",
+                        "elapsed_seconds": round(time.monotonic() - started, 3),
+                    }
+    finally:
+        # Also runs if the consumer stops early (e.g. the HTTP client disconnects)
+        graph_pool.shutdown(wait=False, cancel_futures=True)
+        llm_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_weekly_reports(
+    user_ids: Optional[Sequence[str]] = None,
+    send_to_self: bool = False,
+    graph_concurrency: int = GRAPH_CONCURRENCY,
+    llm_concurrency: int = LLM_CONCURRENCY,
+) -> Dict[str, Any]:
+    """
+    Collect iter_weekly_reports into a single summary.
+    """
+    results = list(iter_weekly_reports(user_ids, send_to_self, graph_concurrency, llm_concurrency))
+    ok = sum(1 for r in results if r.get("ok"))
+    return {"total": len(results), "succeeded": ok, "failed": len(results) - ok, "results": results}
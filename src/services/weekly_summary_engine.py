@@ -1,74 +1,229 @@
 # src/services/weekly_summary_engine.py
 
+import dataclasses
+import hashlib
+import json
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
+from . import model_router, report_store, upload_manifest
 from .openai_client import summarize_text  # we will define this in openai_client.py
+from .prompt_packer import chunk_documents, count_tokens, truncate_to_budget
+from .text_compression import CompressionStats, compress_text, dedupe_paragraphs
+from src.utils.file_storage import UPLOAD_FILES_DIR
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).resolve().parents[1]
-UPLOAD_DIR = BASE_DIR / "data" / "uploaded_files"
+UPLOAD_DIR = UPLOAD_FILES_DIR
 REPORTS_DIR = BASE_DIR / "data" / "reports"
 REPORTS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Files larger than this are reduced to extracted bullets on the small model first
+EXTRACT_MIN_TOKENS = int(os.getenv("UPLOAD_EXTRACT_MIN_TOKENS", "400"))
+EXTRACT_MAX_TOKENS = 500
+EXTRACT_CONCURRENCY = int(os.getenv("UPLOAD_EXTRACT_CONCURRENCY", "4"))
+
+# Token budget per summarize call when the week's files don't fit one prompt;
+# kept well above the 800-token summary size so each reduce level shrinks
+REPORT_CHUNK_TOKENS = max(2000, int(os.getenv("UPLOAD_REPORT_CHUNK_TOKENS", "6000")))
+REPORT_CONCURRENCY = int(os.getenv("UPLOAD_REPORT_CONCURRENCY", "4"))
+# Upper bound on reduce levels; 6000-token chunks of 800-token summaries
+# fan in 7 to 1, so real weeks finish in a few
+REPORT_MAX_ROUNDS = 8
+
+# Bump when the per-file summary pipeline changes so stored summaries are redone
+FILE_SUMMARY_VERSION = "1"
+
+EXTRACT_PROMPT = (
+    "Extract the facts from this file that matter for a weekly operations report "
+    "of a construction or service company: wins, problems and risks, subcontractor "
+    "or vendor issues, and time or cost saving opportunities.\n"
+    "Reply with at most 10 short bullet points starting with '- '. No preamble."
+)
+
+
+REPORT_PROMPT = (
+    "You are an operations analyst for a construction or service company.\n"
+    "You will receive raw notes, emails, and meeting transcripts combined "
+    "from the past week; longer files arrive as bullet extracts, and a large "
+    "week arrives as partial summaries of groups of files.\n\n"
+    "Write a concise weekly executive summary with sections:\n"
+    "1. Key wins\n"
+    "2. Problems and risks\n"
+    "3. Subcontractor or vendor issues (if any)\n"
+    "4. Time and cost saving opportunities\n\n"
+    "Use short bullet points under each heading. Avoid fluff."
+)
+
+PARTIAL_PROMPT = (
+    "You are an operations analyst for a construction or service company.\n"
+    "You will receive one part of the past week's notes, emails, meeting "
+    "transcripts or earlier partial summaries. Your summary will be merged "
+    "with summaries of the other parts.\n\n"
+    "Summarize this part under the headings Key wins, Problems and risks, "
+    "Subcontractor or vendor issues, and Time and cost saving opportunities. "
+    "Keep concrete names, dates, amounts and file names; leave out a heading "
+    "with nothing under it. Short bullet points only."
+)
+
+
+def _summary_key(content_hash: str) -> str:
+    """
+    What a stored per-file summary depends on: the file's content, the
+    extraction model and prompt, and the size threshold for extracting.
+    """
+    payload = json.dumps(
+        [FILE_SUMMARY_VERSION, content_hash, str(model_router.route_for("extract")), EXTRACT_MIN_TOKENS]
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _extract_file(name: str, text: str) -> Tuple[str, bool]:
+    """
+    Bullet extract of one large file; (text, extracted). Falls back to the
+    file's text if both models fail.
+    """
+    messages = [
+        {"role": "system", "content": EXTRACT_PROMPT},
+        {"role": "user", "content": f"File: {name}\n\n{text}"},
+    ]
+    try:
+        return model_router.extract(messages, max_tokens=EXTRACT_MAX_TOKENS).text, True
+    except Exception:
+        logger.exception("extraction failed for %s, sending the file as is", name)
+        return text, False
+
+
+def _summarize_file(entry: upload_manifest.ManifestEntry) -> bool:
+    """
+    Compress one file and, when it is large, reduce it to an extract; the
+    result is stored in the manifest. A failed extraction stores the
+    compressed text without a key so it is retried next time.
+    Returns whether the file was extracted.
+    """
+    compressed = compress_text(entry.text)
+    summary, extracted = compressed, False
+    needs_extract = count_tokens(compressed) >= EXTRACT_MIN_TOKENS
+    if needs_extract:
+        summary, extracted = _extract_file(entry.name, compressed)
+
+    stats = CompressionStats()
+    stats.add(entry.text, compressed)
+    key = _summary_key(entry.content_hash) if extracted or not needs_extract else None
+    entry.summary, entry.summary_key, entry.stats = summary, key, dataclasses.asdict(stats)
+    upload_manifest.set_summary(entry.name, entry.content_hash, summary, key, entry.stats)
+    return extracted
+
 
-def _load_uploaded_texts() -> List[str]:
+def _summarize_stale(entries: List[upload_manifest.ManifestEntry]) -> Tuple[int, int]:
     """
-    Load text from all files in the uploaded_files folder.
-    For now we handle .txt and .md. You can extend this later.
+    Summarize, in parallel, the entries whose stored summary is missing or
+    was made under a different key. Returns (summarized, extracted).
     """
-    if not UPLOAD_DIR.exists():
-        return []
-
-    texts: List[str] = []
-    for path in UPLOAD_DIR.iterdir():
-        if path.is_file() and path.suffix.lower() in {".txt", ".md"}:
-            try:
-                content = path.read_text(encoding="utf-8", errors="ignore")
-                if content.strip():
-                    texts.append(f"File: {path.name}\n\n{content}")
-            except Exception:
-                # Skip unreadable files for now
-                continue
-    return texts
-
-
-def generate_weekly_report() -> str:
+    stale = [e for e in entries if e.summary is None or e.summary_key != _summary_key(e.content_hash)]
+    if not stale:
+        return 0, 0
+    with ThreadPoolExecutor(max_workers=max(1, EXTRACT_CONCURRENCY)) as pool:
+        results = list(pool.map(_summarize_file, stale))
+    return len(stale), sum(1 for extracted in results if extracted)
+
+
+def _tree_summarize(texts: List[str]) -> Tuple[str, int]:
+    """
+    Executive summary of any number of file texts. Texts that fit one
+    prompt go out in a single call; otherwise they are chunked within
+    REPORT_CHUNK_TOKENS, each chunk is summarized in parallel, and the
+    partial summaries are chunked and summarized again until one chunk
+    remains, which gets the final prompt. Returns (summary, LLM rounds).
+
+    A level that doesn't reduce the chunk count (summaries as long as their
+    input), or running past REPORT_MAX_ROUNDS, forces the merge: every
+    partial is cut to an equal share of one chunk.
+    """
+    chunks = chunk_documents(texts, REPORT_CHUNK_TOKENS)
+    rounds = 1
+    with ThreadPoolExecutor(max_workers=max(1, REPORT_CONCURRENCY)) as pool:
+        while len(chunks) > 1:
+            partials = list(
+                pool.map(lambda chunk: summarize_text(prompt=PARTIAL_PROMPT, content=chunk), chunks)
+            )
+            logger.info("weekly upload report: reduced %d chunks", len(chunks))
+            rounds += 1
+            reduced = chunk_documents(partials, REPORT_CHUNK_TOKENS)
+            if len(reduced) >= len(chunks) or (len(reduced) > 1 and rounds >= REPORT_MAX_ROUNDS):
+                logger.warning("weekly upload report: %d chunks did not shrink, forcing the merge", len(reduced))
+                share = max(1, REPORT_CHUNK_TOKENS // len(partials) - 10)
+                reduced = ["\n\n".join(truncate_to_budget(p, share) for p in partials)]
+            chunks = reduced
+    return summarize_text(prompt=REPORT_PROMPT, content=chunks[0]), rounds
+
+
+def build_weekly_report(week: Optional[str] = None) -> Dict[str, Any]:
     """
     Build a real weekly report using OpenAI over uploaded files.
 
-    - Reads all text files from src/data/uploaded_files
-    - Sends them to OpenAI for summarization
+    - Syncs src/data/uploaded_files into the upload manifest; only new or
+      changed files are read
+    - Picks the files uploaded in `week` (ISO "2026-W42", default this week)
+    - Summarizes files without a current per-file summary: strips quoted
+      replies, signatures and disclaimers, and reduces large files to bullet
+      extracts on the small model
+    - Drops paragraphs repeated across files and summarizes the per-file
+      summaries with OpenAI, tree-reducing chunks when they don't fit one prompt
     - Writes the summary to src/data/reports/weekly_report.txt
-    - Returns the path as a string
+    - Returns the path, file counts and how much the compression stage saved
     """
-    texts = _load_uploaded_texts()
+    scanned = upload_manifest.scan(UPLOAD_DIR)
+    logger.info("upload manifest scan: %s", dataclasses.asdict(scanned))
+
+    week = week or report_store.week_of(datetime.utcnow().isoformat())
+    start, end = upload_manifest.week_bounds(week)
+    entries = [e for e in upload_manifest.entries_between(start, end) if e.text.strip()]
+    summarized, extracted = _summarize_stale(entries)
+    rounds = 0
+
+    stats = CompressionStats()
+    for entry in entries:
+        stats.bytes_before += entry.stats.get("bytes_before", 0)
+        stats.bytes_after += entry.stats.get("bytes_after", 0)
+        stats.tokens_before += entry.stats.get("tokens_before", 0)
+        stats.tokens_after += entry.stats.get("tokens_after", 0)
 
-    if not texts:
+    if not entries:
         summary = (
             "Weekly report\n\n"
-            "No uploaded files were found in src/data/uploaded_files, "
-            "so there is nothing to summarize this week."
+            "No files were uploaded to src/data/uploaded_files this week, "
+            "so there is nothing to summarize."
         )
     else:
-        joined = "\n\n\n---\n\n\n".join(texts)
-        prompt = (
-            "You are an operations analyst for a construction or service company.\n"
-            "You will receive raw notes, emails, and meeting transcripts combined "
-            "from the past week.\n\n"
-            "Write a concise weekly executive summary with sections:\n"
-            "1. Key wins\n"
-            "2. Problems and risks\n"
-            "3. Subcontractor or vendor issues (if any)\n"
-            "4. Time and cost saving opportunities\n\n"
-            "Use short bullet points under each heading. Avoid fluff."
-        )
-
-        summary = summarize_text(prompt=prompt, content=joined)
+        logger.info("weekly upload report compression: %s", stats.to_dict())
+        deduped = dedupe_paragraphs([entry.summary or "" for entry in entries])
+        texts = [f"File: {entry.name}\n\n{text}" for entry, text in zip(entries, deduped)]
+        summary, rounds = _tree_summarize(texts)
 
     report_path = REPORTS_DIR / "weekly_report.txt"
     report_path.write_text(summary, encoding="utf-8")
 
     # Return a path string relative to project root to keep it simple
     rel_path = os.path.relpath(report_path, BASE_DIR.parent)
-    return rel_path
+    return {
+        "path": rel_path,
+        "week": week,
+        "files": len(entries),
+        "files_summarized": summarized,
+        "compression": stats.to_dict(),
+        "files_extracted": extracted,
+        "summary_rounds": rounds,
+    }
+
+
+def generate_weekly_report(week: Optional[str] = None) -> str:
+    """
+    Same as build_weekly_report, returning only the report path.
+    """
+    return build_weekly_report(week)["path"]
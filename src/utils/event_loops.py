@@ -0,0 +1,82 @@
+# src/utils/event_loops.py
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import weakref
+from typing import Callable, Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class LoopWaiters:
+    """
+    Async waiters on state that threads also change. A coroutine registers a
+    future while holding the state's lock, releases the lock and awaits it;
+    whoever changes the state calls wake_all (also under the lock), which
+    resolves every registered future on its own loop. No polling, and it
+    works across threads and event loops.
+    """
+
+    def __init__(self) -> None:
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]] = []
+
+    def add(self) -> "asyncio.Future[None]":
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._waiters.append((loop, fut))
+        return fut
+
+    def discard(self, fut: "asyncio.Future[None]") -> None:
+        self._waiters = [(loop, f) for loop, f in self._waiters if f is not fut]
+
+    def wake_all(self) -> None:
+        waiters, self._waiters = self._waiters, []
+        for loop, fut in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, fut)
+            except RuntimeError:
+                # The waiter's loop is closed; nobody is left to wake
+                pass
+
+
+def _resolve(fut: "asyncio.Future[None]") -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+async def wait_woken(fut: "asyncio.Future[None]", timeout: Optional[float]) -> None:
+    """
+    Wait until the future is resolved by wake_all or the timeout passes.
+    """
+    await asyncio.wait({fut}, timeout=timeout)
+
+
+class PerLoop(Generic[T]):
+    """
+    One value per event loop (httpx async pools are loop-bound). Entries are
+    weakly keyed on the loop and dropped once their loop is closed, so
+    short-lived loops (asyncio.run in a worker thread) don't pile up clients.
+    """
+
+    def __init__(self) -> None:
+        self._values: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, T]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, factory: Callable[[], T], valid: Callable[[T], bool] = lambda value: True) -> T:
+        loop = asyncio.get_running_loop()
+        value = self._values.get(loop)
+        if value is None or not valid(value):
+            with self._lock:
+                value = self._values.get(loop)
+                if value is None or not valid(value):
+                    for old in [lp for lp in self._values if lp.is_closed()]:
+                        del self._values[old]
+                    value = factory()
+                    self._values[loop] = value
+        return value
+
+    def pop_current(self) -> Optional[T]:
+        with self._lock:
+            return self._values.pop(asyncio.get_running_loop(), None)
@@ -1,22 +1,295 @@
+import asyncio
+import hashlib
 import os
+import re
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Callable, Dict, List, Optional
+
 from fastapi import UploadFile
 
-BASE_UPLOAD_DIR = "/tmp/uploads"
+_SRC_DIR = Path(__file__).resolve().parents[1]
+
+# Content-addressed blobs: <store>/blobs/<sha[:2]>/<sha>
+UPLOAD_STORE_DIR = Path(os.getenv("UPLOAD_STORE_DIR", str(_SRC_DIR / "data" / "upload_store")))
+# Named entries the weekly upload report reads; hard links to the blobs
+UPLOAD_FILES_DIR = Path(os.getenv("UPLOAD_FILES_DIR", str(_SRC_DIR / "data" / "uploaded_files")))
+
+MAX_UPLOAD_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(512 * 1024 * 1024)))
+CHUNK_SIZE = 1024 * 1024
+
+# Archive uploads: member count, total unpacked size and parallel member writes
+ARCHIVE_MAX_MEMBERS = int(os.getenv("UPLOAD_ARCHIVE_MAX_MEMBERS", "10000"))
+ARCHIVE_MAX_BYTES = int(os.getenv("UPLOAD_ARCHIVE_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+ARCHIVE_WRITE_CONCURRENCY = int(os.getenv("UPLOAD_ARCHIVE_CONCURRENCY", "4"))
+
+_TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+@dataclass
+class StoredFile:
+    name: str
+    path: str
+    sha256: str
+    size: int
+    deduplicated: bool
+    source: str = ""
+
+
+@dataclass
+class BulkResult:
+    stored: List[StoredFile] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    failed: List[Dict[str, str]] = field(default_factory=list)
+
+    def merge(self, other: "BulkResult") -> None:
+        self.stored.extend(other.stored)
+        self.skipped.extend(other.skipped)
+        self.failed.extend(other.failed)
+
 
 def ensure_upload_dir():
-    if not os.path.exists(BASE_UPLOAD_DIR):
-        os.makedirs(BASE_UPLOAD_DIR, exist_ok=True)
+    (UPLOAD_STORE_DIR / "tmp").mkdir(parents=True, exist_ok=True)
+    UPLOAD_FILES_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def blob_path(sha256: str) -> Path:
+    return UPLOAD_STORE_DIR / "blobs" / sha256[:2] / sha256
+
+
+def entry_name(filename: str, sha256: str) -> str:
+    """
+    Name in UPLOAD_FILES_DIR: the sanitised original name plus a short
+    content hash, so same-named uploads with different content don't
+    overwrite each other and identical ones land on the same entry.
+    """
+    base = Path(filename.replace("\\", "/")).name
+    stem, suffix = os.path.splitext(base)
+    stem = _UNSAFE_RE.sub("_", stem).strip("._") or "upload"
+    suffix = _UNSAFE_RE.sub("", suffix).lower()
+    return f"{stem[:100]}.{sha256[:8]}{suffix}"
+
 
-def save_file(file: UploadFile) -> str:
+def _link(blob: Path, target: Path) -> None:
+    if target.exists() and os.path.samefile(blob, target):
+        return
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    try:
+        os.link(blob, tmp)
+    except OSError:
+        # Different filesystem or no hard links; fall back to a copy
+        shutil.copyfile(blob, tmp)
+    os.replace(tmp, target)
+
+
+def store_stream(src: BinaryIO, filename: str, max_bytes: int = MAX_UPLOAD_BYTES) -> StoredFile:
     """
-    Save an uploaded file to /tmp/uploads on Render.
-    Returns the full path of the saved file.
+    Copy a binary stream into the upload store in CHUNK_SIZE pieces,
+    hashing as it goes. The data lands in a temp file and is renamed into
+    place, so readers never see a partial file; content already in the
+    store is not written twice. Raises UploadTooLarge past max_bytes.
+    Blocking; call from a worker thread in async code.
     """
     ensure_upload_dir()
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=UPLOAD_STORE_DIR / "tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"{filename} is larger than {max_bytes} bytes")
+                digest.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+
+        sha256 = digest.hexdigest()
+        blob = blob_path(sha256)
+        deduplicated = blob.exists()
+        if deduplicated:
+            os.unlink(tmp)
+            # Counts as uploaded now for the weekly report
+            os.utime(blob)
+        else:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, blob)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
 
-    file_path = os.path.join(BASE_UPLOAD_DIR, file.filename)
+    target = UPLOAD_FILES_DIR / entry_name(filename, sha256)
+    _link(blob, target)
+    return StoredFile(
+        name=target.name,
+        path=str(target),
+        sha256=sha256,
+        size=size,
+        deduplicated=deduplicated,
+        source=filename,
+    )
 
-    with open(file_path, "wb") as f:
-        f.write(file.file.read())
 
-    return file_path
+async def save_file(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> StoredFile:
+    """
+    Save an uploaded file into the upload store without blocking the
+    event loop. Memory use is one chunk regardless of the file's size.
+    """
+    return await asyncio.to_thread(store_stream, file.file, file.filename or "upload", max_bytes)
+
+
+def archive_kind(filename: str) -> Optional[str]:
+    name = filename.lower()
+    if name.endswith(".zip"):
+        return "zip"
+    if name.endswith(_TAR_SUFFIXES):
+        return "tar"
+    return None
+
+
+def _member_filename(member_name: str) -> str:
+    # Keep the folder path in the name ("site-a/notes.txt" -> "site-a_notes.txt")
+    parts = [p for p in PurePosixPath(member_name.replace("\\", "/")).parts if p not in ("/", ".", "..")]
+    return "_".join(parts)
+
+
+class _ArchiveBudget:
+    def __init__(self, archive: str) -> None:
+        self.archive = archive
+        self.members = 0
+        self.bytes = 0
+
+    def admit(self, size: int) -> None:
+        self.members += 1
+        self.bytes += max(0, size)
+        if self.members > ARCHIVE_MAX_MEMBERS:
+            raise UploadTooLarge(f"{self.archive} has more than {ARCHIVE_MAX_MEMBERS} files")
+        if self.bytes > ARCHIVE_MAX_BYTES:
+            raise UploadTooLarge(f"{self.archive} unpacks to more than {ARCHIVE_MAX_BYTES} bytes")
+
+
+def _unpack_zip(
+    src: BinaryIO,
+    accept: Callable[[str], bool],
+    budget: _ArchiveBudget,
+    store_member: Callable[[str, Callable[[], BinaryIO]], None],
+    result: BulkResult,
+) -> None:
+    # zipfile needs a seekable file; uploads are spooled to disk, not memory
+    with zipfile.ZipFile(src) as archive:
+        members = []
+        for info in archive.infolist():
+            name = _member_filename(info.filename)
+            if info.is_dir() or not name:
+                continue
+            if not accept(name):
+                result.skipped.append(info.filename)
+                continue
+            budget.admit(info.file_size)
+            members.append((name, info))
+        with ThreadPoolExecutor(max_workers=max(1, ARCHIVE_WRITE_CONCURRENCY)) as pool:
+            list(pool.map(lambda item: store_member(item[0], lambda: archive.open(item[1])), members))
+
+
+def _unpack_tar(
+    src: BinaryIO,
+    accept: Callable[[str], bool],
+    budget: _ArchiveBudget,
+    store_member: Callable[[str, Callable[[], BinaryIO]], None],
+    result: BulkResult,
+) -> None:
+    with tarfile.open(fileobj=src, mode="r|*") as archive:
+        for info in archive:
+            name = _member_filename(info.name)
+            if not info.isfile() or not name:
+                continue
+            if not accept(name):
+                result.skipped.append(info.name)
+                continue
+            budget.admit(info.size)
+            store_member(name, lambda: archive.extractfile(info))
+
+
+def store_archive(
+    src: BinaryIO,
+    filename: str,
+    accept: Callable[[str], bool] = lambda name: True,
+    on_stored: Optional[Callable[[StoredFile], None]] = None,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+) -> BulkResult:
+    """
+    Unpack a zip or tar upload straight into the upload store, one member
+    stream at a time; the archive itself is never read into memory.
+    Members that `accept` rejects are skipped. `on_stored` runs for each
+    member as soon as it is stored.
+    Tar members stream in archive order (tar can't be read out of order);
+    zip members are read and written in parallel. Blocking.
+    """
+    result = BulkResult()
+    budget = _ArchiveBudget(filename)
+
+    def store_member(name: str, opener: Callable[[], BinaryIO]) -> None:
+        try:
+            with opener() as member:
+                stored = store_stream(member, name, max_bytes)
+        except Exception as exc:
+            # A bad member (unsupported compression, corrupt data, too big)
+            # fails on its own; the rest of the archive still lands
+            result.failed.append({"name": name, "error": str(exc) or type(exc).__name__})
+            return
+        stored.source = f"{filename}/{name}"
+        result.stored.append(stored)
+        if on_stored:
+            on_stored(stored)
+
+    try:
+        if archive_kind(filename) == "zip":
+            _unpack_zip(src, accept, budget, store_member, result)
+        else:
+            _unpack_tar(src, accept, budget, store_member, result)
+    except Exception as exc:
+        # Members stored before the archive turned out bad or too big are kept
+        result.failed.append({"name": filename, "error": str(exc) or type(exc).__name__})
+    return result
+
+
+def store_upload(
+    src: BinaryIO,
+    filename: str,
+    accept: Callable[[str], bool] = lambda name: True,
+    on_stored: Optional[Callable[[StoredFile], None]] = None,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+) -> BulkResult:
+    """
+    One part of a bulk upload: archives are unpacked with store_archive;
+    anything else goes through the same `accept` filter as archive members
+    and is stored as is.
+    """
+    if archive_kind(filename):
+        return store_archive(src, filename, accept, on_stored, max_bytes)
+    result = BulkResult()
+    if not accept(filename):
+        result.skipped.append(filename)
+        return result
+    try:
+        stored = store_stream(src, filename, max_bytes)
+    except Exception as exc:
+        result.failed.append({"name": filename, "error": str(exc) or type(exc).__name__})
+        return result
+    result.stored.append(stored)
+    if on_stored:
+        on_stored(stored)
+    return result
@@ -9,3 +9,15 @@ def create_token(data: dict):
         "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=12)
     }
     return jwt.encode(payload, SECRET, algorithm="HS256")
+
+
+def unverified_claims(token: str) -> dict:
+    """
+    Read a JWT's claims without verifying its signature.
+    Only for routing decisions (tenant id, object id) on tokens Microsoft issued to us.
+    Returns {} for opaque or malformed tokens.
+    """
+    try:
+        return jwt.decode(token, options={"verify_signature": False})
+    except jwt.PyJWTError:
+        return {}
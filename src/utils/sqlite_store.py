@@ -0,0 +1,53 @@
+# src/utils/sqlite_store.py
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready: set = set()
+
+
+def connect(path: Path, schema: str = "") -> sqlite3.Connection:
+    """
+    Thread-local connection to a SQLite file in WAL mode, so several worker
+    processes can read while one writes. `schema` (CREATE ... IF NOT EXISTS
+    statements) runs once per file per process.
+    """
+    conns: Dict[str, sqlite3.Connection] = getattr(_local, "conns", None) or {}
+    _local.conns = conns
+    key = str(path)
+    conn = conns.get(key)
+    if conn is None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(key, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conns[key] = conn
+
+    if schema:
+        with _schema_lock:
+            if (key, schema) not in _schema_ready:
+                conn.executescript(schema)
+                _schema_ready.add((key, schema))
+    return conn
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """
+    BEGIN IMMEDIATE ... COMMIT: takes the write lock up front so concurrent
+    read-modify-write cycles from other processes can't interleave.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
@@ -0,0 +1,77 @@
+# src/utils/sse.py
+
+from __future__ import annotations
+
+import json
+from typing import Any, AsyncIterator, Iterable, Iterator, Tuple
+
+import anyio
+from fastapi.responses import StreamingResponse
+from starlette.types import Send
+
+# Stop proxies (nginx) from buffering the stream and clients from caching it
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_event(event: str, data: Any) -> str:
+    """
+    One server-sent event. Data is JSON so token chunks keep their newlines.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class _Exhausted(Exception):
+    pass
+
+
+def _next(events: Iterator[Tuple[str, Any]]) -> Tuple[str, Any]:
+    try:
+        return next(events)
+    except StopIteration:
+        raise _Exhausted from None
+
+
+async def _render(events: Iterable[Tuple[str, Any]]) -> AsyncIterator[str]:
+    """
+    Drive the blocking producer on worker threads. Whatever ends the
+    stream (done, error, client gone), the producer is closed, so an LLM
+    stream inside it hands back its gateway slot straight away.
+    """
+    it = iter(events)
+    try:
+        # Opening comment flushes headers and a first byte before any slow work starts
+        yield ": stream open\n\n"
+        while True:
+            try:
+                event, data = await anyio.to_thread.run_sync(_next, it)
+            except _Exhausted:
+                break
+            except Exception as exc:
+                yield format_event("error", {"detail": str(exc)})
+                break
+            yield format_event(event, data)
+    finally:
+        close = getattr(it, "close", None)
+        if close is not None:
+            with anyio.CancelScope(shield=True):
+                await anyio.to_thread.run_sync(close)
+
+
+class _EventStreamResponse(StreamingResponse):
+    async def stream_response(self, send: Send) -> None:
+        try:
+            await super().stream_response(send)
+        finally:
+            # On a disconnect Starlette abandons the body iterator mid-stream;
+            # close it now rather than whenever it is garbage collected
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()
+
+
+def sse_response(events: Iterable[Tuple[str, Any]]) -> StreamingResponse:
+    """
+    StreamingResponse over (event, data) pairs. An exception raised by the
+    producer is sent as a final `error` event; the producer is closed when
+    the client disconnects.
+    """
+    return _EventStreamResponse(_render(events), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,21 @@
+import os
+import tempfile
+
+# Point every on-disk store at a scratch directory before src modules read
+# their settings at import time.
+_DATA_DIR = tempfile.mkdtemp(prefix="boat-ai-tests-")
+for _name, _file in {
+    "USER_PROFILE_DB": "user_profiles.sqlite3",
+    "MAIL_CACHE_DIR": "mail_cache",
+    "LLM_CACHE_PATH": "llm_cache.sqlite3",
+    "CONVERSATION_SUMMARY_DB": "conversation_summaries.sqlite3",
+    "UPLOAD_MANIFEST_DB": "upload_manifest.sqlite3",
+    "UPLOAD_TEXT_CACHE_DB": "extracted_texts.sqlite3",
+    "UPLOAD_STORE_DIR": "upload_store",
+    "UPLOAD_FILES_DIR": "uploaded_files",
+    "WEEKLY_REPORT_STORE_DIR": "reports",
+    "JOB_DB_PATH": "jobs.sqlite3",
+}.items():
+    os.environ.setdefault(_name, os.path.join(_DATA_DIR, _file))
+
+os.environ.setdefault("DELEGATED_TOKEN_REFRESHER_ENABLED", "0")
@@ -0,0 +1,137 @@
+"""
+In-process Microsoft Graph stand-in for mail delta sync.
+
+Mount it on a requests.Session and install that session with
+graph_transport.set_session. It serves folder delta queries (paged with
+nextLink, ending in a deltaLink), delta rounds from a stored deltaLink
+(adds, updates and @removed tombstones), 410 for expired sync state, and
+JSON $batch.
+"""
+
+import json
+import urllib.parse
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.services.graph_transport import GRAPH_URL as GRAPH_ROOT
+
+_ROOT_PATH = urllib.parse.urlsplit(GRAPH_ROOT).path
+
+
+class FakeGraph(HTTPAdapter):
+    def __init__(self, page_size: int = 2) -> None:
+        super().__init__()
+        self.page_size = page_size
+        self.messages: Dict[str, Dict[str, Dict[str, Any]]] = {"Inbox": {}, "SentItems": {}}
+        # Per-folder change log: (sequence number, message id)
+        self.changes: Dict[str, List[Tuple[int, str]]] = {"Inbox": [], "SentItems": []}
+        self.removed: Dict[str, set] = {"Inbox": set(), "SentItems": set()}
+        self.seq = 0
+        # Bumped to invalidate every deltaLink issued so far
+        self.epoch = 0
+        self.requests: List[Tuple[str, str]] = []
+
+    # -- test controls -----------------------------------------------------
+
+    def _log(self, folder: str, msg_id: str) -> None:
+        self.seq += 1
+        self.changes[folder].append((self.seq, msg_id))
+
+    def add(self, folder: str, msg: Dict[str, Any]) -> None:
+        self.messages[folder][msg["id"]] = dict(msg)
+        self.removed[folder].discard(msg["id"])
+        self._log(folder, msg["id"])
+
+    def update(self, folder: str, msg_id: str, **fields: Any) -> None:
+        self.messages[folder][msg_id].update(fields)
+        self._log(folder, msg_id)
+
+    def remove(self, folder: str, msg_id: str) -> None:
+        del self.messages[folder][msg_id]
+        self.removed[folder].add(msg_id)
+        self._log(folder, msg_id)
+
+    def expire_delta_links(self) -> None:
+        """
+        Every deltaLink handed out so far now answers 410 Gone.
+        """
+        self.epoch += 1
+
+    def paths(self) -> List[str]:
+        return [path for _, path in self.requests]
+
+    # -- Graph -------------------------------------------------------------
+
+    def _delta_link(self, folder: str) -> str:
+        return f"{GRAPH_ROOT}/me/mailFolders/{folder}/messages/delta?$deltatoken={self.epoch}.{self.seq}"
+
+    def _delta(self, folder: str, query: Dict[str, str]) -> Tuple[int, Any]:
+        token = query.get("$deltatoken")
+        if token is not None:
+            epoch, since = (int(x) for x in token.split("."))
+            if epoch != self.epoch:
+                return 410, {"error": {"code": "SyncStateNotFound"}}
+            changed = []
+            for msg_id in dict.fromkeys(mid for seq, mid in self.changes[folder] if seq > since):
+                if msg_id in self.removed[folder]:
+                    changed.append({"id": msg_id, "@removed": {"reason": "deleted"}})
+                else:
+                    changed.append(dict(self.messages[folder][msg_id]))
+            return 200, {"value": changed, "@odata.deltaLink": self._delta_link(folder)}
+
+        # Initial round: every live message, page_size at a time
+        ordered = list(self.messages[folder].values())
+        skip = int(query.get("$skiptoken", 0))
+        body: Dict[str, Any] = {"value": ordered[skip:skip + self.page_size]}
+        if skip + self.page_size < len(ordered):
+            body["@odata.nextLink"] = (
+                f"{GRAPH_ROOT}/me/mailFolders/{folder}/messages/delta?$skiptoken={skip + self.page_size}"
+            )
+        else:
+            body["@odata.deltaLink"] = self._delta_link(folder)
+        return 200, body
+
+    def handle(self, method: str, url: str) -> Tuple[int, Any]:
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path
+        if path.startswith(_ROOT_PATH):
+            path = path[len(_ROOT_PATH):]
+        self.requests.append((method, path + (f"?{parts.query}" if parts.query else "")))
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        segments = path.strip("/").split("/")
+        # /me/mailFolders/<folder>/messages/delta
+        if method == "GET" and len(segments) == 5 and segments[1] == "mailFolders" and segments[4] == "delta":
+            return self._delta(segments[2], query)
+        return 404, {"error": {"code": "NotFound", "message": path}}
+
+    def _batch(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        responses = []
+        for sub in body.get("requests", []):
+            status, payload = self.handle(sub["method"], GRAPH_ROOT + sub["url"])
+            responses.append({"id": sub["id"], "status": status, "headers": {}, "body": payload})
+        # Graph does not promise response order
+        return {"responses": list(reversed(responses))}
+
+    def send(self, request, **kwargs) -> requests.Response:
+        if request.method == "POST" and request.path_url.endswith("/$batch"):
+            status, payload = 200, self._batch(json.loads(request.body))
+        else:
+            status, payload = self.handle(request.method, request.url)
+
+        resp = requests.Response()
+        resp.status_code = status
+        resp.headers["Content-Type"] = "application/json"
+        resp._content = json.dumps(payload).encode("utf-8")
+        resp.url = request.url
+        resp.request = request
+        return resp
+
+
+def graph_session(fake: Optional[FakeGraph] = None) -> Tuple[requests.Session, FakeGraph]:
+    fake = fake or FakeGraph()
+    session = requests.Session()
+    session.mount("https://", fake)
+    session.mount("http://", fake)
+    return session, fake
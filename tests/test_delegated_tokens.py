@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from src.models.user_profile import UserProfile
+from src.services import delegated_tokens
+from src.services.user_profile_store import (
+    claim_token_refresh,
+    get_user_profile,
+    release_token_refresh,
+    save_user_profile,
+    update_user_profile,
+)
+
+
+@pytest.fixture
+def expiring_user(monkeypatch):
+    calls = []
+
+    def fake_refresh(refresh_token):
+        calls.append(refresh_token)
+        return {"access_token": f"new-{len(calls)}", "refresh_token": "rt-2", "expires_in": 3600}
+
+    monkeypatch.setattr(delegated_tokens, "refresh_access_token", fake_refresh)
+    monkeypatch.setattr(delegated_tokens, "CLAIM_POLL_SECONDS", 0.05)
+    user_id = f"user-{time.monotonic_ns()}"
+    save_user_profile(UserProfile(
+        user_id=user_id, email=f"{user_id}@example.com", display_name="Skipper", tenant_id="t",
+        outlook_connected=True,
+        outlook_tokens={"access_token": "old", "refresh_token": "rt-1", "expires_at": int(time.time()) + 10},
+    ))
+    return user_id, calls
+
+
+def test_refresh_is_claimed_once_across_owners(expiring_user):
+    user_id, calls = expiring_user
+    needed = lambda p: p.outlook_tokens["access_token"] == "old"
+
+    _, first = claim_token_refresh(user_id, "worker-a", 60, needed)
+    _, second = claim_token_refresh(user_id, "worker-b", 60, needed)
+    assert (first, second) == (True, False)
+
+    release_token_refresh(user_id, "worker-a")
+    _, after_release = claim_token_refresh(user_id, "worker-b", 60, needed)
+    assert after_release
+
+
+def test_waits_for_another_process_and_reuses_its_tokens(expiring_user):
+    user_id, calls = expiring_user
+    # Another worker process holds the claim and is mid-refresh
+    claim_token_refresh(user_id, "other-worker", 60, lambda p: True)
+
+    def other_worker_finishes():
+        time.sleep(0.2)
+        record = delegated_tokens.build_token_record({"access_token": "theirs", "refresh_token": "rt-2"})
+        update_user_profile(user_id, lambda p: setattr(p, "outlook_tokens", record))
+        release_token_refresh(user_id, "other-worker")
+
+    t = threading.Thread(target=other_worker_finishes)
+    t.start()
+    tokens = delegated_tokens.refresh_user_tokens(user_id)
+    t.join()
+
+    assert tokens["access_token"] == "theirs"
+    assert calls == []
+
+
+def test_background_sweep_skips_a_user_claimed_elsewhere(expiring_user):
+    user_id, calls = expiring_user
+    claim_token_refresh(user_id, "other-worker", 60, lambda p: True)
+
+    assert delegated_tokens.refresh_user_tokens(user_id, min_validity=900, wait=False) is None
+    assert calls == []
+
+    release_token_refresh(user_id, "other-worker")
+    tokens = delegated_tokens.refresh_user_tokens(user_id)
+    assert tokens["access_token"] == "new-1"
+    assert get_user_profile(user_id).outlook_tokens["refresh_token"] == "rt-2"
@@ -0,0 +1,48 @@
+import io
+import struct
+import zipfile
+
+import pytest
+
+from src.utils import file_storage
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_storage, "UPLOAD_STORE_DIR", tmp_path / "store")
+    monkeypatch.setattr(file_storage, "UPLOAD_FILES_DIR", tmp_path / "files")
+    return tmp_path / "files"
+
+
+def _accept_text(name: str) -> bool:
+    return name.endswith((".txt", ".md"))
+
+
+def _zip_with_unsupported_member() -> io.BytesIO:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        z.writestr("site/good.txt", "slab poured")
+        z.writestr("site/bad.txt", "compressed with something exotic")
+    data = bytearray(buf.getvalue())
+    # Mark bad.txt as compression method 99 in both headers
+    with zipfile.ZipFile(io.BytesIO(bytes(data))) as z:
+        local = z.getinfo("site/bad.txt").header_offset
+    struct.pack_into("<H", data, local + 8, 99)
+    central = data.rfind(b"PK\x01\x02")
+    struct.pack_into("<H", data, central + 10, 99)
+    return io.BytesIO(bytes(data))
+
+
+def test_bad_archive_member_is_reported_and_the_rest_is_stored():
+    result = file_storage.store_upload(_zip_with_unsupported_member(), "site.zip", _accept_text)
+
+    assert [s.source for s in result.stored] == ["site.zip/site_good.txt"]
+    assert [f["name"] for f in result.failed] == ["site_bad.txt"]
+
+
+def test_loose_files_go_through_the_accept_filter():
+    skipped = file_storage.store_upload(io.BytesIO(b"\xff\xd8"), "photo.jpg", _accept_text)
+    kept = file_storage.store_upload(io.BytesIO(b"notes"), "notes.txt", _accept_text)
+
+    assert skipped.skipped == ["photo.jpg"] and not skipped.stored
+    assert [s.source for s in kept.stored] == ["notes.txt"]
@@ -0,0 +1,51 @@
+import asyncio
+import gc
+
+from src.services import graph_throttle, graph_transport
+
+
+def test_cancelled_async_acquire_does_not_leak_a_slot():
+    limiter = graph_throttle.AdaptiveLimiter(initial=1, minimum=1, maximum=1)
+
+    async def scenario():
+        limiter.acquire()  # the only slot is busy
+        waiter = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        limiter.release()
+        assert limiter.in_flight == 0
+        assert await limiter.acquire_async() >= 0
+        limiter.release()
+
+    asyncio.run(scenario())
+
+
+def test_async_waiter_is_woken_by_a_release_from_another_thread():
+    limiter = graph_throttle.AdaptiveLimiter(initial=1, minimum=1, maximum=1)
+
+    async def scenario():
+        limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+
+        await asyncio.to_thread(limiter.release)
+        await asyncio.wait_for(waiter, timeout=1)
+        assert limiter.in_flight == 1
+        limiter.release()
+
+    asyncio.run(scenario())
+
+
+def test_async_clients_of_finished_loops_are_dropped():
+    async def use_client():
+        return id(graph_transport.get_async_client())
+
+    for _ in range(3):
+        asyncio.run(use_client())
+    gc.collect()
+    # A new loop prunes clients left behind by closed ones
+    asyncio.run(use_client())
+    assert len(graph_transport._async_clients._values) <= 1
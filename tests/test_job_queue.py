@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+
+import pytest
+
+from src.services import job_queue as jq
+
+
+@pytest.fixture
+def queue():
+    q = jq.JobQueue(workers=1)
+    yield q
+    q.shutdown(wait=True)
+
+
+def _insert_running(owner):
+    job_id = uuid.uuid4().hex
+    jq._connect().execute(
+        "INSERT INTO jobs (id, kind, dedupe_key, params, status, owner, created_at, started_at) "
+        "VALUES (?, 'report', ?, ?, 'running', ?, ?, ?)",
+        (job_id, uuid.uuid4().hex, json.dumps({}), owner, time.time(), time.time()),
+    )
+    return job_id
+
+
+def test_job_of_a_dead_process_with_a_reused_pid_is_failed(queue):
+    # An earlier container whose worker had the same PID as this one
+    job_id = _insert_running(f"{socket.gethostname()}:{os.getpid()}:previousboot")
+
+    assert queue.recover_interrupted() >= 1
+    job = jq.get_job(job_id)
+    assert (job["status"], job["error"]) == ("failed", "interrupted")
+
+
+def test_job_of_a_live_worker_is_left_alone(queue):
+    owner = "other-host:7:liveworker"
+    jq._connect().execute(
+        "INSERT OR REPLACE INTO job_owners (owner, heartbeat_at) VALUES (?, ?)", (owner, time.time())
+    )
+    job_id = _insert_running(owner)
+
+    queue.recover_interrupted()
+    assert jq.get_job(job_id)["status"] == "running"
+
+
+def test_job_ending_in_base_exception_is_marked_failed(queue):
+    def handler(**params):
+        raise SystemExit(1)
+
+    queue.register("exits", handler)
+    job, _ = queue.submit("exits", {"n": uuid.uuid4().hex})
+
+    deadline = time.time() + 5
+    while jq.get_job(job["id"])["status"] in jq.IN_FLIGHT and time.time() < deadline:
+        time.sleep(0.01)
+    job = jq.get_job(job["id"])
+    assert (job["status"], job["error"]) == ("failed", "interrupted")
+
+
+def _insert_in_flight(owner, kind, params, heartbeat_at=None):
+    conn = jq._connect()
+    if heartbeat_at is not None:
+        conn.execute("INSERT OR REPLACE INTO job_owners (owner, heartbeat_at) VALUES (?, ?)", (owner, heartbeat_at))
+    job_id = uuid.uuid4().hex
+    conn.execute(
+        "INSERT INTO jobs (id, kind, dedupe_key, params, status, owner, created_at) "
+        "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+        (job_id, kind, jq.dedupe_key(kind, params), json.dumps(params), owner, time.time()),
+    )
+    return job_id
+
+
+def test_submit_replaces_a_job_left_by_the_previous_process_after_a_quick_restart(queue):
+    queue.register("report", lambda **params: "done")
+    params = {"user_id": uuid.uuid4().hex}
+    # The previous container's worker: same host and PID, heartbeat seconds old
+    stale = _insert_in_flight(f"{socket.gethostname()}:{os.getpid()}:previousboot", "report", params, time.time())
+
+    job, created = queue.submit("report", params)
+
+    assert created and job["id"] != stale
+    assert jq.get_job(stale)["status"] == "failed"
+
+
+def test_start_recovers_and_runs_the_heartbeat(queue):
+    stale = _insert_in_flight(f"{socket.gethostname()}:{os.getpid()}:previousboot", "report", {"n": 1})
+
+    queue.start()
+
+    assert jq.get_job(stale)["status"] == "failed"
+    assert queue._heartbeat is not None and queue._heartbeat.is_alive()
+
+
+def test_shutdown_fails_jobs_no_worker_started(queue):
+    import threading
+
+    gate = threading.Event()
+    queue.register("slow", lambda **params: gate.wait(5))
+    running, _ = queue.submit("slow", {"n": uuid.uuid4().hex})
+    queued, _ = queue.submit("slow", {"n": uuid.uuid4().hex})
+
+    queue.shutdown()
+    gate.set()
+
+    job = jq.get_job(queued["id"])
+    assert (job["status"], job["error"]) == ("failed", "interrupted")
+
+
+def test_wait_gives_up_at_its_deadline(queue):
+    job_id = _insert_in_flight("other-host:7:liveworker", "report", {"n": uuid.uuid4().hex}, time.time())
+
+    job = asyncio.run(queue.wait(job_id, poll_seconds=0.01, timeout=0.1))
+
+    assert job["status"] == "queued"
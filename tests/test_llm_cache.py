@@ -0,0 +1,49 @@
+import pytest
+
+from src.services import llm_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "CACHE_PATH", tmp_path / "llm_cache.sqlite3")
+    monkeypatch.setattr(llm_cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_cache, "MAX_TEMPERATURE", 0.0)
+    return llm_cache
+
+
+def _complete(cache, temperature, answers):
+    params = {"max_tokens": 200, "temperature": temperature}
+    messages = [{"role": "user", "content": "Name a boat"}]
+    return cache.cached_completion("anthropic", "haiku", params, messages, lambda: answers.pop(0))
+
+
+def test_sampled_requests_are_not_replayed(cache):
+    answers = ["Sea Breeze", "Wave Dancer"]
+    assert _complete(cache, 0.7, answers) == "Sea Breeze"
+    assert _complete(cache, 0.7, answers) == "Wave Dancer"
+
+
+def test_deterministic_requests_are_cached(cache):
+    answers = ["Sea Breeze", "Wave Dancer"]
+    assert _complete(cache, 0.0, answers) == "Sea Breeze"
+    assert _complete(cache, 0.0, answers) == "Sea Breeze"
+
+
+def test_missing_temperature_counts_as_sampled():
+    assert not llm_cache.is_cacheable({"max_tokens": 10})
+
+
+def test_size_is_checked_every_n_writes(cache, monkeypatch):
+    monkeypatch.setattr(cache, "MAX_ENTRIES", 10)
+    monkeypatch.setattr(cache, "EVICT_CHECK_EVERY", 5)
+    monkeypatch.setattr(cache, "_writes_since_check", 0)
+    checks = []
+    real_evict = cache._evict
+    monkeypatch.setattr(cache, "_evict", lambda conn: (checks.append(1), real_evict(conn)))
+
+    for i in range(20):
+        cache.put(f"k{i}", "openai", "m", "r")
+
+    assert len(checks) == 4
+    (count,) = cache._connect().execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+    assert count <= 10 + cache.EVICT_CHECK_EVERY
@@ -0,0 +1,94 @@
+import asyncio
+
+from src.services.llm_gateway import ProviderLimiter
+
+
+def test_async_acquire_waits_for_release_and_cancels_cleanly():
+    limiter = ProviderLimiter(concurrency=1, tokens_per_minute=0)
+
+    async def scenario():
+        limiter.acquire(0)
+        first = asyncio.ensure_future(limiter.acquire_async(0))
+        second = asyncio.ensure_future(limiter.acquire_async(0))
+        await asyncio.sleep(0.05)
+        assert limiter.queued == 2
+
+        # A cancelled waiter leaves the queue; the next one moves up
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        assert limiter.queued == 1
+
+        await asyncio.to_thread(limiter.release, 0)
+        await asyncio.wait_for(second, timeout=1)
+        assert (limiter.in_flight, limiter.queued) == (1, 0)
+        limiter.release(0)
+
+    asyncio.run(scenario())
+
+
+def test_async_acquire_wakes_when_token_budget_refills():
+    limiter = ProviderLimiter(concurrency=4, tokens_per_minute=600)  # 10 tokens a second
+
+    async def scenario():
+        limiter.acquire(600)
+        waited = await asyncio.wait_for(limiter.acquire_async(2), timeout=2)
+        assert 0.1 <= waited < 1.0
+
+    asyncio.run(scenario())
+
+
+class _FakeAnthropicStream:
+    def __init__(self, chunks, closed):
+        self.text_stream = self._text(chunks, closed)
+
+    @staticmethod
+    def _text(chunks, closed):
+        try:
+            yield from chunks
+        finally:
+            closed.append(True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_abandoned_sse_stream_releases_the_limiter_slot(monkeypatch):
+    from types import SimpleNamespace
+
+    from src.services import llm_gateway
+    from src.utils.sse import sse_response
+
+    closed = []
+    client = SimpleNamespace(
+        messages=SimpleNamespace(stream=lambda **kwargs: _FakeAnthropicStream(["one", "two", "three"], closed))
+    )
+    monkeypatch.setattr(llm_gateway, "get_client", lambda provider: client)
+    limiter = llm_gateway._limiters["anthropic"]
+
+    def events():
+        for chunk in llm_gateway.stream("anthropic", "m", [{"role": "user", "content": "hi"}], max_tokens=10, temperature=0.7):
+            yield "token", {"text": chunk}
+
+    sent = []
+
+    async def send(message):
+        # The client goes away after the first token event
+        if len(sent) == 3:
+            raise OSError("client disconnected")
+        sent.append(message)
+
+    async def scenario():
+        # Held here so garbage collection can't be what closes the producer
+        producer = events()
+        try:
+            await sse_response(producer).stream_response(send)
+        except OSError:
+            pass
+        assert b"one" in sent[-1]["body"]
+        assert closed == [True]
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
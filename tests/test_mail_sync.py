@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.models.user_profile import UserProfile
+from src.services import graph_transport, mail_sync
+from src.services.user_profile_store import get_user_profile, save_user_profile
+from tests.fake_graph import graph_session
+
+
+def _iso(hours_ago: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(hours=hours_ago)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _msg(msg_id: str, hours_ago: float = 1, subject: str = "Job update") -> dict:
+    return {
+        "id": msg_id,
+        "conversationId": f"conv-{msg_id}",
+        "subject": subject,
+        "bodyPreview": "Crane arrives Monday",
+        "from": {"emailAddress": {"address": "site@ext.com"}},
+        "toRecipients": [{"emailAddress": {"address": "me@co.com"}}],
+        "receivedDateTime": _iso(hours_ago),
+        "sentDateTime": _iso(hours_ago),
+    }
+
+
+@pytest.fixture
+def graph(tmp_path, monkeypatch):
+    monkeypatch.setattr(mail_sync, "CACHE_DIR", tmp_path / "mail_cache")
+    session, fake = graph_session()
+    previous = graph_transport.set_session(session)
+    yield fake
+    graph_transport.set_session(previous)
+
+
+@pytest.fixture
+def profile():
+    p = UserProfile(
+        user_id=f"user-{datetime.now().timestamp()}",
+        email="me@co.com",
+        display_name="Me",
+        tenant_id="t1",
+        outlook_connected=True,
+    )
+    save_user_profile(p)
+    return p
+
+
+def _cached(profile):
+    since = datetime.now(timezone.utc) - timedelta(days=7)
+    return {m["id"]: m for m in mail_sync.iter_cached_messages(since, profile)}
+
+
+def test_first_sync_follows_next_links_to_delta_link(graph, profile):
+    for i in range(5):
+        graph.add("Inbox", _msg(f"in{i}", hours_ago=i + 1))
+    graph.add("SentItems", _msg("se0"))
+
+    counts = mail_sync.sync_mailbox("token", profile)
+
+    assert counts == {"Inbox": 5, "SentItems": 1}
+    assert set(_cached(profile)) == {"in0", "in1", "in2", "in3", "in4", "se0"}
+    # 5 messages at 2 per page: first page in the batch, two nextLink pages
+    assert sum("$skiptoken=" in p for p in graph.paths()) == 2
+    stored = get_user_profile(profile.user_id).mail_delta_links
+    assert set(stored) == {"Inbox", "SentItems"}
+    assert all("$deltatoken=" in link for link in stored.values())
+
+
+def test_second_round_applies_adds_updates_and_tombstones(graph, profile):
+    for i in range(3):
+        graph.add("Inbox", _msg(f"in{i}"))
+    mail_sync.sync_mailbox("token", profile)
+    first_round = len(graph.requests)
+
+    graph.add("Inbox", _msg("in3"))
+    graph.update("Inbox", "in1", subject="Job update (revised)")
+    graph.remove("Inbox", "in0")
+
+    counts = mail_sync.sync_mailbox("token", profile)
+
+    assert counts["Inbox"] == 3
+    cached = _cached(profile)
+    assert set(cached) == {"in1", "in2", "in3"}
+    assert cached["in1"]["subject"] == "Job update (revised)"
+    # The second round only replays the stored deltaLinks, no initial query
+    later = graph.paths()[first_round:]
+    assert later and all("$deltatoken=" in p for p in later)
+
+
+def test_expired_delta_link_falls_back_to_full_resync(graph, profile):
+    graph.add("Inbox", _msg("in0"))
+    graph.add("Inbox", _msg("in1"))
+    mail_sync.sync_mailbox("token", profile)
+
+    graph.remove("Inbox", "in0")
+    graph.add("Inbox", _msg("in2"))
+    graph.expire_delta_links()
+    first_round = len(graph.requests)
+
+    counts = mail_sync.sync_mailbox("token", profile)
+
+    assert counts["Inbox"] == 2
+    assert set(_cached(profile)) == {"in1", "in2"}
+    later = graph.paths()[first_round:]
+    # The 410'd deltaLink is followed by a fresh initial delta query
+    assert any("$deltatoken=" in p for p in later)
+    assert any("$filter=receivedDateTime" in p for p in later)
+
+    # The new deltaLink is usable for the next round
+    graph.add("Inbox", _msg("in3"))
+    resynced = len(graph.requests)
+    assert mail_sync.sync_mailbox("token", profile)["Inbox"] == 3
+    assert all("$deltatoken=" in p for p in graph.paths()[resynced:])
@@ -0,0 +1,22 @@
+import json
+
+from src import migrate_profiles
+from src.services.user_profile_store import get_user_profile
+
+
+def test_imports_legacy_profiles_and_reports_json(tmp_path, capsys):
+    source = tmp_path / "user_profiles.json"
+    source.write_text(json.dumps({
+        "legacy-1": {"email": "harbour@example.com", "display_name": "Harbour Office", "tenant_id": "t"},
+    }))
+
+    assert migrate_profiles.main(["--source", str(source)]) == 0
+
+    out = json.loads(capsys.readouterr().out)
+    assert (out["ok"], out["imported"]) == (True, 1)
+    assert get_user_profile("legacy-1").email == "harbour@example.com"
+
+
+def test_missing_source_fails(tmp_path, capsys):
+    assert migrate_profiles.main(["--source", str(tmp_path / "absent.json")]) == 1
+    assert json.loads(capsys.readouterr().out)["ok"] is False
@@ -0,0 +1,38 @@
+import pytest
+
+from src.services import llm_gateway, model_router
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    seen = []
+
+    def fake_complete(provider, model, messages, **params):
+        seen.append((provider, model))
+        return "- pump replaced on site 4"
+
+    monkeypatch.setattr(llm_gateway, "complete", fake_complete)
+    monkeypatch.setattr(model_router, "CASCADE_ENABLED", True)
+    return seen
+
+
+def test_tiers_fall_back_to_openai_without_an_anthropic_key(monkeypatch, calls):
+    monkeypatch.delenv("CLAUDE_API_KEY", raising=False)
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+
+    fallback = model_router.ModelRoute.parse(model_router.FALLBACK_ROUTE)
+    assert model_router.route_for("extract") == fallback
+    assert model_router.route_for("synthesize") == fallback
+
+    result = model_router.extract([{"role": "user", "content": "notes"}], max_tokens=100)
+    assert calls == [(fallback.provider, fallback.model)]
+    assert not result.escalated
+
+
+def test_configured_routes_are_used_when_their_key_is_set(monkeypatch, calls):
+    monkeypatch.setenv("CLAUDE_API_KEY", "sk-ant-test")
+
+    assert model_router.route_for("extract") == model_router.ModelRoute.parse(model_router.EXTRACT_ROUTE)
+    model_router.extract([{"role": "user", "content": "notes"}], max_tokens=100)
+    assert calls == [("anthropic", model_router.ModelRoute.parse(model_router.EXTRACT_ROUTE).model)]
@@ -0,0 +1,37 @@
+import pytest
+
+from src.services.prompt_packer import chunk_documents, count_tokens, truncate_to_budget
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("", 0),
+        ("hello", 2),                        # 5 chars -> ceil(5/4) beats 1 word
+        ("a b c d", 4),                      # 4 words beat ceil(7/4)
+        ("Slip 14, pontoon B!", 6),          # words and punctuation count separately
+        ("x" * 400, 100),                    # long unbroken text falls back to chars/4
+    ],
+)
+def test_count_tokens(text, expected):
+    assert count_tokens(text) == expected
+
+
+def test_count_tokens_tracks_prose_roughly_like_a_bpe_tokenizer():
+    text = "The haul-out is booked for Thursday at 9am; the prop shaft seal arrives Wednesday."
+    assert 18 <= count_tokens(text) <= 24
+
+
+@pytest.mark.parametrize("budget", [0, -5])
+def test_non_positive_budget_is_rejected(budget):
+    with pytest.raises(ValueError):
+        chunk_documents(["some notes"], budget)
+    with pytest.raises(ValueError):
+        truncate_to_budget("some notes", budget)
+
+
+def test_tiny_budget_still_terminates_and_respects_the_limit():
+    chunks = chunk_documents(["pump replaced, invoice sent.", "engine hours logged"], 1)
+    assert chunks
+    assert all(count_tokens(c) <= 1 for c in chunks)
+    assert truncate_to_budget("pump replaced", 1) == "pump"
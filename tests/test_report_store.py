@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api import weekly_ai_reports
+from src.services import report_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_store, "REPORT_STORE_DIR", tmp_path)
+    return tmp_path
+
+
+def _report(user_id, n=0):
+    return {
+        "user_id": user_id,
+        "generated_at": f"2026-10-12T09:00:{n:02d}",
+        "input_fingerprint": f"{n:08d}",
+        "report_text": "- haul-out booked",
+    }
+
+
+@pytest.mark.parametrize("week", ["../victim/2026-W42", "2026-W42/..", "*", "2026-w42"])
+def test_week_outside_the_pattern_is_rejected(store, week):
+    report_store.save_report(_report("victim"))
+    with pytest.raises(ValueError):
+        report_store.list_reports("attacker", week)
+    with pytest.raises(ValueError):
+        report_store.load_latest_report("attacker", week)
+
+
+def test_report_versions_endpoint_answers_400_for_a_bad_week(store):
+    app = FastAPI()
+    app.include_router(weekly_ai_reports.router)
+    client = TestClient(app)
+
+    resp = client.get("/weekly/report-versions", params={"user_id": "attacker", "week": "../victim/2026-W42"})
+    assert resp.status_code == 400
+    assert client.get("/weekly/report-versions", params={"user_id": "victim", "week": "2026-W42"}).status_code == 200
+
+
+def test_concurrent_saves_of_latest_do_not_collide(store):
+    errors = []
+
+    def save(n):
+        try:
+            report_store.save_report(_report("skipper", n))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=save, args=(n,)) for n in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert report_store.load_latest_report("skipper", "2026-W42")["user_id"] == "skipper"
+    assert not list(store.rglob("*.tmp"))
+    assert len(report_store.list_reports("skipper", "2026-W42")) == 16
@@ -0,0 +1,88 @@
+from src.services.text_compression import compress_text
+
+# Graph bodyPreview: the first ~255 characters of the body on one line
+
+
+def test_reply_preview_keeps_new_text_and_drops_quoted_history():
+    preview = (
+        "Confirmed, the yard can haul out Sea Breeze on Thursday at 9am. "
+        "On Mon, Oct 12, 2026 at 10:03 AM Maria Lopez <maria@harboryachts.com> wrote: "
+        "Hi Tom, can we book the haul-out for this week? The prop shaft seal is"
+    )
+    assert compress_text(preview) == "Confirmed, the yard can haul out Sea Breeze on Thursday at 9am."
+
+
+def test_outlook_preview_cut_at_inline_header_block():
+    preview = (
+        "Invoice attached, payment due by the 30th. "
+        "From: Dock Office <office@marina.example> Sent: Tuesday, October 13, 2026 8:14 AM "
+        "To: Tom Hale Subject: RE: Slip 14 invoice"
+    )
+    assert compress_text(preview) == "Invoice attached, payment due by the 30th."
+
+
+def test_sign_off_and_signature_on_the_same_line_are_dropped():
+    preview = (
+        "The survey report is in the shared folder, two items need sign-off before launch. "
+        "Best regards, Maria Lopez | Operations Manager | Harbor Yachts | +34 600 123 456"
+    )
+    assert compress_text(preview) == (
+        "The survey report is in the shared folder, two items need sign-off before launch."
+    )
+
+
+def test_sign_off_followed_by_prose_is_kept():
+    preview = "Thanks, I will send the revised quote for the rigging by Friday."
+    assert compress_text(preview) == preview
+
+
+def test_sign_off_followed_by_a_short_request_is_kept():
+    preview = "Meeting moved to the yacht club. Thanks! Call me 555-1234"
+    assert compress_text(preview) == preview
+
+
+def test_disclaimer_sentence_does_not_take_the_rest_of_the_paragraph():
+    preview = (
+        "Please consider the environment before printing this email. "
+        "The mooring fee goes up to 420 EUR from March, invoices follow next week."
+    )
+    assert compress_text(preview) == "The mooring fee goes up to 420 EUR from March, invoices follow next week."
+
+
+def test_mobile_signature_is_cut_inline():
+    preview = "On my way to the pontoon, 10 minutes. Sent from my iPhone"
+    assert compress_text(preview) == "On my way to the pontoon, 10 minutes."
+
+
+def test_disclaimer_drops_only_the_notice_not_the_whole_preview():
+    preview = (
+        "Engine hours logged at 1,240; next service due at 1,500. "
+        "CONFIDENTIALITY NOTICE: This e-mail and any attachments are intended solely for the "
+        "addressee. If you have received this e-mail in error please notify the sender."
+    )
+    assert compress_text(preview) == "Engine hours logged at 1,240; next service due at 1,500."
+
+
+def test_external_sender_banner_is_dropped():
+    preview = (
+        "[EXTERNAL] CAUTION: This email originated from outside of the organization. "
+        "Do not click links or open attachments unless you recognize the sender. "
+        "Hi Tom, the new sails arrive Monday and we can fit them on Tuesday."
+    )
+    assert compress_text(preview) == "Hi Tom, the new sails arrive Monday and we can fit them on Tuesday."
+
+
+def test_multi_line_body_still_uses_line_markers():
+    body = (
+        "Works for me.\n"
+        "\n"
+        "Thanks,\n"
+        "Tom\n"
+        "\n"
+        "From: Maria Lopez\n"
+        "Sent: Monday, October 12, 2026 10:03 AM\n"
+        "Subject: Haul-out\n"
+        "\n"
+        "Can we book Thursday?"
+    )
+    assert compress_text(body) == "Works for me."
@@ -0,0 +1,54 @@
+import io
+import os
+import time
+
+import pytest
+
+from src.services import document_extraction, upload_manifest
+from src.utils import file_storage
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_manifest, "MANIFEST_PATH", tmp_path / "manifest.sqlite3")
+    monkeypatch.setattr(file_storage, "UPLOAD_STORE_DIR", tmp_path / "store")
+    monkeypatch.setattr(file_storage, "UPLOAD_FILES_DIR", tmp_path / "files")
+    yield tmp_path / "files"
+    document_extraction.shutdown()
+
+
+def _row(name):
+    _, end = upload_manifest.week_bounds()
+    return {e.name: e for e in upload_manifest.entries_between(0, end)}.get(name)
+
+
+def test_uploaded_at_is_ingest_time_not_file_mtime(store):
+    stored = file_storage.store_stream(io.BytesIO(b"pump replaced on site 4"), "notes.txt")
+    # Checkouts and archive members keep old mtimes
+    os.utime(stored.path, (1_500_000_000, 1_500_000_000))
+
+    before = time.time()
+    upload_manifest.scan(store)
+
+    start, end = upload_manifest.week_bounds()
+    entries = upload_manifest.entries_between(start, end)
+    assert [e.name for e in entries] == [stored.name]
+    assert entries[0].uploaded_at >= before
+
+
+def test_identical_reupload_refreshes_uploaded_at_and_keeps_summary(store):
+    stored = file_storage.store_stream(io.BytesIO(b"crane booked for friday"), "crane.txt")
+    upload_manifest.scan(store)
+    entry = _row(stored.name)
+    upload_manifest.set_summary(entry.name, entry.content_hash, "- crane friday", "key", {})
+    first = _row(stored.name).uploaded_at
+
+    time.sleep(0.01)
+    again = file_storage.store_stream(io.BytesIO(b"crane booked for friday"), "crane.txt")
+    assert again.deduplicated
+    result = upload_manifest.scan(store)
+
+    refreshed = _row(stored.name)
+    assert result.unchanged == 1
+    assert refreshed.uploaded_at > first
+    assert refreshed.summary == "- crane friday"
@@ -0,0 +1,71 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api import weekly_ai_reports
+from src.models.user_profile import UserProfile
+from src.services import weekly_ai_engine
+from src.services.job_queue import job_queue
+
+
+def _user(n):
+    return UserProfile(
+        user_id=f"u{n}", email=f"skipper{n}@example.com", display_name=f"Skipper {n}",
+        tenant_id="t", outlook_connected=True,
+    )
+
+
+@pytest.fixture
+def client(monkeypatch):
+    users = [_user(1), _user(2)]
+    monkeypatch.setattr(weekly_ai_engine, "get_all_connected_users", lambda: users)
+    monkeypatch.setattr(weekly_ai_engine, "get_user_by_email", lambda email: None)
+    monkeypatch.delenv("REPORT_USER_EMAIL", raising=False)
+
+    submitted = []
+    monkeypatch.setattr(job_queue, "submit", lambda *args: submitted.append(args))
+
+    app = FastAPI()
+    app.include_router(weekly_ai_reports.router)
+    client = TestClient(app)
+    client.submitted = submitted
+    return client
+
+
+@pytest.mark.parametrize(
+    "path, body",
+    [
+        ("/weekly/report", {}),
+        ("/weekly/report/stream", {}),
+        ("/weekly/email-report", {"to_addresses": ["owner@example.com"]}),
+    ],
+)
+def test_ambiguous_report_user_is_rejected_before_any_work(client, path, body):
+    resp = client.post(path, json=body)
+
+    assert resp.status_code == 400
+    assert "2 Outlook-connected users" in resp.json()["detail"]
+    assert client.submitted == []
+
+
+def test_unknown_user_id_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(weekly_ai_engine, "get_user_profile_by_id", lambda user_id: None)
+
+    resp = client.post("/weekly/report", json={"user_id": "nobody"})
+
+    assert resp.status_code == 400
+    assert client.submitted == []
+
+
+def test_prompt_counts_conversations_left_out_before_packing():
+    from src.models.mail_message import Conversation
+    from src.services.prompt_packer import ConversationSignals
+
+    conversations = [Conversation(f"c{i}", []) for i in range(5)]
+    selected = [(conversations[0], ConversationSignals()), (conversations[1], ConversationSignals())]
+    summaries = {"c0": "Pump replaced.", "c1": "Hull survey booked."}
+
+    prompt = weekly_ai_engine._format_prompt(_user(1), conversations, selected, summaries)
+
+    assert "Conversation 2 " in prompt
+    assert "(3 lower-priority conversations omitted)" in prompt
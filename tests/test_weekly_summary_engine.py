@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+from src.services import weekly_summary_engine
+from src.services.prompt_packer import count_tokens
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    made = []
+    lock = threading.Lock()
+
+    def echo(*, prompt, content):
+        # Worst case for the reduce: the "summary" is as long as its input
+        with lock:
+            made.append((prompt, content))
+        return content
+
+    monkeypatch.setattr(weekly_summary_engine, "summarize_text", echo)
+    monkeypatch.setattr(weekly_summary_engine, "REPORT_CHUNK_TOKENS", 2000)
+    return made
+
+
+def _file(i: int) -> str:
+    return f"File: notes{i}.txt\n\n" + f"crew {i} poured the slab on level {i} " * 150
+
+
+def test_small_week_is_one_call(calls):
+    summary, rounds = weekly_summary_engine._tree_summarize([_file(1)[:300], _file(2)[:300]])
+    assert rounds == 1
+    assert len(calls) == 1
+    assert calls[0][0] == weekly_summary_engine.REPORT_PROMPT
+
+
+def test_summaries_that_do_not_shrink_still_terminate(calls):
+    texts = [_file(i) for i in range(12)]
+
+    summary, rounds = weekly_summary_engine._tree_summarize(texts)
+
+    # One partial level over 12 chunks, then a forced merge and the final call
+    assert rounds == 2
+    assert len(calls) == 13
+    final_prompt, final_content = calls[-1]
+    assert final_prompt == weekly_summary_engine.REPORT_PROMPT
+    assert count_tokens(final_content) <= 2000
+    assert "notes11.txt" in final_content